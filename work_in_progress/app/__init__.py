@@ -0,0 +1 @@
+default_app_config = "work_in_progress.app.apps.App"
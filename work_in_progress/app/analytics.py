@@ -0,0 +1,128 @@
+from operator import itemgetter
+from typing import Any, Dict, Iterator, List, Tuple
+
+import numpy as np
+from django.db import connections
+from django.db.models import QuerySet
+from numpy.typing import NDArray
+
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.settings import ANALYTICS_CHUNK_SIZE, ANALYTICS_MAX_ROWS
+
+PERCENTILES = (5, 25, 50, 75, 95, 99)
+
+# Tukey's fences: values further than this many interquartile ranges below the
+# first or above the third quartile are outliers.
+OUTLIER_IQR_FACTOR = 1.5
+
+_first, _second = itemgetter(0), itemgetter(1)
+
+
+def _chunks(
+    queryset: QuerySet, group: str, metric: str
+) -> Iterator[Tuple[List[str], NDArray[np.float64]]]:
+    """
+    Yield the group and metric columns of the queryset in chunks of at most
+    ANALYTICS_CHUNK_SIZE rows, read through a server-side cursor.
+
+    Chunks are taken straight from fetchmany(), skipping the per row generator
+    of QuerySet.iterator(), and without ORDER BY: sorting the table by group in
+    the database costs more than grouping every chunk in NumPy.
+    """
+    query = queryset.order_by().values_list(group, metric).query
+    sql, params = query.sql_with_params()
+    with connections[queryset.db].chunked_cursor() as cursor:
+        cursor.execute(sql, params)
+        while True:
+            rows = cursor.fetchmany(ANALYTICS_CHUNK_SIZE)
+            if not rows:
+                return
+            yield list(map(_first, rows)), np.fromiter(
+                map(_second, rows), dtype=np.float64, count=len(rows)
+            )
+
+
+def group_values(
+    queryset: QuerySet, group: str, metric: str
+) -> Dict[str, NDArray[np.float64]]:
+    """
+    Return the metric values of every group as a contiguous array.
+
+    Each chunk is split by group with a single stable argsort, so memory
+    grows by 8 bytes per row, instead of a Python float and a list slot per
+    row, plus one chunk and a copy of the largest group. The exact
+    percentiles need every value, so memory is linear in the rows read and
+    they are capped at ANALYTICS_MAX_ROWS.
+
+    Raises:
+        HTTPException: If the queryset has more than ANALYTICS_MAX_ROWS rows.
+    """
+    codes: Dict[str, int] = {}
+    parts: List[List[NDArray[np.float64]]] = []
+    rows = 0
+    for groups, values in _chunks(queryset, group, metric):
+        rows += len(groups)
+        if rows > ANALYTICS_MAX_ROWS:
+            raise HTTPException(
+                400,
+                f"Máximo de {ANALYTICS_MAX_ROWS} processos por análise, "
+                "use os filtros",
+            )
+        for name in set(groups).difference(codes):
+            codes[name] = len(codes)
+            parts.append([])
+        chunk_codes = np.fromiter(
+            map(codes.__getitem__, groups), dtype=np.intp, count=len(groups)
+        )
+        order = np.argsort(chunk_codes, kind="stable")
+        present, starts = np.unique(chunk_codes[order], return_index=True)
+        for code, part in zip(present, np.split(values[order], starts[1:])):
+            parts[code].append(part)
+    arrays = {}
+    for name, code in codes.items():
+        arrays[name] = np.concatenate(parts[code])
+        parts[code] = []
+    return arrays
+
+
+def describe(values: NDArray[np.float64], bins: int) -> Dict[str, Any]:
+    """
+    Summarize a non-empty array: moments, percentiles, a histogram and the
+    number of outliers outside Tukey's fences.
+    """
+    percentiles = np.asarray(np.percentile(values, PERCENTILES), dtype=np.float64)
+    first, third = (
+        percentiles[PERCENTILES.index(25)],
+        percentiles[PERCENTILES.index(75)],
+    )
+    spread = OUTLIER_IQR_FACTOR * (third - first)
+    lower, upper = first - spread, third + spread
+    counts, edges = np.histogram(values, bins=bins)
+    return {
+        "count": int(values.size),
+        "mean": float(values.mean()),
+        "std": float(values.std()),
+        "min": float(values.min()),
+        "max": float(values.max()),
+        "percentiles": {
+            f"p{percentile}": float(value)
+            for percentile, value in zip(PERCENTILES, percentiles)
+        },
+        "histogram": {"edges": edges.tolist(), "counts": counts.tolist()},
+        "outliers": int(np.count_nonzero((values < lower) | (values > upper))),
+        "lower_fence": float(lower),
+        "upper_fence": float(upper),
+    }
+
+
+def distributions(
+    queryset: QuerySet, group: str, metric: str, bins: int
+) -> List[Dict[str, Any]]:
+    """
+    Return the distribution of a numeric column of the queryset for every
+    value of the group column, in group order.
+    """
+    return [
+        {"group": name, **describe(values, bins)}
+        for name, values in sorted(group_values(queryset, group, metric).items())
+    ]
@@ -1,34 +1,152 @@
-from typing import Any, Dict, List, Optional, Tuple, Union
+from typing import Any, Dict, List, Optional, Sequence, Sized, Tuple, Type
 
 import jwt
 from django.db.models import QuerySet
-from ninja import NinjaAPI
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response, patch_vary_headers
+from ninja import NinjaAPI, Query, Schema
 from ninja.security import HttpBearer
 from requests import Request
 
-from work_in_progress.app.models import Company, Contato, Processo, Produto, SystemUser
+from work_in_progress.app import bulk, lookup, stock
+from work_in_progress.app.analytics import distributions
+from work_in_progress.app.bulk import BulkResults
+from work_in_progress.app.cache import (
+    ResponseCache,
+    ResponseEntry,
+    freeze_response,
+    list_flights,
+    response_cache,
+    thaw_response,
+    user_cache,
+)
+from work_in_progress.app.concurrency import offload, run_sync
+from work_in_progress.app.conditional import (
+    content_validators,
+    list_validators,
+    make_etag,
+    not_modified,
+    set_validators,
+)
+from work_in_progress.app.exceptions import HTTPException, unique_violation
+from work_in_progress.app.metrics import CONTENT_TYPE, metrics
+from work_in_progress.app.models import (
+    Company,
+    Contato,
+    Processo,
+    ProcessoRollup,
+    Produto,
+    SystemUser,
+    parse_id,
+)
+from work_in_progress.app.pagination import apply_cursor, paginate
+from work_in_progress.app.passwords import password_checker
+from work_in_progress.app.renderers import ORJSONRenderer
+from work_in_progress.app.rollups import processo_stats
 from work_in_progress.app.schemas import (
+    AnalyticsParams,
+    BulkDeleteSchema,
+    CompanyFilterSchema,
+    CompanyLookupParams,
+    CompanyOrdering,
+    CompanyPatchSchema,
     CompanySchema,
+    ContatoFilterSchema,
+    ContatoOrdering,
+    ContatoPatchSchema,
     ContatoSchema,
+    ListParams,
     LoginSchema,
+    ProcessoBulkPatchSchema,
+    ProcessoFilterSchema,
+    ProcessoOrdering,
+    ProcessoPatchSchema,
     ProcessoSchema,
+    ProcessoStatsFilterSchema,
+    ProcessoUpsertSchema,
+    ProdutoBulkPatchSchema,
+    ProdutoFilterSchema,
+    ProdutoOrdering,
+    ProdutoPatchSchema,
     ProdutoSchema,
+    ProdutoUpsertSchema,
+    SearchParams,
+    StockDeltaSchema,
+    StockItemSchema,
+    SyncParams,
     login_responses_dict,
+    response_analytics,
+    response_bulk,
     response_get_companies,
     response_get_contatos,
     response_get_processos,
     response_get_produtos,
+    response_lookup,
+    response_processo_stats,
+    response_search,
+    response_stock,
+    response_stocks,
+    response_sync,
     responses_dict,
 )
-from work_in_progress.settings import ACCESS_TOKEN_EXPIRE_MINUTES, ALGORITHM, SECRET_KEY
+from work_in_progress.app.search import search
+from work_in_progress.app.serializers import get_serializer, parse_fields
+from work_in_progress.app.streaming import stream_media_type, stream_rows, wants_stream
+from work_in_progress.app.sync import sync
+from work_in_progress.app.tokens import create_token, has_claims, principal, revocations
+from work_in_progress.app.updates import delete_rows, get_changes, update_row
+from work_in_progress.settings import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    AUTH_STATELESS,
+    BULK_MAX_ITEMS,
+    SECRET_KEY,
+)
+
+DEFAULT_ORDERING = ("criado_em", "pk")
+
+# Headers of the list responses shared by the requests of a single flight.
+FLIGHT_HEADERS = (*ResponseCache.headers, "X-Cache")
 
 
 class JWTAuth(HttpBearer):
     """
     JWTAuth class that extends HttpBearer.
     It overrides the authenticate method to provide JWT token based authentication.
+
+    Every view is async, so ninja awaits __call__; authenticate is kept for
+    synchronous callers.
     """
 
+    async def __call__(  # type: ignore[override]
+        self, request: HttpRequest
+    ) -> Optional[SystemUser]:
+        """
+        Authenticate the request of an async view.
+
+        Tokens minted by login carry every claim the views need, so with
+        AUTH_STATELESS their user is built from the claims and only checked
+        against the revocation set, synced with run_sync when stale. Older
+        tokens, or every token without AUTH_STATELESS, have their SystemUser
+        fetched with run_sync when it is not in the local user cache.
+        """
+        scheme, _, token = request.headers.get(self.header, "").partition(" ")
+        if scheme.lower() != self.openapi_scheme:
+            return None
+        payload = self.claims(token)
+        if AUTH_STATELESS and has_claims(payload):
+            if revocations.is_stale():
+                await run_sync(request, revocations.sync)
+            if revocations.is_revoked(payload):
+                raise HTTPException(401, "Unauthorized")
+            return principal(payload)
+        user = user_cache.get_local(payload["sub"])
+        if user is None:
+            user = await run_sync(request, self.get_user, payload["sub"])
+        self.check_version(user, payload)
+        return user
+
     def authenticate(self, request: Request, token: str) -> Optional[SystemUser]:
         """
         Authenticate the request using the provided JWT token.
@@ -38,7 +156,32 @@ class JWTAuth(HttpBearer):
             token: A string representing the Bearer token.
 
         Returns:
-            The SystemUser instance associated with the provided token.
+            The SystemUser instance associated with the provided token,
+            served from the user cache when possible.
+
+        Raises:
+            HTTPException: If the token is not properly formatted,
+            does not contain a 'sub' claim, or is not a valid JWT token.
+        """
+        payload = self.claims(token)
+        user = self.get_user(payload["sub"])
+        self.check_version(user, payload)
+        return user
+
+    def get_user(self, user_id: Any) -> SystemUser:
+        try:
+            return user_cache.get(user_id)
+        except SystemUser.DoesNotExist:
+            raise HTTPException(401, "Unauthorized")
+
+    def check_version(self, user: SystemUser, payload: Dict[str, Any]) -> None:
+        # Tokens minted before the 'ver' claim can only be refused by expiry.
+        if "ver" in payload and payload["ver"] != user.token_version:
+            raise HTTPException(401, "Unauthorized")
+
+    def claims(self, token: str) -> Dict[str, Any]:
+        """
+        Return the claims of a valid token, which has at least 'sub'.
 
         Raises:
             HTTPException: If the token is not properly formatted,
@@ -60,11 +203,9 @@ class JWTAuth(HttpBearer):
                 options={"verify_exp": True},
                 expire=ACCESS_TOKEN_EXPIRE_MINUTES,
             )
-            user_id = payload.get("sub")
-            if user_id is None:
+            if payload.get("sub") is None:
                 raise HTTPException(401, "Unauthorized")
-            user = SystemUser.objects.get(id=user_id)
-            return user
+            return payload
         except jwt.InvalidTokenError:
             raise HTTPException(401, "Unauthorized")
 
@@ -82,16 +223,92 @@ api = NinjaAPI(
     version="0.0.1",
     description=api_description,
     auth=JWTAuth(),
+    renderer=ORJSONRenderer(),
 )
 
 
-class HTTPException(Exception):
-    status_code: int
-    message: str
+def list_response(
+    request: Request,
+    queryset: QuerySet,
+    schema: Type[Schema],
+    key: str,
+    ordering: Sequence[str],
+    params: ListParams,
+) -> HttpResponseBase:
+    """
+    Render one page of the queryset, or stream all of it, under the given key.
 
-    def __init__(self, status_code: int, message: str):
-        self.status_code = status_code
-        self.message = message
+    Rows are serialized straight from values_list() and rendered here, which
+    skips the per-row schema validation ninja would otherwise run. Only the
+    requested fields are selected and rendered.
+
+    Responses carry an ETag and Vary on Accept, which picks between a page
+    and an NDJSON stream. A request with If-None-Match for an unchanged page
+    is answered with a 304 without sending the body. The ETag of a page is
+    the digest of its body, so only the page query runs; the one of a stream
+    comes from an aggregate over the listed rows, computed before sending.
+
+    Pages are served from the response cache, under the endpoint named key,
+    until the listed rows change. Identical requests in flight at the same
+    time share one page query and rendering.
+    """
+    serializer = get_serializer(schema, parse_fields(schema, params.fields))
+    stream = wants_stream(request, params.stream)
+    owner = None if request.auth.is_superuser else request.auth.pk
+    cache_key = None
+    if not stream:
+        cache_key = response_cache.key(request, key, queryset.model, owner)
+        response = response_cache.get(request, cache_key)
+        if response is not None:
+            return response
+    if stream:
+        validators = list_validators(request, queryset, stream_media_type(request))
+        response = not_modified(request, validators)
+        if response is None:
+            response = stream_rows(
+                request, apply_cursor(queryset, ordering, params.after), serializer, key
+            )
+        patch_vary_headers(response, ["Accept"])
+        return set_validators(response, validators)
+    flight_key = list_flights.key(request, key, queryset.model, owner)
+
+    def render() -> ResponseEntry:
+        page, next_cursor = paginate(
+            serializer.values(queryset, [field.lstrip("-") for field in ordering]),
+            ordering,
+            params.limit,
+            params.after,
+            key=serializer.extra,
+        )
+        if page:
+            response = api.create_response(
+                request, {key: serializer.rows(page), "next": next_cursor}, status=200
+            )
+            response = set_validators(response, content_validators(request, response))
+        else:
+            response = api.create_response(
+                request, {"message": "No content"}, status=204
+            )
+        patch_vary_headers(response, ["Accept"])
+        response = response_cache.set(cache_key, response)
+        return freeze_response(response, FLIGHT_HEADERS)
+
+    response = thaw_response(list_flights.run(flight_key, render))
+    return get_conditional_response(
+        request, etag=response.get("ETag"), response=response
+    )
+
+
+def check_contato(user: SystemUser, contato_id: str) -> None:
+    if not Contato.objects.filter(
+        criado_por=user, contato_id=parse_id(contato_id)
+    ).exists():
+        raise HTTPException(404, "Contato não existe")
+
+
+def check_bulk_size(items: Sized) -> None:
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(400, f"Máximo de {BULK_MAX_ITEMS} itens por requisição")
 
 
 @api.exception_handler(Exception)
@@ -107,21 +324,17 @@ def base_exception(request: Request, exc: HTTPException) -> None:
     return api.create_response(request, {"message": exception_message}, status=status)
 
 
-def authenticate(request: Request, username: str, password: str) -> Optional[str]:
-    try:
-        user = SystemUser.objects.get(username=username)
-        if user.password == password:
-            token = jwt.encode({"sub": user.id}, SECRET_KEY, algorithm=ALGORITHM)
-            return token
-        else:
-            raise HTTPException(401, "Invalid Credentials")
-
-    except SystemUser.DoesNotExist:
+async def authenticate(
+    request: HttpRequest, username: str, password: str
+) -> Optional[str]:
+    user = await password_checker.check(request, username, password)
+    if user is None or not user.is_active:
         raise HTTPException(401, "Invalid Credentials")
+    return create_token(user)
 
 
 @api.post("/login", auth=None, response=login_responses_dict, tags=["login"])
-def login(request: Request, data: LoginSchema) -> Tuple[int, Dict[str, str]]:
+async def login(request: HttpRequest, data: LoginSchema) -> Tuple[int, Dict[str, str]]:
     """
     Logar no sistema
 
@@ -129,38 +342,72 @@ def login(request: Request, data: LoginSchema) -> Tuple[int, Dict[str, str]]:
     - **password**: password
 
     """
-    token = authenticate(request, username=data.username, password=data.password)
+    token = await authenticate(request, username=data.username, password=data.password)
     if token is not None:
         return 200, {"message": "Logged in succesfully", "token": token}
     else:
         raise HTTPException(401, "Invalid Credentials")
 
 
+@api.get("/metrics", response=responses_dict, tags=["metrics"])
+@offload
+def get_metrics(request: Request) -> HttpResponse:
+    """
+    Métricas das requisições de todos os workers, no formato do Prometheus.
+    """
+    if not request.auth.is_superuser:
+        raise HTTPException(403, "Apenas superusuários podem ver as métricas")
+    return HttpResponse(metrics.render(), content_type=CONTENT_TYPE)
+
+
+@api.get("/search", response=response_search, tags=["search"])
+@offload
+def search_rows(request: Request, params: SearchParams = Query(...)) -> Dict[str, Any]:
+    results, next_cursor = search(request.auth, params.q, params.limit, params.after)
+    return {"results": results, "next": next_cursor}
+
+
+@api.get("/sync", response=response_sync, tags=["sync"])
+@offload
+def sync_rows(request: Request, params: SyncParams = Query(...)) -> Dict[str, Any]:
+    return sync(request.auth, params.since, params.limit, params.after)
+
+
 @api.get("/contatos", response=response_get_contatos, tags=["contatos"])
-def get_contatos(request: Request) -> Tuple[int, Dict[str, Any]]:
+@offload
+def get_contatos(
+    request: Request,
+    params: ListParams = Query(...),
+    filters: ContatoFilterSchema = Query(...),
+    order_by: Optional[ContatoOrdering] = None,
+) -> HttpResponseBase:
     if request.auth.is_superuser:
         contatos = Contato.objects.all()
     else:
         contatos = Contato.objects.filter(criado_por=request.auth)
-    if contatos:
-        return 200, {
-            "contatos": [ContatoSchema.from_orm(contato).dict() for contato in contatos]
-        }
-    else:
-        return 204, {"message": "No content"}
+    contatos = filters.filter(contatos)
+    ordering = (order_by, "pk") if order_by else DEFAULT_ORDERING
+    return list_response(request, contatos, ContatoSchema, "contatos", ordering, params)
 
 
 @api.post("/contatos", response=responses_dict, tags=["contatos"])
+@offload
 def create_contato(request: Request, data: ContatoSchema) -> Dict[str, str]:
-    try:
-        contato = Contato.objects.get(email_responsavel=data.email_responsavel)
-        raise HTTPException(400, "Contato já existe")
-    except Contato.DoesNotExist:
+    with unique_violation("Contato já existe"):
         contato = Contato.objects.create(**data.dict(), criado_por=request.auth)
-        return {
-            "message": f"Contato de nome {contato.nome} "
-            f"e id {contato.contato_id} criado"
-        }
+    return {
+        "message": f"Contato de nome {contato.nome} "
+        f"e id {contato.contato_id.hex} criado"
+    }
+
+
+@api.post("/contatos/bulk", response=response_bulk, tags=["contatos"])
+@offload
+def bulk_create_contatos(
+    request: Request, data: List[ContatoSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_create_contatos(request.auth, data)}
 
 
 @api.put(
@@ -168,37 +415,31 @@ def create_contato(request: Request, data: ContatoSchema) -> Dict[str, str]:
     response=responses_dict,
     tags=["contatos"],
 )
+@offload
 def update_contato(
     request: Request, contato_id: str, data: ContatoSchema
 ) -> Dict[str, str]:
-    try:
-        contato: Contato = Contato.objects.filter(criado_por=request.auth).get(
-            contato_id=contato_id
-        )
-    except Exception:
+    with unique_violation("Contato já existe"):
+        row = update_row(Contato, request.auth, contato_id, data.dict())
+    if row is None:
         raise HTTPException(404, "Contato não existe")
-    try:
-        contato_responsavel: Optional[Contato] = Contato.objects.filter(
-            criado_por=request.auth
-        ).get(email_responsavel=data.email_responsavel)
-    except Contato.DoesNotExist:
-        contato_responsavel = None
-    if contato_responsavel and contato_responsavel.contato_id != contato.contato_id:
-        raise HTTPException(400, "Contato já existe")
-
-    contato.nome = data.nome
-    contato.endereco = data.endereco
-    contato.numero = data.numero
-    contato.complemento = data.complemento
-    contato.bairro = data.bairro
-    contato.cidade = data.cidade
-    contato.estado = data.estado
-    contato.cep = data.cep
-    contato.telefone = data.telefone
-    contato.email_responsavel = data.email_responsavel
-    contato.email_cobranca = data.email_cobranca
-    contato.save()
-    return {"message": f"Contato de nome {contato.nome} e id {contato_id} atualizado"}
+    return {"message": f"Contato de nome {data.nome} e id {contato_id} atualizado"}
+
+
+@api.patch(
+    "/contatos/{contato_id}",
+    response=responses_dict,
+    tags=["contatos"],
+)
+@offload
+def patch_contato(
+    request: Request, contato_id: str, data: ContatoPatchSchema
+) -> Dict[str, str]:
+    with unique_violation("Contato já existe"):
+        row = update_row(Contato, request.auth, contato_id, get_changes(data), ["nome"])
+    if row is None:
+        raise HTTPException(404, "Contato não existe")
+    return {"message": f"Contato de nome {row[0]} e id {contato_id} atualizado"}
 
 
 @api.delete(
@@ -206,15 +447,30 @@ def update_contato(
     response=responses_dict,
     tags=["contatos"],
 )
+@offload
 def delete_contato(request: Request, contato_id: str) -> Dict[str, str]:
-    try:
-        contato: Contato = Contato.objects.filter(criado_por=request.auth).get(
-            contato_id=contato_id
-        )
-    except Contato.DoesNotExist:
+    rows = delete_rows(Contato, request.auth, [contato_id], ["nome"])
+    if not rows:
         raise HTTPException(404, "Contato não existe, certeza que este contato existe?")
-    contato.delete()
-    return {"message": f"Contato de nome {contato.nome} e id {contato_id} deletado"}
+    [(nome,)] = rows.values()
+    return {"message": f"Contato de nome {nome} e id {contato_id} deletado"}
+
+
+@api.post("/contatos/bulk/delete", response=response_bulk, tags=["contatos"])
+@offload
+def bulk_delete_contatos(
+    request: Request, data: BulkDeleteSchema
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data.ids)
+    results = bulk.bulk_delete(
+        Contato,
+        request.auth,
+        data.ids,
+        "nome",
+        "Contato de nome {name} e id {id} deletado",
+        "Contato não existe",
+    )
+    return {"results": results}
 
 
 @api.get(
@@ -222,22 +478,35 @@ def delete_contato(request: Request, contato_id: str) -> Dict[str, str]:
     response=response_get_companies,
     tags=["companies"],
 )
+@offload
 def get_companies(
     request: Request,
-) -> Tuple[int, Dict[str, Union[str, List[Dict[str, Union[str, int, float, bool]]]]]]:
+    params: ListParams = Query(...),
+    filters: CompanyFilterSchema = Query(...),
+    order_by: Optional[CompanyOrdering] = None,
+) -> HttpResponseBase:
     if request.auth.is_superuser:
         companies: QuerySet[Company]
         companies = Company.objects.all()
     else:
         companies = Company.objects.filter(criado_por=request.auth)
-    if companies:
-        return 200, {
-            "companies": [
-                CompanySchema.from_orm(company).dict() for company in companies
-            ]
-        }
-    else:
-        return 204, {"message": "No content"}
+    companies = filters.filter(companies)
+    ordering = (order_by, "pk") if order_by else DEFAULT_ORDERING
+    return list_response(
+        request, companies, CompanySchema, "companies", ordering, params
+    )
+
+
+@api.get("/companies/lookup", response=response_lookup, tags=["companies"])
+@offload
+def lookup_companies(
+    request: Request, params: CompanyLookupParams = Query(...)
+) -> Dict[str, Any]:
+    return {
+        "companies": lookup.lookup_companies(
+            request.auth, params.q, params.threshold, params.limit
+        )
+    }
 
 
 @api.post(
@@ -245,36 +514,24 @@ def get_companies(
     response=responses_dict,
     tags=["companies"],
 )
-def create_company(request: Request, data: CompanySchema) -> Optional[Dict[str, str]]:
-    try:
-        company = Company.objects.get(cnpj=data.cnpj)
-        if company:
-            raise HTTPException(400, "Company já existe")
-    except Company.DoesNotExist:
-        try:
-            contato = Contato.objects.filter(criado_por=request.auth).get(
-                contato_id=data.contato_id
-            )
-        except Contato.DoesNotExist:
-            raise HTTPException(404, "Contato não existe")
+@offload
+def create_company(request: Request, data: CompanySchema) -> Dict[str, str]:
+    check_contato(request.auth, data.contato_id)
+    with unique_violation("Company já existe"):
+        company = Company.objects.create(**data.dict(), criado_por=request.auth)
+    return {
+        "message": "Company de nome "
+        f"{company.nome_fantasia} e id {company.company_id.hex} criada"
+    }
 
-        try:
-            company = Company.objects.create(
-                cnpj=data.cnpj,
-                razao_social=data.razao_social,
-                nome_fantasia=data.nome_fantasia,
-                inscricao_estadual=data.inscricao_estadual,
-                inscricao_municipal=data.inscricao_municipal,
-                contato=contato,
-                criado_por=request.auth,
-            )
-            return {
-                "message": "Company de nome "
-                f"{company.nome_fantasia} e id {company.company_id} criada"
-            }
-        except Exception as e:
-            raise HTTPException(400, str(e))
-    return None
+
+@api.post("/companies/bulk", response=response_bulk, tags=["companies"])
+@offload
+def bulk_create_companies(
+    request: Request, data: List[CompanySchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_create_companies(request.auth, data)}
 
 
 @api.put(
@@ -282,51 +539,69 @@ def create_company(request: Request, data: CompanySchema) -> Optional[Dict[str,
     response=responses_dict,
     tags=["companies"],
 )
+@offload
 def update_companies(
     request: Request, company_id: str, data: CompanySchema
 ) -> Dict[str, str]:
-    try:
-        company = Company.objects.filter(criado_por=request.auth).get(
-            company_id=company_id
-        )
-    except Company.DoesNotExist:
+    check_contato(request.auth, data.contato_id)
+    with unique_violation("Company já existe"):
+        row = update_row(Company, request.auth, company_id, data.dict())
+    if row is None:
         raise HTTPException(404, "Company não existe")
-    try:
-        contato = Contato.objects.filter(criado_por=request.auth).get(
-            contato_id=data.contato_id
-        )
-    except Contato.DoesNotExist:
-        raise HTTPException(404, "Contato não existe")
-
-    company.contato = contato if contato else company.contato
-    company.cnpj = data.cnpj
-    company.razao_social = data.razao_social
-    company.nome_fantasia = data.nome_fantasia
-    company.inscricao_estadual = data.inscricao_estadual
-    company.inscricao_municipal = data.inscricao_municipal
-    company.save()
     return {
-        "message": f"Company de nome {company.nome_fantasia} "
-        f"e id {company.company_id} atualizada"
+        "message": f"Company de nome {data.nome_fantasia} "
+        f"e id {company_id} atualizada"
     }
 
 
+@api.patch(
+    "/companies/{company_id}",
+    response=responses_dict,
+    tags=["companies"],
+)
+@offload
+def patch_company(
+    request: Request, company_id: str, data: CompanyPatchSchema
+) -> Dict[str, str]:
+    changes = get_changes(data)
+    if "contato_id" in changes:
+        check_contato(request.auth, changes["contato_id"])
+    with unique_violation("Company já existe"):
+        row = update_row(Company, request.auth, company_id, changes, ["nome_fantasia"])
+    if row is None:
+        raise HTTPException(404, "Company não existe")
+    return {"message": f"Company de nome {row[0]} e id {company_id} atualizada"}
+
+
 @api.delete(
     "/companies/{company_id}",
     response=responses_dict,
     tags=["companies"],
 )
+@offload
 def delete_companies(request: Request, company_id: str) -> Dict[str, str]:
-    try:
-        company = Company.objects.filter(criado_por=request.auth).get(
-            company_id=company_id
-        )
-    except Company.DoesNotExist:
+    rows = delete_rows(Company, request.auth, [company_id], ["nome_fantasia"])
+    if not rows:
         raise HTTPException(404, "Company não existe, certeza que esta company existe?")
-    company.delete()
-    return {
-        "message": f"Company de nome {company.nome_fantasia} e id {company_id} deletada"
-    }
+    [(nome_fantasia,)] = rows.values()
+    return {"message": f"Company de nome {nome_fantasia} e id {company_id} deletada"}
+
+
+@api.post("/companies/bulk/delete", response=response_bulk, tags=["companies"])
+@offload
+def bulk_delete_companies(
+    request: Request, data: BulkDeleteSchema
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data.ids)
+    results = bulk.bulk_delete(
+        Company,
+        request.auth,
+        data.ids,
+        "nome_fantasia",
+        "Company de nome {name} e id {id} deletada",
+        "Company não existe",
+    )
+    return {"results": results}
 
 
 @api.get(
@@ -334,21 +609,50 @@ def delete_companies(request: Request, company_id: str) -> Dict[str, str]:
     response=response_get_processos,
     tags=["processos"],
 )
+@offload
 def get_processos(
     request: Request,
-) -> Tuple[int, Dict[str, Union[str, List[Dict[str, Union[str, int, float, bool]]]]]]:
+    params: ListParams = Query(...),
+    filters: ProcessoFilterSchema = Query(...),
+    order_by: Optional[ProcessoOrdering] = None,
+) -> HttpResponseBase:
     if request.auth.is_superuser:
         processos = Processo.objects.all()
     else:
         processos = Processo.objects.filter(criado_por=request.auth)
-    if processos:
-        return 200, {
-            "processos": [
-                ProcessoSchema.from_orm(processo).dict() for processo in processos
-            ]
-        }
+    processos = filters.filter(processos)
+    ordering = (order_by, "pk") if order_by else DEFAULT_ORDERING
+    return list_response(
+        request, processos, ProcessoSchema, "processos", ordering, params
+    )
+
+
+@api.get("/processos/stats", response=response_processo_stats, tags=["processos"])
+@offload
+def get_processo_stats(
+    request: Request, filters: ProcessoStatsFilterSchema = Query(...)
+) -> Dict[str, Any]:
+    rollups = filters.filter(ProcessoRollup.objects.all())
+    return {"stats": processo_stats(request.auth, rollups)}
+
+
+@api.get("/processos/analytics", response=response_analytics, tags=["processos"])
+@offload
+def get_processo_analytics(
+    request: Request,
+    params: AnalyticsParams = Query(...),
+    filters: ProcessoFilterSchema = Query(...),
+) -> Dict[str, Any]:
+    if request.auth.is_superuser:
+        processos = Processo.objects.all()
     else:
-        return 204, {"message": "No content"}
+        processos = Processo.objects.filter(criado_por=request.auth)
+    processos = filters.filter(processos)
+    return {
+        "metric": params.metric,
+        "by": params.by,
+        "groups": distributions(processos, params.by, params.metric, params.bins),
+    }
 
 
 @api.post(
@@ -356,140 +660,272 @@ def get_processos(
     response=responses_dict,
     tags=["processos"],
 )
+@offload
 def create_processo(request: Request, data: ProcessoSchema) -> Dict[str, str]:
     processo = Processo.objects.create(**data.dict(), criado_por=request.auth)
     return {
         "message": f"Processo de numero {processo.numero_processo} "
-        f"e id {processo.processo_id} e criado"
+        f"e id {processo.processo_id.hex} e criado"
     }
 
 
+@api.post("/processos/bulk", response=response_bulk, tags=["processos"])
+@offload
+def bulk_create_processos(
+    request: Request, data: List[ProcessoSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_create_processos(request.auth, data)}
+
+
+@api.put("/processos/bulk", response=response_bulk, tags=["processos"])
+@offload
+def bulk_upsert_processos(
+    request: Request, data: List[ProcessoUpsertSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_upsert_processos(request.auth, data)}
+
+
+@api.patch("/processos/bulk", response=response_bulk, tags=["processos"])
+@offload
+def bulk_patch_processos(
+    request: Request, data: List[ProcessoBulkPatchSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_patch_processos(request.auth, data)}
+
+
 @api.put(
     "/processos/{processo_id}",
     response=responses_dict,
     tags=["processos"],
 )
+@offload
 def update_processo(
     request: Request, processo_id: str, data: ProcessoSchema
 ) -> Dict[str, str]:
-    processo = Processo.objects.filter(criado_por=request.auth).get(
-        processo_id=processo_id
-    )
-    processo.advogado_responsavel = data.advogado_responsavel
-    processo.cliente = data.cliente
-    processo.numero_processo = data.numero_processo
-    processo.vara = data.vara
-    processo.comarca = data.comarca
-    processo.estado = data.estado
-    processo.status = data.status
-    processo.fase = data.fase
-    processo.valor_causa = data.valor_causa
-    processo.valor_condenacao = data.valor_condenacao
-    processo.valor_honorario = data.valor_honorario
-    processo.valor_preposto = data.valor_preposto
-    processo.valor_total = data.valor_total
-    processo.data_distribuicao = data.data_distribuicao
-    processo.save()
+    if update_row(Processo, request.auth, processo_id, data.dict()) is None:
+        raise HTTPException(404, "Processo não encontrado")
     return {
-        "message": f"Processo de numero {processo.numero_processo} "
-        f"e id {processo.processo_id} atualizado"
+        "message": f"Processo de numero {data.numero_processo} "
+        f"e id {processo_id} atualizado"
     }
 
 
+@api.patch(
+    "/processos/{processo_id}",
+    response=responses_dict,
+    tags=["processos"],
+)
+@offload
+def patch_processo(
+    request: Request, processo_id: str, data: ProcessoPatchSchema
+) -> Dict[str, str]:
+    row = update_row(
+        Processo, request.auth, processo_id, get_changes(data), ["numero_processo"]
+    )
+    if row is None:
+        raise HTTPException(404, "Processo não encontrado")
+    return {"message": f"Processo de numero {row[0]} e id {processo_id} atualizado"}
+
+
 @api.delete(
     "/processos/{processo_id}",
     response=responses_dict,
     tags=["processos"],
 )
+@offload
 def delete_processo(request: Request, processo_id: str) -> Dict[str, str]:
-    try:
-        processo = Processo.objects.filter(criado_por=request.auth).get(
-            processo_id=processo_id
-        )
-    except Processo.DoesNotExist:
+    rows = delete_rows(Processo, request.auth, [processo_id], ["numero_processo"])
+    if not rows:
         raise HTTPException(
             404, "Processo não existe, certeza que este processo existe?"
         )
-    processo.delete()
+    [(numero_processo,)] = rows.values()
     return {
-        "message": f"Processo de numero {processo.numero_processo} "
+        "message": f"Processo de numero {numero_processo} "
         f"e id {processo_id}  deletado"
     }
 
 
+@api.post("/processos/bulk/delete", response=response_bulk, tags=["processos"])
+@offload
+def bulk_delete_processos(
+    request: Request, data: BulkDeleteSchema
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data.ids)
+    results = bulk.bulk_delete(
+        Processo,
+        request.auth,
+        data.ids,
+        "numero_processo",
+        "Processo de numero {name} e id {id} deletado",
+        "Processo não existe",
+    )
+    return {"results": results}
+
+
 # PRODUTO
 
 
 @api.post("/produtos", response=responses_dict, tags=["produtos"])
+@offload
 def create_produto(request: Request, data: ProdutoSchema) -> Dict[str, str]:
     produto = Produto.objects.create(**data.dict(), criado_por=request.auth)
     return {
         "message": f"Produto de nome {produto.nome} "
-        f"e id {produto.id_produto} criado"
+        f"e id {produto.id_produto.hex} criado"
     }
 
 
+@api.post("/produtos/bulk", response=response_bulk, tags=["produtos"])
+@offload
+def bulk_create_produtos(
+    request: Request, data: List[ProdutoSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_create_produtos(request.auth, data)}
+
+
+@api.put("/produtos/bulk", response=response_bulk, tags=["produtos"])
+@offload
+def bulk_upsert_produtos(
+    request: Request, data: List[ProdutoUpsertSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_upsert_produtos(request.auth, data)}
+
+
+@api.patch("/produtos/bulk", response=response_bulk, tags=["produtos"])
+@offload
+def bulk_patch_produtos(
+    request: Request, data: List[ProdutoBulkPatchSchema]
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data)
+    return {"results": bulk.bulk_patch_produtos(request.auth, data)}
+
+
 @api.get("/produtos", response=response_get_produtos, tags=["produtos"])
+@offload
 def get_produtos(
     request: Request,
-) -> Tuple[int, Dict[str, Union[str, List[Dict[str, Union[str, int, float, bool]]]]]]:
+    params: ListParams = Query(...),
+    filters: ProdutoFilterSchema = Query(...),
+    order_by: Optional[ProdutoOrdering] = None,
+) -> HttpResponseBase:
     produtos: QuerySet[Produto]
     if request.auth.is_superuser:
         produtos = Produto.objects.all()
     else:
         produtos = Produto.objects.filter(criado_por=request.auth)
-    if produtos:
-        return 200, {
-            "produtos": [ProdutoSchema.from_orm(produto).dict() for produto in produtos]
-        }
-    else:
-        return 204, {"message": "No content"}
+    produtos = filters.filter(produtos)
+    ordering = (order_by, "pk") if order_by else DEFAULT_ORDERING
+    return list_response(request, produtos, ProdutoSchema, "produtos", ordering, params)
+
+
+@api.post("/produtos/stock", response=response_stocks, tags=["produtos"])
+@offload
+def reserve_stock(
+    request: Request, data: List[StockItemSchema]
+) -> Dict[str, List[Dict[str, Any]]]:
+    check_bulk_size(data)
+    quantidades = stock.reserve_stock(request.auth, data)
+    return {
+        "produtos": [
+            {"id_produto": key.hex, "quantidade": quantidade}
+            for key, quantidade in quantidades.items()
+        ]
+    }
+
+
+@api.post("/produtos/{produto_id}/stock", response=response_stock, tags=["produtos"])
+@offload
+def adjust_stock(
+    request: Request, produto_id: str, data: StockDeltaSchema
+) -> Dict[str, Any]:
+    quantidade = stock.adjust_stock(request.auth, produto_id, data.delta)
+    return {"id_produto": produto_id, "quantidade": quantidade}
 
 
 @api.get("/produtos/{produto_id}", response=ProdutoSchema, tags=["produtos"])
-def get_produto(request: Request, produto_id: str) -> Optional[ProdutoSchema]:
-    try:
-        produto: Produto = Produto.objects.filter(criado_por=request.auth).get(
-            id_produto=produto_id
-        )
-        if produto:
-            return ProdutoSchema.from_orm(produto)
-        return None
-    except Produto.DoesNotExist:
+@offload
+def get_produto(
+    request: Request, produto_id: str, fields: Optional[str] = None
+) -> HttpResponseBase:
+    serializer = get_serializer(ProdutoSchema, parse_fields(ProdutoSchema, fields))
+    cache_key = response_cache.key(request, "produto", Produto, request.auth.pk)
+    response = response_cache.get(request, cache_key)
+    if response is not None:
+        return response
+    row = serializer.values(
+        Produto.objects.filter(
+            criado_por=request.auth, id_produto=parse_id(produto_id)
+        ),
+        ["atualizado_em"],
+    ).first()
+    if row is None:
         raise HTTPException(status_code=404, message="Produto não encontrado")
+    (atualizado_em,) = serializer.extra(row)
+    validators = make_etag(request, atualizado_em), atualizado_em
+    response = not_modified(request, validators)
+    if response is not None:
+        return set_validators(response, validators)
+    response = api.create_response(request, serializer.row(row), status=200)
+    return response_cache.set(cache_key, set_validators(response, validators))
 
 
 @api.put("/produtos/{produto_id}", response=responses_dict, tags=["produtos"])
+@offload
 def update_produto(
     request: Request, produto_id: str, data: ProdutoSchema
 ) -> Tuple[int, Dict[str, str]]:
-    try:
-        produto: Produto = Produto.objects.filter(criado_por=request.auth).get(
-            id_produto=produto_id
-        )
-    except Produto.DoesNotExist:
+    if update_row(Produto, request.auth, produto_id, data.dict()) is None:
         raise HTTPException(status_code=404, message="Produto não encontrado")
-    produto.nome = data.nome
-    produto.descricao = data.descricao
-    produto.preco = data.preco
-    produto.quantidade = data.quantidade
-    produto.save()
     return 200, {
-        "message": f"Produto de nome {produto.nome} e id {produto_id} "
+        "message": f"Produto de nome {data.nome} e id {produto_id} "
+        "atualizado com sucesso"
+    }
+
+
+@api.patch("/produtos/{produto_id}", response=responses_dict, tags=["produtos"])
+@offload
+def patch_produto(
+    request: Request, produto_id: str, data: ProdutoPatchSchema
+) -> Tuple[int, Dict[str, str]]:
+    row = update_row(Produto, request.auth, produto_id, get_changes(data), ["nome"])
+    if row is None:
+        raise HTTPException(status_code=404, message="Produto não encontrado")
+    return 200, {
+        "message": f"Produto de nome {row[0]} e id {produto_id} "
         "atualizado com sucesso"
     }
 
 
 @api.delete("/produtos/{produto_id}", tags=["produtos"])
+@offload
 def delete_produto(request: Request, produto_id: str) -> Tuple[int, Dict[str, str]]:
-    try:
-        produto: Produto = Produto.objects.filter(criado_por=request.auth).get(
-            id_produto=produto_id
-        )
-    except Produto.DoesNotExist:
+    rows = delete_rows(Produto, request.auth, [produto_id], ["nome"])
+    if not rows:
         raise HTTPException(status_code=404, message="Produto não encontrado")
-    nome = produto.nome
-    produto.delete()
+    [(nome,)] = rows.values()
     return 200, {
         "message": f"Produto de nome {nome} e id {produto_id} deletado com sucesso"
     }
+
+
+@api.post("/produtos/bulk/delete", response=response_bulk, tags=["produtos"])
+@offload
+def bulk_delete_produtos(
+    request: Request, data: BulkDeleteSchema
+) -> Dict[str, BulkResults]:
+    check_bulk_size(data.ids)
+    results = bulk.bulk_delete(
+        Produto,
+        request.auth,
+        data.ids,
+        "nome",
+        "Produto de nome {name} e id {id} deletado com sucesso",
+        "Produto não encontrado",
+    )
+    return {"results": results}
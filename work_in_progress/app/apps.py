@@ -3,4 +3,8 @@ from django.apps import AppConfig
 
 class App(AppConfig):
     default_auto_field = "django.db.models.BigAutoField"
-    name = "app"
+    name = "work_in_progress.app"
+    label = "app"
+
+    def ready(self) -> None:
+        from work_in_progress.app import metrics, signals  # noqa: F401
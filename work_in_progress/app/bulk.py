@@ -0,0 +1,439 @@
+from typing import Any, Dict, List, Optional, Sequence, Set, Tuple, Type
+from uuid import UUID
+
+from django.db import connection, transaction
+from django.db.models import Model
+from django.utils import timezone
+
+from work_in_progress.app.exceptions import unique_violation
+from work_in_progress.app.models import (
+    Company,
+    Contato,
+    Processo,
+    Produto,
+    SystemUser,
+    get_new_uuid7,
+    normalize_cnpj,
+    parse_id,
+)
+from work_in_progress.app.schemas import (
+    CompanySchema,
+    ContatoSchema,
+    ProcessoBulkPatchSchema,
+    ProcessoSchema,
+    ProcessoUpsertSchema,
+    ProdutoBulkPatchSchema,
+    ProdutoSchema,
+    ProdutoUpsertSchema,
+)
+from work_in_progress.app.signals import rows_changed
+from work_in_progress.app.updates import delete_rows
+from work_in_progress.settings import BULK_BATCH_SIZE
+
+BulkResults = List[Dict[str, Any]]
+
+
+def _error(index: int, status: int, message: str) -> Dict[str, Any]:
+    return {"index": index, "status": status, "id": None, "message": message}
+
+
+def _created(index: int, pk: UUID, message: str) -> Dict[str, Any]:
+    return {"index": index, "status": 200, "id": pk.hex, "message": message}
+
+
+def _sorted(results: BulkResults) -> BulkResults:
+    return sorted(results, key=lambda result: result["index"])
+
+
+@transaction.atomic
+def bulk_create_contatos(user: SystemUser, items: List[ContatoSchema]) -> BulkResults:
+    """
+    Create every contato of the batch whose email_responsavel is not taken
+    by the user.
+
+    Existing emails are looked up with a single query and repeated emails
+    inside the batch are rejected after their first occurrence. Valid items
+    are inserted in one transaction.
+    """
+    emails = {item.email_responsavel for item in items}
+    taken: Set[str] = set(
+        Contato.objects.filter(
+            criado_por=user, email_responsavel__in=emails
+        ).values_list("email_responsavel", flat=True)
+    )
+    results, to_create = [], []
+    for index, item in enumerate(items):
+        if item.email_responsavel in taken:
+            results.append(_error(index, 400, "Contato já existe"))
+            continue
+        taken.add(item.email_responsavel)
+        to_create.append((index, Contato(**item.dict(), criado_por=user)))
+    with unique_violation("Contato já existe"):
+        Contato.objects.bulk_create(
+            [contato for _, contato in to_create], batch_size=BULK_BATCH_SIZE
+        )
+    if to_create:
+        rows_changed.send(sender=Contato, owners=[user.pk])
+    results += [
+        _created(
+            index,
+            contato.contato_id,
+            f"Contato de nome {contato.nome} e id {contato.contato_id.hex} criado",
+        )
+        for index, contato in to_create
+    ]
+    return _sorted(results)
+
+
+@transaction.atomic
+def bulk_create_companies(user: SystemUser, items: List[CompanySchema]) -> BulkResults:
+    """
+    Create every company of the batch whose cnpj is not taken by the user
+    and whose contato belongs to the user.
+
+    Cnpjs are compared by their digits, like the unique constraint. Existing
+    cnpjs and the user's contatos are each resolved with a single query.
+    """
+    taken: Set[Optional[str]] = set(
+        Company.objects.filter(
+            criado_por=user,
+            cnpj_digits__in={normalize_cnpj(item.cnpj) for item in items} - {None},
+        ).values_list("cnpj_digits", flat=True)
+    )
+    contato_ids = {parse_id(item.contato_id) for item in items} - {None}
+    contatos: Set[UUID] = set(
+        Contato.objects.filter(criado_por=user, contato_id__in=contato_ids).values_list(
+            "contato_id", flat=True
+        )
+    )
+    results, to_create = [], []
+    for index, item in enumerate(items):
+        digits = normalize_cnpj(item.cnpj)
+        if digits is not None and digits in taken:
+            results.append(_error(index, 400, "Company já existe"))
+            continue
+        if parse_id(item.contato_id) not in contatos:
+            results.append(_error(index, 404, "Contato não existe"))
+            continue
+        taken.add(digits)
+        to_create.append((index, Company(**item.dict(), criado_por=user)))
+    with unique_violation("Company já existe"):
+        Company.objects.bulk_create(
+            [company for _, company in to_create], batch_size=BULK_BATCH_SIZE
+        )
+    if to_create:
+        rows_changed.send(sender=Company, owners=[user.pk])
+    results += [
+        _created(
+            index,
+            company.company_id,
+            f"Company de nome {company.nome_fantasia} "
+            f"e id {company.company_id.hex} criada",
+        )
+        for index, company in to_create
+    ]
+    return _sorted(results)
+
+
+@transaction.atomic
+def bulk_create_processos(user: SystemUser, items: List[ProcessoSchema]) -> BulkResults:
+    processos = [Processo(**item.dict(), criado_por=user) for item in items]
+    Processo.objects.bulk_create(processos, batch_size=BULK_BATCH_SIZE)
+    rows_changed.send(sender=Processo, owners=[user.pk])
+    return [
+        _created(
+            index,
+            processo.processo_id,
+            f"Processo de numero {processo.numero_processo} "
+            f"e id {processo.processo_id.hex} e criado",
+        )
+        for index, processo in enumerate(processos)
+    ]
+
+
+@transaction.atomic
+def bulk_create_produtos(user: SystemUser, items: List[ProdutoSchema]) -> BulkResults:
+    produtos = [Produto(**item.dict(), criado_por=user) for item in items]
+    Produto.objects.bulk_create(produtos, batch_size=BULK_BATCH_SIZE)
+    rows_changed.send(sender=Produto, owners=[user.pk])
+    return [
+        _created(
+            index,
+            produto.id_produto,
+            f"Produto de nome {produto.nome} e id {produto.id_produto.hex} criado",
+        )
+        for index, produto in enumerate(produtos)
+    ]
+
+
+def _chunks(rows: List[Any]) -> List[List[Any]]:
+    return [
+        rows[start : start + BULK_BATCH_SIZE]
+        for start in range(0, len(rows), BULK_BATCH_SIZE)
+    ]
+
+
+def _column(model: Type[Model], name: str) -> Tuple[str, str]:
+    """
+    Return the quoted column of a field and a placeholder cast to its type.
+    """
+    field = model._meta.get_field(name)
+    return (
+        connection.ops.quote_name(field.column),
+        f"%s::{field.db_type(connection)}",
+    )
+
+
+def _upsert(
+    model: Type[Model], user: SystemUser, fields: Sequence[str], rows: List[Any]
+) -> Dict[UUID, bool]:
+    """
+    Insert or update rows keyed by primary key with INSERT ... ON CONFLICT.
+
+    Every row is a sequence with the primary key followed by the values of
+    fields. Conflicting rows are only updated if they belong to the user.
+
+    Returns:
+        The written primary keys, mapped to True if the row was inserted and
+        to False if it was updated.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    names = [model._meta.pk.name, *fields, "criado_por", "criado_em", "atualizado_em"]
+    columns, placeholders = zip(*(_column(model, name) for name in names))
+    pk = columns[0]
+    updates = ", ".join(
+        f"{column} = EXCLUDED.{column}" for column in columns[1 : len(fields) + 1]
+    )
+    now = timezone.now()
+    written: Dict[UUID, bool] = {}
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows):
+            values = ", ".join(f"({', '.join(placeholders)})" for _ in chunk)
+            cursor.execute(
+                f"INSERT INTO {table} ({', '.join(columns)}) VALUES {values} "
+                f"ON CONFLICT ({pk}) DO UPDATE SET {updates}, "
+                '"atualizado_em" = EXCLUDED."atualizado_em" '
+                f'WHERE {table}."criado_por_id" = EXCLUDED."criado_por_id" '
+                f"RETURNING {pk}, xmax = 0",
+                [value for row in chunk for value in (*row, user.pk, now, now)],
+            )
+            written.update(cursor.fetchall())
+    if written:
+        rows_changed.send(sender=model, owners=[user.pk])
+    return written
+
+
+def _update(
+    model: Type[Model], user: SystemUser, fields: Sequence[str], rows: List[Any]
+) -> Set[UUID]:
+    """
+    Update the given fields of the user's rows with one UPDATE ... FROM VALUES
+    statement per batch.
+
+    Every row is a sequence with the primary key followed by the values of
+    fields.
+
+    Returns:
+        The updated primary keys.
+    """
+    table = connection.ops.quote_name(model._meta.db_table)
+    columns, placeholders = zip(
+        *(_column(model, name) for name in [model._meta.pk.name, *fields])
+    )
+    pk = columns[0]
+    updates = ", ".join(f"{column} = v.{column}" for column in columns[1:])
+    now = timezone.now()
+    updated: Set[UUID] = set()
+    with connection.cursor() as cursor:
+        for chunk in _chunks(rows):
+            values = ", ".join(f"({', '.join(placeholders)})" for _ in chunk)
+            cursor.execute(
+                f'UPDATE {table} SET {updates}, "atualizado_em" = %s '
+                f"FROM (VALUES {values}) AS v ({', '.join(columns)}) "
+                f'WHERE {table}.{pk} = v.{pk} AND {table}."criado_por_id" = %s '
+                f"RETURNING {table}.{pk}",
+                [now, *(value for row in chunk for value in row), user.pk],
+            )
+            updated.update(pk for pk, in cursor.fetchall())
+    if updated:
+        rows_changed.send(sender=model, owners=[user.pk])
+    return updated
+
+
+def _upsert_rows(
+    pk_name: str, items: Sequence[Any], fields: Sequence[str]
+) -> Tuple[BulkResults, List[Tuple[int, List[Any]]]]:
+    """
+    Assign primary keys to new items and reject invalid primary keys and
+    primary keys repeated in the batch.
+    """
+    results, rows, seen = [], [], set()
+    for index, item in enumerate(items):
+        given = getattr(item, pk_name)
+        pk = parse_id(given) if given else get_new_uuid7()
+        if pk is None:
+            results.append(_error(index, 400, "Id inválido"))
+            continue
+        if pk in seen:
+            results.append(_error(index, 400, "Item repetido no lote"))
+            continue
+        seen.add(pk)
+        rows.append((index, [pk, *(getattr(item, name) for name in fields)]))
+    return results, rows
+
+
+def _patch_rows(
+    pk_name: str, items: Sequence[Any]
+) -> Tuple[BulkResults, Dict[Tuple[str, ...], List[Tuple[int, List[Any]]]]]:
+    """
+    Group the items of a bulk update by the set of fields they change, so
+    each group is written with a single statement.
+    """
+    results: BulkResults = []
+    groups: Dict[Tuple[str, ...], List[Tuple[int, List[Any]]]] = {}
+    seen = set()
+    for index, item in enumerate(items):
+        changes = item.dict(exclude_unset=True)
+        pk = parse_id(changes.pop(pk_name))
+        if pk is None:
+            results.append(_error(index, 400, "Id inválido"))
+            continue
+        if pk in seen:
+            results.append(_error(index, 400, "Item repetido no lote"))
+            continue
+        if not changes:
+            results.append(_error(index, 400, "Nenhum campo para atualizar"))
+            continue
+        seen.add(pk)
+        fields = tuple(sorted(changes))
+        groups.setdefault(fields, []).append(
+            (index, [pk, *(changes[name] for name in fields)])
+        )
+    return results, groups
+
+
+@transaction.atomic
+def bulk_upsert_produtos(
+    user: SystemUser, items: List[ProdutoUpsertSchema]
+) -> BulkResults:
+    """
+    Create the produtos without id_produto, or with an unknown one, and
+    replace the user's produtos whose id_produto is given.
+    """
+    fields = tuple(ProdutoSchema.__fields__)
+    results, rows = _upsert_rows("id_produto", items, fields)
+    written = _upsert(Produto, user, fields, [row for _, row in rows])
+    for index, (pk, nome, *_) in rows:
+        if pk not in written:
+            results.append(_error(index, 404, "Produto não encontrado"))
+        elif written[pk]:
+            results.append(
+                _created(index, pk, f"Produto de nome {nome} e id {pk.hex} criado")
+            )
+        else:
+            results.append(
+                _created(
+                    index,
+                    pk,
+                    f"Produto de nome {nome} e id {pk.hex} atualizado com sucesso",
+                )
+            )
+    return _sorted(results)
+
+
+@transaction.atomic
+def bulk_upsert_processos(
+    user: SystemUser, items: List[ProcessoUpsertSchema]
+) -> BulkResults:
+    """
+    Create the processos without processo_id, or with an unknown one, and
+    replace the user's processos whose processo_id is given.
+    """
+    fields = tuple(ProcessoSchema.__fields__)
+    numero = fields.index("numero_processo") + 1
+    results, rows = _upsert_rows("processo_id", items, fields)
+    written = _upsert(Processo, user, fields, [row for _, row in rows])
+    for index, row in rows:
+        pk = row[0]
+        if pk not in written:
+            results.append(_error(index, 404, "Processo não encontrado"))
+            continue
+        action = "e criado" if written[pk] else "atualizado"
+        results.append(
+            _created(
+                index,
+                pk,
+                f"Processo de numero {row[numero]} e id {pk.hex} {action}",
+            )
+        )
+    return _sorted(results)
+
+
+def _bulk_patch(
+    model: Type[Model],
+    user: SystemUser,
+    items: Sequence[Any],
+    label: str,
+    not_found: str,
+) -> BulkResults:
+    results, groups = _patch_rows(model._meta.pk.name, items)
+    for fields, rows in groups.items():
+        updated = _update(model, user, fields, [row for _, row in rows])
+        for index, (pk, *_) in rows:
+            if pk in updated:
+                results.append(
+                    _created(index, pk, f"{label} de id {pk.hex} atualizado")
+                )
+            else:
+                results.append(_error(index, 404, not_found))
+    return _sorted(results)
+
+
+@transaction.atomic
+def bulk_patch_produtos(
+    user: SystemUser, items: List[ProdutoBulkPatchSchema]
+) -> BulkResults:
+    """
+    Update only the fields sent for each of the user's produtos.
+    """
+    return _bulk_patch(Produto, user, items, "Produto", "Produto não encontrado")
+
+
+@transaction.atomic
+def bulk_patch_processos(
+    user: SystemUser, items: List[ProcessoBulkPatchSchema]
+) -> BulkResults:
+    """
+    Update only the fields sent for each of the user's processos.
+    """
+    return _bulk_patch(Processo, user, items, "Processo", "Processo não encontrado")
+
+
+def bulk_delete(
+    model: Type[Model],
+    user: SystemUser,
+    ids: List[str],
+    returning: str,
+    deleted: str,
+    not_found: str,
+) -> BulkResults:
+    """
+    Delete the user's rows with the given ids with a single statement.
+
+    The deleted message is formatted with the returning field as name and
+    the primary key as id.
+    """
+    keys = [parse_id(pk) for pk in ids]
+    rows = delete_rows(model, user, list(set(keys) - {None}), [returning])
+    results, seen = [], set()
+    for index, (pk, key) in enumerate(zip(ids, keys)):
+        if key is not None and key in seen:
+            results.append(_error(index, 400, "Item repetido no lote"))
+        elif key in rows:
+            results.append(
+                _created(index, key, deleted.format(name=rows[key][0], id=pk))
+            )
+        else:
+            results.append(_error(index, 404, not_found))
+        seen.add(key)
+    return results
@@ -0,0 +1,456 @@
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, List, Optional, Sequence, Tuple, Type, TypeVar
+from uuid import uuid4
+
+from django.conf import settings
+from django.core.cache import caches
+from django.db import transaction
+from django.db.models import Model
+from django.http import HttpRequest, HttpResponse
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import parse_http_date_safe, urlencode
+
+from work_in_progress.app.models import SystemUser
+
+T = TypeVar("T")
+
+
+class UserCache:
+    """
+    Bounded, TTL based cache of the SystemUser resolved from a token 'sub'.
+
+    Lookups go through an in-process LRU first and, when an alias is
+    configured, through a shared Django cache backend before falling back
+    to the database.
+    """
+
+    key_prefix = "auth-user"
+
+    def __init__(self, maxsize: int, ttl: float, alias: Optional[str] = None) -> None:
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.alias = alias
+        self.hits = 0
+        self.shared_hits = 0
+        self.misses = 0
+        self._entries: "OrderedDict[str, Tuple[float, SystemUser]]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def _shared_key(self, sub: str) -> str:
+        return f"{self.key_prefix}:{sub}"
+
+    def _get_local(self, sub: str) -> Optional[SystemUser]:
+        with self._lock:
+            entry = self._entries.get(sub)
+            if entry is None:
+                return None
+            expires_at, user = entry
+            if expires_at < time.monotonic():
+                del self._entries[sub]
+                return None
+            self._entries.move_to_end(sub)
+            return user
+
+    def _set_local(self, sub: str, user: SystemUser) -> None:
+        with self._lock:
+            self._entries[sub] = (time.monotonic() + self.ttl, user)
+            self._entries.move_to_end(sub)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_local(self, sub: Any) -> Optional[SystemUser]:
+        """
+        Return the SystemUser for the given token subject if it is in the
+        in-process LRU, without any I/O.
+        """
+        user = self._get_local(str(sub))
+        if user is not None:
+            self.hits += 1
+        return user
+
+    def get(self, sub: Any) -> SystemUser:
+        """
+        Return the SystemUser for the given token subject.
+
+        Raises:
+            SystemUser.DoesNotExist: If no user matches the subject.
+        """
+        key = str(sub)
+        user = self._get_local(key)
+        if user is not None:
+            self.hits += 1
+            return user
+        if self.alias:
+            user = caches[self.alias].get(self._shared_key(key))
+            if user is not None:
+                self.shared_hits += 1
+                self._set_local(key, user)
+                return user
+        self.misses += 1
+        user = SystemUser.objects.get(id=sub)
+        self._set_local(key, user)
+        if self.alias:
+            caches[self.alias].set(self._shared_key(key), user, timeout=self.ttl)
+        return user
+
+    def invalidate(self, sub: Any) -> None:
+        """
+        Drop the user from this process and the shared backend. The other
+        processes keep their local entry until it expires, after the ttl.
+        """
+        key = str(sub)
+        with self._lock:
+            self._entries.pop(key, None)
+        if self.alias:
+            caches[self.alias].delete(self._shared_key(key))
+
+    def clear(self) -> None:
+        with self._lock:
+            self._entries.clear()
+        self.hits = self.shared_hits = self.misses = 0
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "hits": self.hits,
+            "shared_hits": self.shared_hits,
+            "misses": self.misses,
+            "size": len(self._entries),
+        }
+
+
+user_cache = UserCache(
+    maxsize=settings.AUTH_USER_CACHE_MAXSIZE,
+    ttl=settings.AUTH_USER_CACHE_TTL,
+    alias=settings.AUTH_USER_CACHE_ALIAS,
+)
+
+
+# A rendered response as stored in the cache: status, content and headers.
+ResponseEntry = Tuple[int, bytes, Dict[str, str]]
+
+
+def freeze_response(
+    response: HttpResponseBase, headers: Sequence[str]
+) -> ResponseEntry:
+    """
+    Return the status, the content and the given headers of a response.
+    """
+    kept = {name: response[name] for name in headers if name in response}
+    return response.status_code, response.content, kept
+
+
+def thaw_response(entry: ResponseEntry) -> HttpResponse:
+    status, content, headers = entry
+    response = HttpResponse(content, status=status)
+    for name, value in headers.items():
+        response[name] = value
+    return response
+
+
+class VersionedCache:
+    """
+    Base of the caches whose keys embed a version of the rows of a model,
+    one per model and owner and one per model for superusers, stored in the
+    cache backend alias and bumped by invalidate().
+    """
+
+    key_prefix: str
+
+    def __init__(self, alias: Optional[str]) -> None:
+        self.alias = alias
+        self.invalidations = 0
+
+    def _version_key(self, model: Type[Model], owner: Optional[Any]) -> str:
+        key = f"{self.key_prefix}:version:{model._meta.label_lower}"
+        return key if owner is None else f"{key}:{owner}"
+
+    def _version(self, key: str) -> str:
+        cache = caches[self.alias]
+        version = cache.get(key)
+        if version is None:
+            cache.add(key, uuid4().hex, timeout=None)
+            version = cache.get(key)
+        return version
+
+    def _bump(self, keys: List[str]) -> None:
+        caches[self.alias].set_many({key: uuid4().hex for key in keys}, timeout=None)
+
+    def invalidate(self, model: Type[Model], owners: Sequence[Any]) -> None:
+        """
+        Bump the versions of the rows of model owned by the owners.
+
+        The versions are bumped at once and again when the transaction
+        commits, so entries computed from the rows read before the commit
+        are not used afterwards.
+        """
+        if not self.alias:
+            return
+        self.invalidations += 1
+        keys = [self._version_key(model, None)]
+        keys += [self._version_key(model, owner) for owner in set(owners)]
+        self._bump(keys)
+        transaction.on_commit(lambda: self._bump(keys))
+
+
+class ResponseCache(VersionedCache):
+    """
+    Cache of rendered list and detail responses, stored as bytes in a Django
+    cache backend and keyed by endpoint, user and query parameters.
+
+    Every key embeds the version of the rows it was rendered from: one
+    version per model and user for the responses showing the rows of one
+    user, and one per model for the responses of superusers, which show the
+    rows of every user. A write bumps the versions of the model and owner it
+    touched, so only the responses that may have changed stop being found,
+    and the stale entries expire after the ttl.
+    """
+
+    key_prefix = "response"
+    headers = ("Content-Type", "ETag", "Last-Modified", "Vary")
+
+    def __init__(
+        self, alias: Optional[str], ttl: float, exclude: Sequence[str] = ()
+    ) -> None:
+        super().__init__(alias)
+        self.ttl = ttl
+        self.exclude = frozenset(exclude)
+        self.hits = 0
+        self.misses = 0
+
+    def key(
+        self,
+        request: HttpRequest,
+        endpoint: str,
+        model: Type[Model],
+        owner: Optional[Any],
+    ) -> Optional[str]:
+        """
+        Return the cache key of the response of an endpoint showing the rows of
+        model owned by owner, or of every user if owner is None.
+
+        The key must be computed before the rows are read, so a write
+        committed meanwhile makes the response be stored under a stale
+        version instead of being served as current.
+
+        Returns:
+            The key, or None if responses of the endpoint are not cached.
+        """
+        if not self.alias or endpoint in self.exclude:
+            return None
+        version = self._version(self._version_key(model, owner))
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        digest = hashlib.sha1(f"{request.path}?{query}".encode()).hexdigest()
+        return f"{self.key_prefix}:{endpoint}:{request.auth.pk}:{version}:{digest}"
+
+    def get(
+        self, request: HttpRequest, key: Optional[str]
+    ) -> Optional[HttpResponseBase]:
+        """
+        Return the cached response, or a 304 if the request is conditional and
+        the client has it already.
+        """
+        if key is None:
+            return None
+        entry = caches[self.alias].get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self.hits += 1
+        response = thaw_response(entry)
+        response["X-Cache"] = "HIT"
+        return get_conditional_response(
+            request,
+            etag=response.get("ETag"),
+            last_modified=parse_http_date_safe(response.get("Last-Modified", "")),
+            response=response,
+        )
+
+    def set(self, key: Optional[str], response: HttpResponseBase) -> HttpResponseBase:
+        """
+        Store a successful, non streaming response and return it.
+        """
+        if key is None or response.streaming or response.status_code not in (200, 204):
+            return response
+        caches[self.alias].set(
+            key, freeze_response(response, self.headers), timeout=self.ttl
+        )
+        response["X-Cache"] = "MISS"
+        return response
+
+    def clear(self) -> None:
+        if self.alias:
+            caches[self.alias].clear()
+        self.hits = self.misses = self.invalidations = 0
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "invalidations": self.invalidations,
+            "hit_rate": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache(
+    alias=settings.RESPONSE_CACHE_ALIAS,
+    ttl=settings.RESPONSE_CACHE_TTL,
+    exclude=settings.RESPONSE_CACHE_EXCLUDE,
+)
+
+
+class _Call:
+    def __init__(self) -> None:
+        self.done = threading.Event()
+        self.result: Any = None
+        self.error: Optional[BaseException] = None
+
+
+# Model, owner of the rows (None for superusers) and request.
+FlightKey = Tuple[Type[Model], Optional[Any], str]
+
+
+class SingleFlight(VersionedCache):
+    """
+    Share one computation between the identical requests in flight at the
+    same time.
+
+    The first request of a key runs the computation and the requests
+    arriving before it ends wait for its result instead of running their
+    own. With a cache alias, the workers sharing the backend also wait for
+    the one holding the lock of the key, and read its result from the
+    cache. Results are never kept after the computation ends.
+
+    Writes to the rows of a model and owner detach the computations of
+    their keys, here and through the versions of the key in the other
+    workers, so requests arriving after a write never get a result read
+    before it.
+    """
+
+    key_prefix = "flight"
+
+    def __init__(self, alias: Optional[str], timeout: float, poll: float) -> None:
+        super().__init__(alias)
+        self.timeout = timeout
+        self.poll = poll
+        self.leaders = 0
+        self.followers = 0
+        self.shared_followers = 0
+        self._calls: Dict[FlightKey, _Call] = {}
+        self._lock = threading.Lock()
+
+    def key(
+        self,
+        request: HttpRequest,
+        endpoint: str,
+        model: Type[Model],
+        owner: Optional[Any],
+    ) -> FlightKey:
+        query = urlencode(sorted(request.GET.lists()), doseq=True)
+        return model, owner, f"{endpoint}:{request.auth.pk}:{request.path}?{query}"
+
+    def run(self, key: FlightKey, compute: Callable[[], T]) -> T:
+        """
+        Return the result of compute, or of the computation of the same key
+        in flight.
+
+        Waiters get the exception of a failed computation, and compute the
+        result themselves if it takes longer than the timeout.
+        """
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if call is None:
+                call = self._calls[key] = _Call()
+                self.leaders += 1
+            else:
+                self.followers += 1
+        if not leader:
+            if not call.done.wait(self.timeout):
+                return compute()
+            if call.error is not None:
+                raise call.error
+            return call.result
+        try:
+            call.result = self._run_shared(key, compute)
+            return call.result
+        except BaseException as error:
+            call.error = error
+            raise
+        finally:
+            with self._lock:
+                if self._calls.get(key) is call:
+                    del self._calls[key]
+            call.done.set()
+
+    def _run_shared(self, key: FlightKey, compute: Callable[[], T]) -> T:
+        if not self.alias:
+            return compute()
+        cache = caches[self.alias]
+        model, owner, request = key
+        version = self._version(self._version_key(model, owner))
+        digest = hashlib.sha1(request.encode()).hexdigest()
+        lock = f"{self.key_prefix}:{version}:{digest}"
+        token = uuid4().hex
+        deadline = time.monotonic() + self.timeout
+        while time.monotonic() < deadline:
+            if cache.add(lock, token, timeout=self.timeout):
+                try:
+                    result = compute()
+                    cache.set(f"{lock}:{token}", result, timeout=self.timeout)
+                    return result
+                finally:
+                    if cache.get(lock) == token:
+                        cache.delete(lock)
+            leader = cache.get(lock)
+            # A leader failing or timing out drops its lock without result,
+            # and the waiters race for the lock again.
+            while leader is not None and time.monotonic() < deadline:
+                time.sleep(self.poll)
+                # The result is stored before the lock is dropped, so it is
+                # read after the lock to never miss it.
+                current = cache.get(lock)
+                result = cache.get(f"{lock}:{leader}")
+                if result is not None:
+                    self.shared_followers += 1
+                    return result
+                if current != leader:
+                    break
+        return compute()
+
+    def invalidate(self, model: Type[Model], owners: Sequence[Any]) -> None:
+        """
+        Detach the computations showing rows of model owned by the owners,
+        at once and when the transaction commits, so the next requests start
+        their own.
+        """
+        changed = set(owners)
+
+        def detach() -> None:
+            with self._lock:
+                for key in list(self._calls):
+                    if key[0] is model and (key[1] is None or key[1] in changed):
+                        del self._calls[key]
+
+        detach()
+        transaction.on_commit(detach)
+        super().invalidate(model, owners)
+
+    def stats(self) -> Dict[str, int]:
+        return {
+            "leaders": self.leaders,
+            "followers": self.followers,
+            "shared_followers": self.shared_followers,
+            "in_flight": len(self._calls),
+        }
+
+
+list_flights = SingleFlight(
+    alias=settings.SINGLE_FLIGHT_ALIAS,
+    timeout=settings.SINGLE_FLIGHT_TIMEOUT,
+    poll=settings.SINGLE_FLIGHT_POLL_SECONDS,
+)
@@ -0,0 +1,143 @@
+import asyncio
+import contextvars
+import functools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Awaitable, Callable, Dict, TypeVar
+
+from asgiref.sync import sync_to_async
+from django.core.handlers import asgi
+from django.core.handlers.asgi import ASGIRequest
+from django.db import close_old_connections
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+
+from work_in_progress.settings import ASYNC_DB_THREADS, STREAM_READ_AHEAD
+
+T = TypeVar("T")
+
+# Threads running the ORM code of the views served through asgi.py. Django 3.1
+# has no async ORM, so this bounds both the blocking work in flight and the
+# database connections of a process, whatever the number of open requests.
+db_executor = ThreadPoolExecutor(max_workers=ASYNC_DB_THREADS, thread_name_prefix="db")
+
+
+def _run_in_pool(func: Callable[..., T], /, *args: Any, **kwargs: Any) -> T:
+    # Pool threads outlive requests, so their connections are checked and
+    # closed like the ones of request threads, as request_started and
+    # request_finished do.
+    close_old_connections()
+    try:
+        return func(*args, **kwargs)
+    finally:
+        close_old_connections()
+
+
+async def run_sync(
+    request: HttpRequest, func: Callable[..., T], *args: Any, **kwargs: Any
+) -> T:
+    """
+    Run blocking code of an async view without blocking the event loop.
+
+    Requests served through asgi.py run it in db_executor. Requests served
+    through wsgi.py, or by the test client, run it in the thread serving
+    the request, which is blocked on the view anyway and owns the current
+    connection and transaction.
+    """
+    if not isinstance(request, ASGIRequest):
+        return await sync_to_async(func, thread_sensitive=True)(*args, **kwargs)
+    return await _submit(func, *args, **kwargs)
+
+
+def _submit(func: Callable[..., T], *args: Any, **kwargs: Any) -> "asyncio.Future[T]":
+    context = contextvars.copy_context()
+
+    def call() -> T:
+        return context.run(_run_in_pool, func, *args, **kwargs)
+
+    return asyncio.get_event_loop().run_in_executor(db_executor, call)
+
+
+def offload(view: Callable[..., T]) -> Callable[..., Awaitable[T]]:
+    """
+    Turn a synchronous view into an async one running it with run_sync.
+
+    The signature of the view is kept, so ninja still reads its parameters.
+    """
+
+    @functools.wraps(view)
+    async def async_view(request: HttpRequest, *args: Any, **kwargs: Any) -> T:
+        return await run_sync(request, view, request, *args, **kwargs)
+
+    return async_view
+
+
+class ASGIHandler(asgi.ASGIHandler):
+    """
+    ASGIHandler sending streaming responses without running their iterator
+    on the event loop.
+
+    Django 3.1 iterates them on the event loop, where the ORM refuses to run,
+    so the rows of a stream are read in one db_executor thread, which owns
+    the server-side cursor, at most STREAM_READ_AHEAD parts ahead of the
+    client. A stream holds its thread until it is sent or the client goes
+    away, so ASYNC_DB_THREADS also bounds the streams in flight.
+    """
+
+    async def send_response(
+        self, response: HttpResponseBase, send: Callable[[Dict[str, Any]], Any]
+    ) -> None:
+        if not response.streaming:
+            await super().send_response(response, send)
+            return
+        loop = asyncio.get_event_loop()
+        parts: "asyncio.Queue[Any]" = asyncio.Queue(maxsize=STREAM_READ_AHEAD)
+        end = object()
+        stopped = threading.Event()
+
+        def put(part: Any) -> None:
+            asyncio.run_coroutine_threadsafe(parts.put(part), loop).result()
+
+        def produce() -> None:
+            try:
+                for part in response:
+                    put(part)
+                    if stopped.is_set():
+                        break
+            finally:
+                # Closes the iterator, and its cursor, in the thread it ran in.
+                response.close()
+                put(end)
+
+        headers = [
+            (str(header).encode("ascii"), str(value).encode("latin1"))
+            for header, value in response.items()
+        ]
+        for cookie in response.cookies.values():
+            headers.append(
+                (b"Set-Cookie", cookie.output(header="").encode("ascii").strip())
+            )
+        await send(
+            {
+                "type": "http.response.start",
+                "status": response.status_code,
+                "headers": headers,
+            }
+        )
+        produced = _submit(produce)
+        try:
+            while True:
+                part = await parts.get()
+                if part is end:
+                    break
+                for chunk, _ in self.chunk_bytes(part):
+                    await send(
+                        {"type": "http.response.body", "body": chunk, "more_body": True}
+                    )
+        finally:
+            # Unblocks the producer if the client went away, so it stops.
+            stopped.set()
+            while not parts.empty():
+                parts.get_nowait()
+            await produced
+        await send({"type": "http.response.body"})
@@ -0,0 +1,76 @@
+import hashlib
+from datetime import datetime
+from typing import Any, Optional, Tuple
+
+from django.db.models import Count, Max, QuerySet
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+
+Validators = Tuple[str, Optional[datetime]]
+
+
+def make_etag(request: HttpRequest, *parts: Any) -> str:
+    """
+    Build an ETag from the user, the full request path and the given parts.
+    """
+    digest = hashlib.sha1(
+        repr((request.auth.pk, request.get_full_path(), parts)).encode()
+    )
+    return quote_etag(digest.hexdigest())
+
+
+def list_validators(
+    request: HttpRequest, queryset: QuerySet, media_type: str
+) -> Validators:
+    """
+    Compute the validators of a streamed list from max(atualizado_em) and the
+    row count, before any row is sent.
+
+    Any insert or update bumps the latest atualizado_em and any delete changes
+    the count, so the ETag changes whenever the listed rows do. The aggregate
+    reads every listed row, as the stream itself does.
+
+    Lists have no Last-Modified: max(atualizado_em) doesn't change when a row
+    is deleted and has a resolution of one second, so If-Modified-Since
+    would answer 304 for lists that changed.
+    """
+    stats = queryset.order_by().aggregate(
+        last_modified=Max("atualizado_em"), count=Count("pk")
+    )
+    etag = make_etag(request, media_type, stats["last_modified"], stats["count"])
+    return etag, None
+
+
+def content_validators(request: HttpRequest, response: HttpResponseBase) -> Validators:
+    """
+    Compute the validators of a rendered page from its media type and body,
+    which costs no query beyond the one of the page.
+    """
+    digest = hashlib.sha1(response.content).hexdigest()
+    return make_etag(request, response["Content-Type"], digest), None
+
+
+def not_modified(
+    request: HttpRequest, validators: Validators
+) -> Optional[HttpResponseBase]:
+    """
+    Return a 304 response if the client already has the current representation.
+    """
+    etag, last_modified = validators
+    return get_conditional_response(
+        request,
+        etag=etag,
+        last_modified=int(last_modified.timestamp()) if last_modified else None,
+    )
+
+
+def set_validators(
+    response: HttpResponseBase, validators: Validators
+) -> HttpResponseBase:
+    etag, last_modified = validators
+    response["ETag"] = etag
+    if last_modified:
+        response["Last-Modified"] = http_date(last_modified.timestamp())
+    return response
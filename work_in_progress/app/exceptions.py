@@ -0,0 +1,32 @@
+from contextlib import contextmanager
+from typing import Iterator
+
+from django.db import IntegrityError, transaction
+from psycopg2.errorcodes import UNIQUE_VIOLATION
+
+
+class HTTPException(Exception):
+    status_code: int
+    message: str
+
+    def __init__(self, status_code: int, message: str):
+        self.status_code = status_code
+        self.message = message
+
+
+@contextmanager
+def unique_violation(message: str) -> Iterator[None]:
+    """
+    Run the block in a savepoint and turn an IntegrityError raised by a
+    unique constraint into a 400 response with the given message.
+
+    Other integrity errors, e.g. a foreign key or not null violation, are
+    bugs rather than conflicts with existing rows, so they are re-raised.
+    """
+    try:
+        with transaction.atomic():
+            yield
+    except IntegrityError as exc:
+        if getattr(exc.__cause__, "pgcode", None) != UNIQUE_VIOLATION:
+            raise
+        raise HTTPException(400, message)
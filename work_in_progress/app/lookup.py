@@ -0,0 +1,73 @@
+import re
+from typing import Any, Dict, List
+
+from django.contrib.postgres.search import TrigramSimilarity
+from django.db import connection, transaction
+from django.db.models import FloatField, Q, QuerySet, Value
+from django.db.models.functions import Greatest
+
+from work_in_progress.app.models import Company, SystemUser, normalize_cnpj
+
+# Queries made only of digits and cnpj punctuation are looked up by cnpj.
+_CNPJ_QUERY = re.compile(r"^[\d\s./-]+$")
+
+CNPJ_LENGTH = 14
+
+
+def lookup_companies(
+    user: SystemUser, text: str, threshold: float, limit: int
+) -> List[Dict[str, Any]]:
+    """
+    Return the companies matching a cnpj or a possibly misspelled name, most
+    similar first.
+
+    A full cnpj, with or without punctuation, is matched exactly through the
+    unique index of cnpj_digits and a partial one by prefix. Any other query
+    is matched against razao_social and nome_fantasia with the pg_trgm %
+    operator, so the trigram GIN indexes are used, and only matches at least
+    as similar as the threshold are returned.
+    """
+    companies: QuerySet[Company]
+    if user.is_superuser:
+        companies = Company.objects.all()
+    else:
+        companies = Company.objects.filter(criado_por=user)
+    digits = normalize_cnpj(text)
+    if digits is not None and _CNPJ_QUERY.match(text):
+        if len(digits) == CNPJ_LENGTH:
+            companies = companies.filter(cnpj_digits=digits).annotate(
+                similarity=Value(1.0, output_field=FloatField())
+            )
+        else:
+            companies = companies.filter(cnpj_digits__startswith=digits).annotate(
+                similarity=TrigramSimilarity("cnpj_digits", digits)
+            )
+    else:
+        companies = companies.filter(
+            Q(razao_social__trigram_similar=text)
+            | Q(nome_fantasia__trigram_similar=text)
+        ).annotate(
+            similarity=Greatest(
+                TrigramSimilarity("razao_social", text),
+                TrigramSimilarity("nome_fantasia", text),
+            )
+        )
+    rows = companies.order_by("-similarity", "pk").values_list(
+        "pk", "cnpj", "razao_social", "nome_fantasia", "similarity"
+    )[:limit]
+    with transaction.atomic(), connection.cursor() as cursor:
+        # The % operator compares against this setting, local to the transaction.
+        cursor.execute(
+            "SELECT set_config('pg_trgm.similarity_threshold', %s, true)",
+            [str(threshold)],
+        )
+        return [
+            {
+                "id": pk.hex,
+                "cnpj": cnpj,
+                "razao_social": razao_social,
+                "nome_fantasia": nome_fantasia,
+                "similarity": similarity,
+            }
+            for pk, cnpj, razao_social, nome_fantasia, similarity in rows
+        ]
@@ -0,0 +1,125 @@
+import statistics
+import time
+import tracemalloc
+from collections import defaultdict
+from typing import Any, Callable, Dict, List, Tuple
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connection, transaction
+from django.db.models import QuerySet
+
+from work_in_progress.app.analytics import (
+    OUTLIER_IQR_FACTOR,
+    PERCENTILES,
+    distributions,
+)
+from work_in_progress.app.models import Processo, SystemUser
+from work_in_progress.settings import ANALYTICS_CHUNK_SIZE
+
+# Skewed valor_causa with a long tail, spread over 100 comarcas and 50 lawyers.
+INSERT_PROCESSOS = """
+INSERT INTO app_processo (
+    processo_id, advogado_responsavel, cliente, numero_processo, vara, comarca,
+    estado, status, fase, valor_causa, valor_condenacao, valor_honorario,
+    valor_preposto, valor_total, data_distribuicao, criado_por_id, criado_em,
+    atualizado_em, ativo
+)
+SELECT
+    gen_random_uuid(), 'Advogado ' || i %% 50, 'Cliente ' || i, lpad(i::text, 20, '0'),
+    'Vara ' || i %% 10, 'Comarca ' || i %% 100, 'SP', 'ativo', 'inicial',
+    valor, 500, 200, 100, valor + 800, now() - (i %% 3650) * interval '1 day',
+    %s, now(), now(), true
+FROM generate_series(1, %s) AS i, LATERAL (SELECT exp(random() * 10) * 100 AS valor) v
+"""
+
+
+def python_distributions(
+    queryset: QuerySet, group: str, metric: str, bins: int
+) -> List[Dict[str, Any]]:
+    """
+    The statistics of analytics.describe() computed with plain Python lists,
+    for comparison.
+    """
+    groups: Dict[str, List[float]] = defaultdict(list)
+    rows = queryset.values_list(group, metric).iterator(chunk_size=ANALYTICS_CHUNK_SIZE)
+    for name, value in rows:
+        groups[name].append(value)
+    results = []
+    for name, values in sorted(groups.items()):
+        percentiles = statistics.quantiles(values, n=100, method="inclusive")
+        first, third = percentiles[24], percentiles[74]
+        spread = OUTLIER_IQR_FACTOR * (third - first)
+        lower, upper = first - spread, third + spread
+        low, high = min(values), max(values)
+        width = (high - low) / bins or 1.0
+        counts = [0] * bins
+        for value in values:
+            counts[min(int((value - low) / width), bins - 1)] += 1
+        results.append(
+            {
+                "group": name,
+                "count": len(values),
+                "mean": statistics.fmean(values),
+                "std": statistics.pstdev(values),
+                "min": low,
+                "max": high,
+                "percentiles": {f"p{p}": percentiles[p - 1] for p in PERCENTILES},
+                "histogram": counts,
+                "outliers": sum(
+                    1 for value in values if value < lower or value > upper
+                ),
+            }
+        )
+    return results
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the NumPy processo analytics with a pure Python implementation "
+        "on a synthetic dataset."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--rows", type=int, default=1000000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def measure(self, repeat: int, func: Callable[[], Any]) -> Tuple[float, float]:
+        """
+        Return the best wall time of func and its peak traced memory in MiB.
+        """
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        tracemalloc.start()
+        func()
+        peak = tracemalloc.get_traced_memory()[1] / 2**20
+        tracemalloc.stop()
+        return best, peak
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rows, repeat = options["rows"], options["repeat"]
+        with transaction.atomic():
+            user = SystemUser.objects.create_user(
+                username="benchmark_analytics", password="benchmark"
+            )
+            with connection.cursor() as cursor:
+                cursor.execute(INSERT_PROCESSOS, [user.pk, rows])
+                cursor.execute("ANALYZE app_processo")
+            queryset = Processo.objects.filter(criado_por=user)
+            for group in ("comarca", "advogado_responsavel"):
+                python = self.measure(
+                    repeat,
+                    lambda: python_distributions(queryset, group, "valor_causa", 10),
+                )
+                vectorized = self.measure(
+                    repeat, lambda: distributions(queryset, group, "valor_causa", 10)
+                )
+                self.stdout.write(
+                    f"{group}: python {rows / python[0]:,.0f} rows/s "
+                    f"(peak {python[1]:,.1f} MiB), numpy {rows / vectorized[0]:,.0f} "
+                    f"rows/s (peak {vectorized[1]:,.1f} MiB), "
+                    f"{python[0] / vectorized[0]:.1f}x"
+                )
+            transaction.set_rollback(True)
@@ -0,0 +1,148 @@
+import os
+import socket
+import subprocess
+import time
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, Dict, List, Optional, Tuple
+
+import jwt
+import numpy as np
+from django.core.management.base import BaseCommand, CommandParser
+
+from work_in_progress.app.models import Produto, SystemUser
+from work_in_progress.settings import ALGORITHM, SECRET_KEY
+
+# The same application served by gunicorn with sync workers, as before, and
+# with the uvicorn ASGI worker class of docker-compose.prod.yml.
+SERVERS = {
+    "wsgi": ["work_in_progress.wsgi:application"],
+    "asgi": ["work_in_progress.asgi:application", "-k", "uvicorn_worker.UvicornWorker"],
+}
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def rss_bytes(pid: int) -> Optional[int]:
+    """
+    Return the resident memory of a process and of its children, from /proc.
+    """
+    try:
+        with open(f"/proc/{pid}/status") as status:
+            rss = next(
+                int(line.split()[1]) * 1024
+                for line in status
+                if line.startswith("VmRSS:")
+            )
+        with open(f"/proc/{pid}/task/{pid}/children") as children:
+            for child in children.read().split():
+                rss += rss_bytes(int(child)) or 0
+        return rss
+    except (OSError, StopIteration):
+        return None
+
+
+def fetch(url: str, headers: Dict[str, str]) -> Tuple[float, bool]:
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(urllib.request.Request(url, headers=headers)) as r:
+            r.read()
+            ok = r.status < 400
+    except OSError:
+        ok = False
+    return time.perf_counter() - start, ok
+
+
+class Command(BaseCommand):
+    help = (
+        "Serve the API with gunicorn sync workers and with ASGI workers, with "
+        "the same number of processes, and report the latency percentiles, "
+        "the throughput and the memory of each under concurrent clients."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--workers", type=int, default=3)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--clients", type=int, nargs="+", default=[1, 16, 64])
+        parser.add_argument("--path", default="/api/produtos?limit=100")
+        parser.add_argument("--produtos", type=int, default=1000)
+
+    def serve(self, name: str, port: int, workers: int) -> "subprocess.Popen[bytes]":
+        command = [
+            "gunicorn",
+            *SERVERS[name],
+            "--workers",
+            str(workers),
+            "--bind",
+            f"127.0.0.1:{port}",
+        ]
+        # Every request must reach the database, not the response cache.
+        env = {**os.environ, "RESPONSE_CACHE_ALIAS": ""}
+        server = subprocess.Popen(command, env=env, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + 30
+        while time.monotonic() < deadline:
+            try:
+                socket.create_connection(("127.0.0.1", port), timeout=1).close()
+                return server
+            except OSError:
+                time.sleep(0.2)
+        server.terminate()
+        raise RuntimeError(f"{name} server did not start")
+
+    def load(
+        self, url: str, headers: Dict[str, str], clients: int, requests: int
+    ) -> Tuple[float, List[float], int]:
+        with ThreadPoolExecutor(clients) as pool:
+            start = time.perf_counter()
+            results = list(pool.map(lambda _: fetch(url, headers), range(requests)))
+            elapsed = time.perf_counter() - start
+        latencies = [latency for latency, _ in results]
+        errors = sum(not ok for _, ok in results)
+        return elapsed, latencies, errors
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        user = SystemUser.objects.create_user(
+            username="benchmark_async", password="benchmark"
+        )
+        try:
+            Produto.objects.bulk_create(
+                Produto(
+                    nome=f"Produto {i}",
+                    descricao="Produto",
+                    preco=1,
+                    quantidade=i,
+                    criado_por=user,
+                )
+                for i in range(options["produtos"])
+            )
+            token = jwt.encode({"sub": user.id}, SECRET_KEY, algorithm=ALGORITHM)
+            headers = {"Authorization": f"Bearer Bearer {token}"}
+            for name in SERVERS:
+                port = free_port()
+                server = self.serve(name, port, options["workers"])
+                try:
+                    url = f"http://127.0.0.1:{port}{options['path']}"
+                    self.load(url, headers, options["workers"], 50)
+                    for clients in options["clients"]:
+                        elapsed, latencies, errors = self.load(
+                            url, headers, clients, options["requests"]
+                        )
+                        p50 = float(np.percentile(latencies, 50))
+                        p99 = float(np.percentile(latencies, 99))
+                        rss = rss_bytes(server.pid)
+                        memory = f"{rss / 2**20:,.0f} MB" if rss else "n/a"
+                        self.stdout.write(
+                            f"{name}, {clients} clients: "
+                            f"{options['requests'] / elapsed:,.0f} req/s, "
+                            f"p50 {p50 * 1000:.1f} ms, p99 {p99 * 1000:.1f} ms, "
+                            f"{errors} errors, {memory} RSS"
+                        )
+                finally:
+                    server.terminate()
+                    server.wait()
+        finally:
+            user.delete()
@@ -0,0 +1,144 @@
+import json
+import time
+from datetime import timedelta
+from decimal import Decimal
+from typing import Any, Callable, Type
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import transaction
+from django.db.models import Model, QuerySet
+from django.utils import timezone
+from ninja import Schema
+from ninja.responses import NinjaJSONEncoder
+
+from work_in_progress.app.models import Company, Contato, Processo, Produto, SystemUser
+from work_in_progress.app.renderers import dumps
+from work_in_progress.app.schemas import (
+    CompanySchema,
+    ContatoSchema,
+    ProcessoSchema,
+    ProdutoSchema,
+)
+from work_in_progress.app.serializers import get_serializer
+
+
+def create_rows(user: SystemUser, count: int) -> None:
+    """
+    Create count synthetic rows of every model for the given user.
+    """
+    now = timezone.now()
+    contatos = Contato.objects.bulk_create(
+        Contato(
+            nome=f"Contato {i}",
+            endereco="Rua teste",
+            numero=str(i),
+            complemento="",
+            bairro="Bairro teste",
+            cidade="Cidade teste",
+            estado="SP",
+            cep="12345678",
+            telefone="12345678",
+            email_responsavel=f"responsavel{i}@teste.com",
+            email_cobranca=f"financeiro{i}@teste.com",
+            criado_por=user,
+        )
+        for i in range(count)
+    )
+    Company.objects.bulk_create(
+        Company(
+            cnpj=f"{i:014d}",
+            razao_social=f"Razão social {i}",
+            nome_fantasia=f"Nome fantasia {i}",
+            inscricao_estadual="123456789",
+            inscricao_municipal="123456789",
+            criado_por=user,
+            contato=contatos[i],
+        )
+        for i in range(count)
+    )
+    Processo.objects.bulk_create(
+        Processo(
+            advogado_responsavel=f"Advogado {i % 50}",
+            cliente=f"Cliente {i}",
+            numero_processo=f"{i:020d}",
+            vara=f"Vara {i % 10}",
+            comarca=f"Comarca {i % 100}",
+            estado="SP",
+            status="ativo",
+            fase="inicial",
+            valor_causa=1000.0 + i,
+            valor_condenacao=500.0,
+            valor_honorario=200.0,
+            valor_preposto=100.0,
+            valor_total=1800.0 + i,
+            data_distribuicao=now - timedelta(days=i % 3650),
+            criado_por=user,
+        )
+        for i in range(count)
+    )
+    Produto.objects.bulk_create(
+        Produto(
+            nome=f"Produto {i}",
+            descricao="Barril 20 Litros",
+            preco=Decimal("5.40") + i,
+            quantidade=i,
+            criado_por=user,
+        )
+        for i in range(count)
+    )
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare rows/sec of the from_orm() serialization with the "
+        "values_list() fast path for every list schema."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--rows", type=int, default=10000)
+        parser.add_argument("--repeat", type=int, default=3)
+
+    def measure(self, rows: int, repeat: int, func: Callable[[], Any]) -> float:
+        best = float("inf")
+        for _ in range(repeat):
+            start = time.perf_counter()
+            func()
+            best = min(best, time.perf_counter() - start)
+        return rows / best
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rows, repeat = options["rows"], options["repeat"]
+        benchmarks: Any = [
+            (Contato, ContatoSchema),
+            (Company, CompanySchema),
+            (Processo, ProcessoSchema),
+            (Produto, ProdutoSchema),
+        ]
+        with transaction.atomic():
+            user = SystemUser.objects.create_user(
+                username="benchmark_serializers", password="benchmark"
+            )
+            create_rows(user, rows)
+            for model, schema in benchmarks:
+                self.compare(model, schema, rows, repeat)
+            transaction.set_rollback(True)
+
+    def compare(
+        self, model: Type[Model], schema: Type[Schema], rows: int, repeat: int
+    ) -> None:
+        queryset: QuerySet = model.objects.all()
+        serializer = get_serializer(schema)
+
+        def schema_path() -> str:
+            data = [schema.from_orm(obj).dict() for obj in queryset]
+            return json.dumps(data, cls=NinjaJSONEncoder)
+
+        def fast_path() -> bytes:
+            return dumps(serializer.rows(serializer.values(queryset)))
+
+        before = self.measure(rows, repeat, schema_path)
+        after = self.measure(rows, repeat, fast_path)
+        self.stdout.write(
+            f"{schema.__name__:<16} from_orm: {before:>10.0f} rows/s   "
+            f"values_list: {after:>10.0f} rows/s   x{after / before:.1f}"
+        )
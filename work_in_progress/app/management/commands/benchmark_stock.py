@@ -0,0 +1,79 @@
+import threading
+import time
+from typing import Any, Callable, List
+
+from django.core.management.base import BaseCommand, CommandParser
+from django.db import connections
+
+from work_in_progress.app.models import Produto, SystemUser
+from work_in_progress.app.stock import adjust_stock
+from work_in_progress.app.updates import update_row
+
+
+def read_modify_write(user: SystemUser, produto: Produto) -> None:
+    """
+    What clients did before the stock endpoints: GET the produto, then PUT
+    the new quantidade back.
+    """
+    quantidade = Produto.objects.values_list("quantidade", flat=True).get(pk=produto.pk)
+    update_row(Produto, user, produto.pk.hex, {"quantidade": quantidade + 1})
+
+
+class Command(BaseCommand):
+    help = (
+        "Increment the quantidade of a single produto from concurrent threads "
+        "and report the throughput and the lost updates."
+    )
+
+    def add_arguments(self, parser: CommandParser) -> None:
+        parser.add_argument("--operations", type=int, default=500)
+        parser.add_argument("--threads", type=int, nargs="+", default=[1, 2, 4, 8])
+
+    def run(self, threads: int, operations: int, func: Callable[[], None]) -> float:
+        barrier = threading.Barrier(threads + 1)
+
+        def worker() -> None:
+            try:
+                barrier.wait()
+                for _ in range(operations // threads):
+                    func()
+            finally:
+                connections.close_all()
+
+        workers = [threading.Thread(target=worker) for _ in range(threads)]
+        for thread in workers:
+            thread.start()
+        barrier.wait()
+        start = time.perf_counter()
+        for thread in workers:
+            thread.join()
+        return time.perf_counter() - start
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        user = SystemUser.objects.create_user(
+            username="benchmark_stock", password="benchmark"
+        )
+        try:
+            produto = Produto.objects.create(
+                nome="Barril",
+                descricao="Barril 20 Litros",
+                preco=5.4,
+                quantidade=0,
+                criado_por=user,
+            )
+            strategies: List[Any] = [
+                ("read-modify-write", lambda: read_modify_write(user, produto)),
+                ("adjust_stock", lambda: adjust_stock(user, produto.pk.hex, 1)),
+            ]
+            for threads in options["threads"]:
+                operations = options["operations"] // threads * threads
+                for name, func in strategies:
+                    Produto.objects.filter(pk=produto.pk).update(quantidade=0)
+                    elapsed = self.run(threads, operations, func)
+                    produto.refresh_from_db()
+                    self.stdout.write(
+                        f"{threads} threads, {name}: {operations / elapsed:,.0f} "
+                        f"ops/s, {operations - produto.quantidade} lost updates"
+                    )
+        finally:
+            user.delete()
@@ -0,0 +1,20 @@
+from datetime import timedelta
+from typing import Any
+
+from django.core.management.base import BaseCommand
+from django.utils import timezone
+
+from work_in_progress.app.models import Tombstone
+from work_in_progress.settings import SYNC_TOMBSTONE_RETENTION_DAYS
+
+
+class Command(BaseCommand):
+    help = (
+        "Delete the tombstones older than SYNC_TOMBSTONE_RETENTION_DAYS; clients "
+        "with an older watermark sync from scratch."
+    )
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        cutoff = timezone.now() - timedelta(days=SYNC_TOMBSTONE_RETENTION_DAYS)
+        deleted, _ = Tombstone.objects.filter(deletado_em__lt=cutoff).delete()
+        self.stdout.write(f"{deleted} tombstones deleted")
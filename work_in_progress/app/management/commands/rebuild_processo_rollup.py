@@ -0,0 +1,13 @@
+from typing import Any
+
+from django.core.management.base import BaseCommand
+
+from work_in_progress.app.rollups import rebuild_processo_rollup
+
+
+class Command(BaseCommand):
+    help = "Recompute the ProcessoRollup totals from the processos."
+
+    def handle(self, *args: Any, **options: Any) -> None:
+        rows = rebuild_processo_rollup()
+        self.stdout.write(f"{rows} rollup rows rebuilt")
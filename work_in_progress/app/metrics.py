@@ -0,0 +1,481 @@
+import asyncio
+import bisect
+import contextlib
+import contextvars
+import fcntl
+import json
+import os
+import threading
+import time
+import uuid
+from typing import (
+    Any,
+    Awaitable,
+    Callable,
+    Dict,
+    Iterable,
+    Iterator,
+    List,
+    Optional,
+    Sequence,
+    Tuple,
+    Union,
+)
+
+from django.db.backends.base.base import BaseDatabaseWrapper
+from django.db.backends.signals import connection_created
+from django.dispatch import receiver
+from django.http import HttpRequest
+from django.http.response import HttpResponseBase
+
+from work_in_progress.app.cache import list_flights, response_cache, user_cache
+from work_in_progress.app.passwords import password_checker
+from work_in_progress.settings import (
+    METRICS_BUCKETS,
+    METRICS_DIR,
+    METRICS_FLUSH_SECONDS,
+)
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Statistics of the caches and pools of each process, shown as gauges.
+COMPONENTS: Dict[str, Callable[[], Dict[str, Any]]] = {
+    "response_cache": response_cache.stats,
+    "user_cache": user_cache.stats,
+    "list_flights": list_flights.stats,
+    "password_checker": password_checker.stats,
+}
+
+# Positions of the values of a series, followed by its bucket counts.
+COUNT, SECONDS, QUERIES, QUERY_SECONDS, RENDER_SECONDS, BYTES, BUCKETS = range(7)
+
+SeriesKey = Tuple[str, str, str]
+
+
+class RequestMetrics:
+    """
+    Route, database and rendering time of the request being served.
+    """
+
+    __slots__ = ("route", "queries", "query_seconds", "render_seconds")
+
+    def __init__(self) -> None:
+        self.route: Optional[str] = None
+        self.queries = 0
+        self.query_seconds = 0.0
+        self.render_seconds = 0.0
+
+
+# Copied by asgiref and run_sync into the threads and event loops serving the
+# request, so the queries and rendering made there are counted too.
+current: "contextvars.ContextVar[Optional[RequestMetrics]]" = contextvars.ContextVar(
+    "request_metrics", default=None
+)
+
+
+def record_query(
+    execute: Callable[..., Any], sql: str, params: Any, many: bool, context: Any
+) -> Any:
+    request = current.get()
+    if request is None:
+        return execute(sql, params, many, context)
+    start = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        request.queries += 1
+        request.query_seconds += time.perf_counter() - start
+
+
+def record_render(seconds: float) -> None:
+    request = current.get()
+    if request is not None:
+        request.render_seconds += seconds
+
+
+@receiver(connection_created)
+def install_query_recorder(
+    sender: Any, connection: BaseDatabaseWrapper, **kwargs: Any
+) -> None:
+    # Connections are per thread, so every thread serving requests gets it.
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(record_query)
+
+
+def _alive(pid: int) -> bool:
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def _number(value: float) -> str:
+    return str(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _escape(value: Any) -> str:
+    return str(value).replace("\\", r"\\").replace('"', r"\"").replace("\n", r"\n")
+
+
+def _labels(names: Sequence[str], values: Iterable[Any]) -> str:
+    pairs = ",".join(f'{name}="{_escape(value)}"' for name, value in zip(names, values))
+    return "{" + pairs + "}"
+
+
+class MetricsStore:
+    """
+    Metrics of the requests served by this process, by route, method and
+    status, summed with the ones of the other processes of the host.
+
+    A request only updates a few counters under a lock. Every
+    flush_interval seconds a thread writes them to a file of directory,
+    one per process, and collect() reads the files of the other processes.
+    The counters of exited processes keep counting in the totals, their
+    requests in flight and component statistics don't: the flush adds them
+    to the counters of the flushing process and removes their files, under
+    an exclusive lock of directory that collect() takes shared, so the
+    files don't pile up as workers are replaced.
+    """
+
+    series_names = ("route", "method", "status")
+
+    def __init__(
+        self,
+        directory: str,
+        flush_interval: float,
+        buckets: Sequence[float],
+        components: Dict[str, Callable[[], Dict[str, Any]]],
+    ) -> None:
+        self.directory = directory
+        self.flush_interval = flush_interval
+        self.buckets = list(buckets)
+        self.components = components
+        self._series: Dict[SeriesKey, List[float]] = {}
+        self._in_flight: Dict[Tuple[str, str], int] = {}
+        self._lock = threading.Lock()
+        self._pid: Optional[int] = None
+        self._path: Optional[str] = None
+
+    def start(self, route: str, method: str) -> None:
+        with self._lock:
+            self._in_flight[route, method] = self._in_flight.get((route, method), 0) + 1
+
+    def finish(
+        self,
+        route: str,
+        method: str,
+        status: str,
+        seconds: float,
+        request: RequestMetrics,
+        size: int,
+    ) -> None:
+        """
+        Record a served request, and the end of its start() if it had one.
+        """
+        bucket = bisect.bisect_left(self.buckets, seconds)
+        with self._lock:
+            if request.route is not None:
+                self._in_flight[route, method] -= 1
+            values = self._series.get((route, method, status))
+            if values is None:
+                values = [0.0] * (BUCKETS + len(self.buckets) + 1)
+                self._series[route, method, status] = values
+            values[COUNT] += 1
+            values[SECONDS] += seconds
+            values[QUERIES] += request.queries
+            values[QUERY_SECONDS] += request.query_seconds
+            values[RENDER_SECONDS] += request.render_seconds
+            values[BYTES] += size
+            values[BUCKETS + bucket] += 1
+            if self._pid != os.getpid():
+                self._start_flushing()
+
+    def _start_flushing(self) -> None:
+        # Started by the first request of each process, so after the fork of
+        # the gunicorn workers.
+        self._pid = os.getpid()
+        if not self.directory:
+            return
+        os.makedirs(self.directory, exist_ok=True)
+        name = f"{self._pid}-{uuid.uuid4().hex}.json"
+        self._path = os.path.join(self.directory, name)
+        threading.Thread(
+            target=self._flush_forever, name="metrics", daemon=True
+        ).start()
+
+    def _flush_forever(self) -> None:
+        while True:
+            time.sleep(self.flush_interval)
+            self.flush()
+
+    def flush(self) -> None:
+        if self._path is None:
+            return
+        with self._locked(fcntl.LOCK_EX):
+            exited = self._merge_exited()
+            with open(f"{self._path}.tmp", "w") as file:
+                json.dump(self.snapshot(), file)
+            os.replace(f"{self._path}.tmp", self._path)
+            # Only once this process' file holds their counters.
+            for path in exited:
+                os.remove(path)
+
+    @contextlib.contextmanager
+    def _locked(self, operation: int) -> Iterator[None]:
+        # The lock is released when the file is closed.
+        with open(os.path.join(self.directory, ".lock"), "a") as file:
+            fcntl.flock(file, operation)
+            yield
+
+    def _others(self) -> Iterator[Tuple[str, Dict[str, Any]]]:
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            if not name.endswith(".json") or path == self._path:
+                continue
+            try:
+                with open(path) as file:
+                    yield path, json.load(file)
+            except (OSError, ValueError):
+                continue
+
+    def _merge_exited(self) -> List[str]:
+        """
+        Add the counters of the files of exited processes to the ones of this
+        process and return the paths of those files.
+        """
+        exited = []
+        for path, snapshot in self._others():
+            if _alive(snapshot["pid"]):
+                continue
+            # Files of other buckets aren't rendered, so they are dropped.
+            if snapshot["buckets"] == self.buckets:
+                with self._lock:
+                    for route, method, status, values in snapshot["series"]:
+                        total = self._series.setdefault(
+                            (route, method, status), [0.0] * len(values)
+                        )
+                        for i, value in enumerate(values):
+                            total[i] += value
+            exited.append(path)
+        return exited
+
+    def snapshot(self) -> Dict[str, Any]:
+        with self._lock:
+            series = [[*key, list(values)] for key, values in self._series.items()]
+            in_flight = [[*key, count] for key, count in self._in_flight.items()]
+        components = {
+            name: {
+                stat: value for stat, value in stats().items() if isinstance(value, int)
+            }
+            for name, stats in self.components.items()
+        }
+        return {
+            "pid": os.getpid(),
+            "buckets": self.buckets,
+            "series": series,
+            "in_flight": in_flight,
+            "components": components,
+        }
+
+    def collect(self) -> List[Dict[str, Any]]:
+        """
+        Return the current snapshot of this process and the last ones of the
+        other processes writing to directory.
+        """
+        if not self.directory or not os.path.isdir(self.directory):
+            return [self.snapshot()]
+        with self._locked(fcntl.LOCK_SH):
+            return [self.snapshot()] + [snapshot for _, snapshot in self._others()]
+
+    def render(self) -> str:
+        """
+        Return the totals of every process in the Prometheus text format.
+        """
+        series: Dict[SeriesKey, List[float]] = {}
+        in_flight: Dict[Tuple[str, str], float] = {}
+        components: Dict[Tuple[str, str], float] = {}
+        for snapshot in self.collect():
+            if snapshot["buckets"] != self.buckets:
+                continue
+            for route, method, status, values in snapshot["series"]:
+                total = series.setdefault((route, method, status), [0.0] * len(values))
+                for i, value in enumerate(values):
+                    total[i] += value
+            if snapshot["pid"] != os.getpid() and not _alive(snapshot["pid"]):
+                continue
+            for route, method, count in snapshot["in_flight"]:
+                in_flight[route, method] = in_flight.get((route, method), 0) + count
+            for name, stats in snapshot["components"].items():
+                for stat, value in stats.items():
+                    components[name, stat] = components.get((name, stat), 0) + value
+
+        lines: List[str] = []
+
+        def metric(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        metric("http_requests_in_flight", "gauge", "Requests being served.")
+        for flight, count in sorted(in_flight.items()):
+            labels = _labels(("route", "method"), flight)
+            lines.append(f"http_requests_in_flight{labels} {_number(count)}")
+
+        name = "http_request_duration_seconds"
+        metric(name, "histogram", "Time to serve the requests.")
+        for key, values in sorted(series.items()):
+            cumulative = 0.0
+            bounds = [*map(_number, self.buckets), "+Inf"]
+            for bound, count in zip(bounds, values[BUCKETS:]):
+                cumulative += count
+                labels = _labels((*self.series_names, "le"), (*key, bound))
+                lines.append(f"{name}_bucket{labels} {_number(cumulative)}")
+            labels = _labels(self.series_names, key)
+            lines.append(f"{name}_sum{labels} {_number(values[SECONDS])}")
+            lines.append(f"{name}_count{labels} {_number(values[COUNT])}")
+
+        for name, position, description in [
+            ("http_request_db_queries_total", QUERIES, "Database queries made."),
+            ("http_request_db_seconds_total", QUERY_SECONDS, "Time in queries."),
+            ("http_request_render_seconds_total", RENDER_SECONDS, "Time rendering."),
+            ("http_response_bytes_total", BYTES, "Bytes of the response bodies."),
+        ]:
+            metric(name, "counter", description)
+            for key, values in sorted(series.items()):
+                labels = _labels(self.series_names, key)
+                lines.append(f"{name}{labels} {_number(values[position])}")
+
+        metric("app_component_stat", "gauge", "Statistics of the caches and pools.")
+        for component, value in sorted(components.items()):
+            labels = _labels(("component", "stat"), component)
+            lines.append(f"app_component_stat{labels} {_number(value)}")
+        return "\n".join(lines) + "\n"
+
+
+metrics = MetricsStore(
+    directory=METRICS_DIR,
+    flush_interval=METRICS_FLUSH_SECONDS,
+    buckets=METRICS_BUCKETS,
+    components=COMPONENTS,
+)
+
+
+class MeteredStream:
+    """
+    Content of a streaming response, counting its bytes and recording the
+    queries and rendering made while it is read, which happens after the
+    middleware returned. The request is recorded when the stream is closed,
+    read whole or not.
+    """
+
+    def __init__(
+        self,
+        content: Iterable[bytes],
+        request_metrics: RequestMetrics,
+        finish: Callable[[int], None],
+    ) -> None:
+        self._content = iter(content)
+        self._request_metrics = request_metrics
+        self._finish: Optional[Callable[[int], None]] = finish
+        self._size = 0
+
+    def __iter__(self) -> "MeteredStream":
+        return self
+
+    def __next__(self) -> bytes:
+        token = current.set(self._request_metrics)
+        try:
+            chunk = next(self._content)
+        finally:
+            current.reset(token)
+        self._size += len(chunk)
+        return chunk
+
+    def close(self) -> None:
+        finish, self._finish = self._finish, None
+        if finish is not None:
+            finish(self._size)
+
+
+class MetricsMiddleware:
+    """
+    Record the latency, database queries, rendering time and response size of
+    every request in metrics, by route, method and status.
+
+    Routes are the URL patterns of the views, e.g. api/produtos/<produto_id>,
+    so every path of a view counts in one series.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response: Callable[[HttpRequest], Any]) -> None:
+        self.get_response = get_response
+        if asyncio.iscoroutinefunction(get_response):
+            # As MiddlewareMixin does, so the handler keeps the chain async
+            # instead of running it in one thread per worker.
+            self._is_coroutine = asyncio.coroutines._is_coroutine  # type: ignore
+
+    def __call__(
+        self, request: HttpRequest
+    ) -> Union[HttpResponseBase, Awaitable[HttpResponseBase]]:
+        if asyncio.iscoroutinefunction(self.get_response):
+            return self.__acall__(request)
+        start = time.perf_counter()
+        request_metrics = RequestMetrics()
+        token = current.set(request_metrics)
+        try:
+            response = self.get_response(request)
+        finally:
+            current.reset(token)
+        self.record(request, response, request_metrics, start)
+        return response
+
+    async def __acall__(self, request: HttpRequest) -> HttpResponseBase:
+        start = time.perf_counter()
+        request_metrics = RequestMetrics()
+        token = current.set(request_metrics)
+        try:
+            response = await self.get_response(request)
+        finally:
+            current.reset(token)
+        self.record(request, response, request_metrics, start)
+        return response
+
+    def record(
+        self,
+        request: HttpRequest,
+        response: HttpResponseBase,
+        request_metrics: RequestMetrics,
+        start: float,
+    ) -> None:
+        def finish(size: int) -> None:
+            metrics.finish(
+                request_metrics.route or "unmatched",
+                request.method or "",
+                str(response.status_code),
+                time.perf_counter() - start,
+                request_metrics,
+                size,
+            )
+
+        if response.streaming:
+            response.streaming_content = MeteredStream(
+                response.streaming_content, request_metrics, finish
+            )
+        else:
+            finish(len(response.content))
+
+    def process_view(
+        self,
+        request: HttpRequest,
+        view_func: Callable[..., Any],
+        view_args: Any,
+        view_kwargs: Any,
+    ) -> None:
+        request_metrics = current.get()
+        if request_metrics is not None and request.resolver_match is not None:
+            route = request_metrics.route = request.resolver_match.route
+            metrics.start(route, request.method or "")
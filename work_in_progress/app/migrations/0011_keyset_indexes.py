@@ -0,0 +1,57 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:29
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0010_produto_nome"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["criado_em", "company_id"], name="company_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["criado_por", "criado_em", "company_id"],
+                name="company_criado_keyset_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_por", "contato_id"], name="contato_criado_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_em", "processo_id"], name="processo_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "criado_em", "processo_id"],
+                name="processo_criado_keyset_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["criado_em", "id_produto"], name="produto_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["criado_por", "criado_em", "id_produto"],
+                name="produto_criado_keyset_idx",
+            ),
+        ),
+    ]
@@ -0,0 +1,103 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0011_keyset_indexes"),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["criado_por", "ativo"], name="company_criado_ativo_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["criado_por", "razao_social"], name="company_criado_razao_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_por", "nome"], name="contato_criado_nome_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_por", "cidade"], name="contato_criado_cidade_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_por", "estado"], name="contato_criado_estado_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "status"], name="processo_criado_status_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "fase"], name="processo_criado_fase_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "comarca"], name="processo_criado_comarca_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "estado"], name="processo_criado_estado_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "ativo"], name="processo_criado_ativo_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "data_distribuicao"],
+                name="processo_criado_distrib_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "valor_causa"], name="processo_criado_causa_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "valor_total"], name="processo_criado_total_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["criado_por", "preco"], name="produto_criado_preco_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["criado_por", "quantidade"], name="produto_criado_qtd_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,74 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:38
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0012_filter_indexes"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contato",
+            name="criado_em",
+            field=models.DateTimeField(
+                auto_now_add=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.AddField(
+            model_name="contato",
+            name="atualizado_em",
+            field=models.DateTimeField(
+                auto_now=True, default=django.utils.timezone.now
+            ),
+            preserve_default=False,
+        ),
+        migrations.RemoveIndex(
+            model_name="contato",
+            name="contato_criado_keyset_idx",
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="company_criado_atualizado_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_em", "contato_id"], name="contato_keyset_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_por", "criado_em", "contato_id"],
+                name="contato_criado_keyset_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="contato_criado_atualizado_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="processo_criado_atualizado_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="produto",
+            index=models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="produto_criado_atualizado_idx",
+            ),
+        ),
+    ]
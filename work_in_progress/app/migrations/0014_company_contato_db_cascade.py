@@ -0,0 +1,53 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Django creates the foreign key without ON DELETE and cascades in Python, so
+# the constraint is recreated with a database-level cascade.
+DROP_CONTATO_FK = """
+DO $$
+DECLARE
+    constraint_name text;
+BEGIN
+    FOR constraint_name IN
+        SELECT con.conname
+        FROM pg_constraint con
+        JOIN pg_attribute att
+            ON att.attrelid = con.conrelid AND att.attnum = ANY(con.conkey)
+        WHERE con.conrelid = 'app_company'::regclass
+            AND con.contype = 'f'
+            AND att.attname = 'contato_id'
+    LOOP
+        EXECUTE format('ALTER TABLE app_company DROP CONSTRAINT %I', constraint_name);
+    END LOOP;
+END $$;
+"""
+
+ADD_CONTATO_FK = """
+ALTER TABLE app_company ADD CONSTRAINT app_company_contato_id_fk
+FOREIGN KEY (contato_id) REFERENCES app_contato (contato_id) {on_delete}
+DEFERRABLE INITIALLY DEFERRED;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0013_contato_timestamps"),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name="company",
+            name="contato",
+            field=models.ForeignKey(
+                on_delete=django.db.models.deletion.DO_NOTHING,
+                related_name="companies",
+                to="app.contato",
+            ),
+        ),
+        migrations.RunSQL(
+            sql=[DROP_CONTATO_FK, ADD_CONTATO_FK.format(on_delete="ON DELETE CASCADE")],
+            reverse_sql=[DROP_CONTATO_FK, ADD_CONTATO_FK.format(on_delete="")],
+        ),
+    ]
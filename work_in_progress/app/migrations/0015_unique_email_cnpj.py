@@ -0,0 +1,57 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:48
+
+from typing import Any
+
+from django.db import migrations, models
+from django.db.models import Count
+
+# Fields that become unique per criado_por, by model.
+UNIQUE_FIELDS = [("Company", "cnpj"), ("Contato", "email_responsavel")]
+
+
+def check_duplicates(apps: Any, schema_editor: Any) -> None:
+    """
+    Fail with the duplicated values, instead of the error of the first one
+    found by AddConstraint, so they can be merged or fixed before migrating.
+    """
+    problems = []
+    for model_name, field in UNIQUE_FIELDS:
+        duplicates = (
+            apps.get_model("app", model_name)
+            .objects.values_list("criado_por", field)
+            .annotate(rows=Count("pk"))
+            .filter(rows__gt=1)
+            .order_by("criado_por", field)
+        )
+        problems += [
+            f"{model_name}.{field}={value!r} of user {user_id}: {rows} rows"
+            for user_id, value, rows in duplicates
+        ]
+    if problems:
+        raise RuntimeError(
+            "Duplicated rows must be merged or deleted before the unique "
+            "constraints are added:\n" + "\n".join(problems)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0014_company_contato_db_cascade"),
+    ]
+
+    operations = [
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name="company",
+            constraint=models.UniqueConstraint(
+                fields=("criado_por", "cnpj"), name="company_criado_cnpj_uniq"
+            ),
+        ),
+        migrations.AddConstraint(
+            model_name="contato",
+            constraint=models.UniqueConstraint(
+                fields=("criado_por", "email_responsavel"),
+                name="contato_criado_email_uniq",
+            ),
+        ),
+    ]
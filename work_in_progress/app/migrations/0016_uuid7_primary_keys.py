@@ -0,0 +1,83 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:50
+
+from importlib import import_module
+
+from django.db import migrations, models
+
+import work_in_progress.app.models
+
+# Altering contato_id makes Django drop and recreate the company -> contato
+# foreign key without ON DELETE CASCADE, so it is restored afterwards. Pending
+# checks of the deferred constraint are flushed first, as Postgres does not
+# alter a table with pending trigger events.
+cascade = import_module(
+    "work_in_progress.app.migrations.0014_company_contato_db_cascade"
+)
+RESTORE_CASCADE = [
+    "SET CONSTRAINTS ALL IMMEDIATE;",
+    cascade.DROP_CONTATO_FK,
+    cascade.ADD_CONTATO_FK.format(on_delete="ON DELETE CASCADE"),
+]
+
+# The existing keys are 32 character hex strings, which Postgres casts to
+# uuid directly. Going back, the casted strings are in the canonical format
+# and the dashes are removed to restore the previous keys.
+RESTORE_HEX = [
+    "UPDATE app_contato SET contato_id = replace(contato_id, '-', '');",
+    "UPDATE app_company SET company_id = replace(company_id, '-', ''), "
+    "contato_id = replace(contato_id, '-', '');",
+    "UPDATE app_processo SET processo_id = replace(processo_id, '-', '');",
+    "UPDATE app_produto SET id_produto = replace(id_produto, '-', '');",
+]
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0015_unique_email_cnpj"),
+    ]
+
+    operations = [
+        migrations.RunSQL(sql=migrations.RunSQL.noop, reverse_sql=RESTORE_CASCADE),
+        migrations.RunSQL(sql=migrations.RunSQL.noop, reverse_sql=RESTORE_HEX),
+        migrations.AlterField(
+            model_name="company",
+            name="company_id",
+            field=models.UUIDField(
+                default=work_in_progress.app.models.get_new_uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="contato",
+            name="contato_id",
+            field=models.UUIDField(
+                default=work_in_progress.app.models.get_new_uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="processo",
+            name="processo_id",
+            field=models.UUIDField(
+                default=work_in_progress.app.models.get_new_uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.AlterField(
+            model_name="produto",
+            name="id_produto",
+            field=models.UUIDField(
+                default=work_in_progress.app.models.get_new_uuid7,
+                editable=False,
+                primary_key=True,
+                serialize=False,
+            ),
+        ),
+        migrations.RunSQL(sql=RESTORE_CASCADE, reverse_sql=migrations.RunSQL.noop),
+    ]
@@ -0,0 +1,100 @@
+# Generated by Django 3.1.1 on 2026-10-18 03:55
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+# The vectors use the "simple" configuration, without stemming, as the indexed
+# columns are mostly names, addresses and numbers. search.SEARCH_CONFIG must
+# match it.
+PROCESSO_VECTOR = """
+    setweight(to_tsvector('simple', coalesce(NEW.cliente, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(NEW.numero_processo, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(NEW.advogado_responsavel, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce(NEW.comarca, '')), 'C')
+    || setweight(to_tsvector('simple', coalesce(NEW.vara, '')), 'C')
+"""
+
+CONTATO_VECTOR = """
+    setweight(to_tsvector('simple', coalesce(NEW.nome, '')), 'A')
+    || setweight(to_tsvector('simple', coalesce(NEW.email_responsavel, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce(NEW.email_cobranca, '')), 'B')
+    || setweight(to_tsvector('simple', coalesce(NEW.cidade, '')), 'C')
+    || setweight(to_tsvector('simple', coalesce(NEW.bairro, '')), 'C')
+    || setweight(to_tsvector('simple', coalesce(NEW.endereco, '')), 'D')
+"""
+
+CREATE_TRIGGER = """
+CREATE FUNCTION {table}_search_vector() RETURNS trigger AS $$
+BEGIN
+    NEW.search_vector := {vector};
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_search_vector
+BEFORE INSERT OR UPDATE OF {columns} ON {table}
+FOR EACH ROW EXECUTE FUNCTION {table}_search_vector();
+
+UPDATE {table} SET {backfill};
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER {table}_search_vector ON {table};
+DROP FUNCTION {table}_search_vector();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0016_uuid7_primary_keys"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="contato",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddField(
+            model_name="processo",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_TRIGGER.format(
+                table="app_processo",
+                vector=PROCESSO_VECTOR,
+                columns="cliente, numero_processo, advogado_responsavel, comarca, vara",
+                backfill="cliente = cliente",
+            ),
+            reverse_sql=DROP_TRIGGER.format(table="app_processo"),
+        ),
+        migrations.RunSQL(
+            sql=CREATE_TRIGGER.format(
+                table="app_contato",
+                vector=CONTATO_VECTOR,
+                columns=(
+                    "nome, email_responsavel, email_cobranca, cidade, bairro, endereco"
+                ),
+                backfill="nome = nome",
+            ),
+            reverse_sql=DROP_TRIGGER.format(table="app_contato"),
+        ),
+        migrations.AddIndex(
+            model_name="contato",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="contato_search_idx"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="processo",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="processo_search_idx"
+            ),
+        ),
+    ]
@@ -0,0 +1,108 @@
+# Generated by Django 3.1.1 on 2026-10-18 04:03
+
+from typing import Any
+
+import django.contrib.postgres.indexes
+from django.contrib.postgres.aggregates import ArrayAgg
+from django.contrib.postgres.operations import TrigramExtension
+from django.db import migrations, models
+from django.db.models import Count
+
+# Company.cnpj_digits holds the digits of cnpj, or NULL if it has none, so
+# "12.345.678/0001-90" and "12345678000190" are the same cnpj for the unique
+# constraint and the lookups. models.normalize_cnpj() must match it.
+CREATE_TRIGGER = """
+CREATE FUNCTION app_company_cnpj_digits() RETURNS trigger AS $$
+BEGIN
+    NEW.cnpj_digits := nullif(regexp_replace(NEW.cnpj, '\\D', '', 'g'), '');
+    RETURN NEW;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_company_cnpj_digits
+BEFORE INSERT OR UPDATE OF cnpj ON app_company
+FOR EACH ROW EXECUTE FUNCTION app_company_cnpj_digits();
+
+UPDATE app_company SET cnpj = cnpj;
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER app_company_cnpj_digits ON app_company;
+DROP FUNCTION app_company_cnpj_digits();
+"""
+
+
+def check_duplicates(apps: Any, schema_editor: Any) -> None:
+    """
+    Fail with the cnpjs written differently that have the same digits for a
+    user, which the unique constraint on cnpj_digits would reject, so they
+    can be merged or fixed before migrating.
+    """
+    duplicates = (
+        apps.get_model("app", "Company")
+        .objects.filter(cnpj_digits__isnull=False)
+        .values_list("criado_por", "cnpj_digits")
+        .annotate(rows=Count("pk"), cnpjs=ArrayAgg("cnpj", ordering="cnpj"))
+        .filter(rows__gt=1)
+        .order_by("criado_por", "cnpj_digits")
+    )
+    problems = [
+        f"Company.cnpj_digits={digits!r} of user {user_id}: {cnpjs}"
+        for user_id, digits, rows, cnpjs in duplicates
+    ]
+    if problems:
+        raise RuntimeError(
+            "Companies with the same cnpj digits must be merged or deleted "
+            "before the unique constraint is added:\n" + "\n".join(problems)
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0017_search_vectors"),
+    ]
+
+    operations = [
+        TrigramExtension(),
+        migrations.AddField(
+            model_name="company",
+            name="cnpj_digits",
+            field=models.CharField(editable=False, max_length=255, null=True),
+        ),
+        migrations.RunSQL(sql=CREATE_TRIGGER, reverse_sql=DROP_TRIGGER),
+        migrations.RunPython(check_duplicates, migrations.RunPython.noop),
+        migrations.RemoveConstraint(
+            model_name="company",
+            name="company_criado_cnpj_uniq",
+        ),
+        migrations.AddConstraint(
+            model_name="company",
+            constraint=models.UniqueConstraint(
+                fields=("criado_por", "cnpj_digits"), name="company_criado_cnpj_uniq"
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["razao_social"],
+                name="company_razao_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["nome_fantasia"],
+                name="company_fantasia_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="company",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["cnpj_digits"],
+                name="company_cnpj_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ),
+    ]
@@ -0,0 +1,171 @@
+# Generated by Django 3.1.1 on 2026-10-18 04:07
+
+from typing import List
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Month of a processo in the rollup, rollups.REBUILD_ROLLUP must match it.
+MONTH = "date_trunc('month', data_distribuicao AT TIME ZONE 'UTC')::date"
+
+TOTALS = [
+    "valor_causa",
+    "valor_condenacao",
+    "valor_honorario",
+    "valor_preposto",
+    "valor_total",
+]
+
+# Rows a statement adds to and removes from each group of the rollup.
+ADDED = f"""
+SELECT criado_por_id, status, fase, comarca, {MONTH} AS mes, 1 AS quantidade,
+    {", ".join(TOTALS)}
+FROM new_rows
+"""
+
+REMOVED = f"""
+SELECT criado_por_id, status, fase, comarca, {MONTH} AS mes, -1 AS quantidade,
+    {", ".join(f"-{total} AS {total}" for total in TOTALS)}
+FROM old_rows
+"""
+
+# Statement level triggers apply the net change of a whole statement to the
+# rollup, once per changed group, so bulk writes do not update the same rollup
+# row once per processo. Groups that grow are upserted in group order; groups
+# that shrink already exist and are only updated, so deleting the rollup rows
+# of a user before its processos does not recreate them. Emptied groups are
+# removed.
+CREATE_FUNCTION = """
+CREATE FUNCTION app_processo_rollup_{event}() RETURNS trigger AS $$
+BEGIN
+    WITH delta AS ({delta})
+    INSERT INTO app_processorollup (
+        criado_por_id, status, fase, comarca, mes, quantidade, {totals}
+    )
+    SELECT * FROM delta WHERE quantidade > 0
+    ORDER BY criado_por_id, status, fase, comarca, mes
+    ON CONFLICT (criado_por_id, status, fase, comarca, mes) DO UPDATE SET
+        {upsert};
+
+    WITH delta AS ({delta})
+    UPDATE app_processorollup AS rollup SET {update}
+    FROM delta
+    WHERE delta.quantidade <= 0 AND {same_group};
+
+    WITH delta AS ({delta})
+    DELETE FROM app_processorollup AS rollup USING delta
+    WHERE rollup.quantidade <= 0 AND {same_group};
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER app_processo_rollup_{event}
+AFTER {event} ON app_processo
+REFERENCING {transition_tables}
+FOR EACH STATEMENT EXECUTE FUNCTION app_processo_rollup_{event}();
+"""
+
+DROP_FUNCTION = """
+DROP TRIGGER app_processo_rollup_{event} ON app_processo;
+DROP FUNCTION app_processo_rollup_{event}();
+"""
+
+
+def create_function(event: str, changes: List[str], transition_tables: str) -> str:
+    columns = ["quantidade", *TOTALS]
+    delta = (
+        "SELECT criado_por_id, status, fase, comarca, mes, "
+        f"{', '.join(f'sum({column}) AS {column}' for column in columns)} "
+        f"FROM ({' UNION ALL '.join(changes)}) AS changes GROUP BY 1, 2, 3, 4, 5"
+    )
+    return CREATE_FUNCTION.format(
+        event=event,
+        delta=delta,
+        totals=", ".join(TOTALS),
+        upsert=", ".join(
+            f"{column} = app_processorollup.{column} + EXCLUDED.{column}"
+            for column in columns
+        ),
+        update=", ".join(
+            f"{column} = rollup.{column} + delta.{column}" for column in columns
+        ),
+        same_group=(
+            "(rollup.criado_por_id, rollup.status, rollup.fase, rollup.comarca, "
+            "rollup.mes) = (delta.criado_por_id, delta.status, delta.fase, "
+            "delta.comarca, delta.mes)"
+        ),
+        transition_tables=transition_tables,
+    )
+
+
+CREATE_TRIGGERS = (
+    create_function("insert", [ADDED], "NEW TABLE AS new_rows")
+    + create_function(
+        "update", [ADDED, REMOVED], "NEW TABLE AS new_rows OLD TABLE AS old_rows"
+    )
+    + create_function("delete", [REMOVED], "OLD TABLE AS old_rows")
+)
+
+DROP_TRIGGERS = "".join(
+    DROP_FUNCTION.format(event=event) for event in ("insert", "update", "delete")
+)
+
+BACKFILL = f"""
+INSERT INTO app_processorollup (
+    criado_por_id, status, fase, comarca, mes, quantidade, {", ".join(TOTALS)}
+)
+SELECT criado_por_id, status, fase, comarca, {MONTH}, count(*),
+    {", ".join(f"sum({total})" for total in TOTALS)}
+FROM app_processo
+GROUP BY 1, 2, 3, 4, 5;
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0018_company_lookup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="ProcessoRollup",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("status", models.CharField(max_length=255)),
+                ("fase", models.CharField(max_length=255)),
+                ("comarca", models.CharField(max_length=255)),
+                ("mes", models.DateField()),
+                ("quantidade", models.IntegerField()),
+                ("valor_causa", models.FloatField()),
+                ("valor_condenacao", models.FloatField()),
+                ("valor_honorario", models.FloatField()),
+                ("valor_preposto", models.FloatField()),
+                ("valor_total", models.FloatField()),
+                (
+                    "criado_por",
+                    models.ForeignKey(
+                        on_delete=django.db.models.deletion.CASCADE,
+                        related_name="processo_rollups",
+                        to="app.systemuser",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddConstraint(
+            model_name="processorollup",
+            constraint=models.UniqueConstraint(
+                fields=("criado_por", "status", "fase", "comarca", "mes"),
+                name="processo_rollup_group_uniq",
+            ),
+        ),
+        migrations.RunSQL(sql=BACKFILL, reverse_sql=migrations.RunSQL.noop),
+        migrations.RunSQL(sql=CREATE_TRIGGERS, reverse_sql=DROP_TRIGGERS),
+    ]
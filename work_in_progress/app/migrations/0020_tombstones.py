@@ -0,0 +1,87 @@
+# Generated by Django 3.1.1 on 2026-10-18 04:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Type and primary key column of the tables whose deletions are logged, the
+# types must match sync.SYNC_MODELS. Tombstones are stamped with the time of
+# the DELETE, like atualizado_em, not with the start of its transaction.
+TABLES = {
+    "contato": ("app_contato", "contato_id"),
+    "company": ("app_company", "company_id"),
+    "processo": ("app_processo", "processo_id"),
+    "produto": ("app_produto", "id_produto"),
+}
+
+CREATE_TRIGGER = """
+CREATE FUNCTION {table}_tombstone() RETURNS trigger AS $$
+BEGIN
+    INSERT INTO app_tombstone (tipo, row_id, criado_por_id, deletado_em)
+    SELECT '{tipo}', {pk}, criado_por_id, clock_timestamp() FROM old_rows;
+    RETURN NULL;
+END
+$$ LANGUAGE plpgsql;
+
+CREATE TRIGGER {table}_tombstone
+AFTER DELETE ON {table}
+REFERENCING OLD TABLE AS old_rows
+FOR EACH STATEMENT EXECUTE FUNCTION {table}_tombstone();
+"""
+
+DROP_TRIGGER = """
+DROP TRIGGER {table}_tombstone ON {table};
+DROP FUNCTION {table}_tombstone();
+"""
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0019_processo_rollup"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="Tombstone",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("tipo", models.CharField(max_length=32)),
+                ("row_id", models.UUIDField()),
+                ("deletado_em", models.DateTimeField()),
+                (
+                    "criado_por",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="app.systemuser",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(
+                fields=["criado_por", "deletado_em"],
+                name="tombstone_criado_deletado_idx",
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="tombstone",
+            index=models.Index(fields=["deletado_em"], name="tombstone_deletado_idx"),
+        ),
+        *(
+            migrations.RunSQL(
+                sql=CREATE_TRIGGER.format(table=table, tipo=tipo, pk=pk),
+                reverse_sql=DROP_TRIGGER.format(table=table),
+            )
+            for tipo, (table, pk) in TABLES.items()
+        ),
+    ]
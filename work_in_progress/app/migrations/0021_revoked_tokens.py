@@ -0,0 +1,44 @@
+# Generated by Django 3.1.1 on 2026-10-18 04:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0020_tombstones"),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name="RevokedToken",
+            fields=[
+                (
+                    "id",
+                    models.AutoField(
+                        auto_created=True,
+                        primary_key=True,
+                        serialize=False,
+                        verbose_name="ID",
+                    ),
+                ),
+                ("versao", models.CharField(max_length=16)),
+                ("revogado_em", models.DateTimeField()),
+                (
+                    "user",
+                    models.ForeignKey(
+                        db_constraint=False,
+                        on_delete=django.db.models.deletion.DO_NOTHING,
+                        related_name="+",
+                        to="app.systemuser",
+                    ),
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name="revokedtoken",
+            index=models.Index(
+                fields=["revogado_em"], name="revoked_token_revogado_idx"
+            ),
+        ),
+    ]
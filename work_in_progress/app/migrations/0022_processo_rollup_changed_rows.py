@@ -0,0 +1,61 @@
+# Generated by Django 3.1.1 on 2026-10-18 06:10
+
+from importlib import import_module
+
+from django.db import migrations
+
+rollup = import_module("work_in_progress.app.migrations.0019_processo_rollup")
+
+# Columns of a processo the rollup is computed from.
+ROLLED_UP = [
+    "criado_por_id",
+    "status",
+    "fase",
+    "comarca",
+    "data_distribuicao",
+    *rollup.TOTALS,
+]
+
+
+def changed(rows: str, other: str) -> str:
+    # Keeps the rows whose rolled-up columns differ in the other image of the
+    # statement, so the processos an UPDATE doesn't move between groups or
+    # revalue, e.g. when only atualizado_em is bumped, add up to no delta and
+    # the rollup is not written at all.
+    return (
+        f"WHERE NOT EXISTS (SELECT 1 FROM {other} "
+        f"WHERE {other}.processo_id = {rows}.processo_id AND "
+        f"({', '.join(f'{other}.{column}' for column in ROLLED_UP)}) "
+        f"IS NOT DISTINCT FROM "
+        f"({', '.join(f'{rows}.{column}' for column in ROLLED_UP)}))"
+    )
+
+
+TRANSITION_TABLES = "NEW TABLE AS new_rows OLD TABLE AS old_rows"
+
+CREATE_UPDATE_TRIGGER = rollup.DROP_FUNCTION.format(
+    event="update"
+) + rollup.create_function(
+    "update",
+    [
+        rollup.ADDED + changed("new_rows", "old_rows"),
+        rollup.REMOVED + changed("old_rows", "new_rows"),
+    ],
+    TRANSITION_TABLES,
+)
+
+RESTORE_UPDATE_TRIGGER = rollup.DROP_FUNCTION.format(
+    event="update"
+) + rollup.create_function("update", [rollup.ADDED, rollup.REMOVED], TRANSITION_TABLES)
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("app", "0021_revoked_tokens"),
+    ]
+
+    operations = [
+        migrations.RunSQL(
+            sql=CREATE_UPDATE_TRIGGER, reverse_sql=RESTORE_UPDATE_TRIGGER
+        ),
+    ]
@@ -1,7 +1,15 @@
+import hashlib
+import os
+import re
+import threading
+import time
 import uuid
-from datetime import datetime
+from datetime import date, datetime
+from typing import Any, Optional
 
 from django.contrib.auth.models import AbstractUser
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVectorField
 from django.db import models
 
 
@@ -10,6 +18,71 @@ def get_new_uuid_hex() -> str:
     return f"{uuid.uuid4().hex}"
 
 
+# Millisecond and sequence of the last UUIDv7, see get_new_uuid7.
+_uuid7_state = [0, 0]
+_uuid7_lock = threading.Lock()
+
+
+def get_new_uuid7() -> uuid.UUID:
+    """
+    Return a UUIDv7: a millisecond unix timestamp, a 12 bit sequence and
+    random bits.
+
+    Keys generated later sort after the previous ones, so inserts append to
+    the right edge of the primary key indexes instead of scattering. Within
+    the same millisecond the sequence is incremented, so keys generated by a
+    process are strictly increasing.
+    """
+    with _uuid7_lock:
+        millis = time.time_ns() // 1_000_000
+        last_millis, sequence = _uuid7_state
+        if millis > last_millis:
+            sequence = int.from_bytes(os.urandom(2), "big") & 0x7FF
+        elif sequence < 0xFFF:
+            millis, sequence = last_millis, sequence + 1
+        else:
+            millis, sequence = last_millis + 1, 0
+        _uuid7_state[:] = [millis, sequence]
+    random_bits = int.from_bytes(os.urandom(8), "big") >> 2
+    return uuid.UUID(
+        int=millis << 80 | 0x7 << 76 | sequence << 64 | 0x2 << 62 | random_bits
+    )
+
+
+def normalize_cnpj(cnpj: str) -> Optional[str]:
+    """
+    Return the digits of a cnpj, or None if it has none, like the trigger
+    that maintains Company.cnpj_digits.
+    """
+    return re.sub(r"\D", "", cnpj) or None
+
+
+def parse_id(value: Any) -> Optional[uuid.UUID]:
+    """
+    Parse a primary key sent by a client, either in the 32 character hex
+    format or in the canonical format.
+
+    Returns:
+        The key, or None if the value is not a UUID.
+    """
+    if isinstance(value, uuid.UUID):
+        return value
+    try:
+        return uuid.UUID(str(value))
+    except ValueError:
+        return None
+
+
+def token_version(secret: str) -> str:
+    """
+    Return the version of the tokens of a user with the given secret.
+
+    Tokens can be read by clients, so they carry a digest of the secret and
+    not the secret itself.
+    """
+    return hashlib.sha256(secret.encode()).hexdigest()[:16]
+
+
 class SystemUser(AbstractUser):
     secret: str = models.CharField(
         max_length=255,
@@ -24,6 +97,10 @@ class SystemUser(AbstractUser):
     def __str__(self) -> str:
         return f"{self.username} <-> {self.email}"
 
+    @property
+    def token_version(self) -> str:
+        return token_version(self.secret)
+
 
 SystemUser._meta.get_field("groups").remote_field.related_name = "system_users_groups"
 SystemUser._meta.get_field(
@@ -32,11 +109,9 @@ SystemUser._meta.get_field(
 
 
 class Contato(models.Model):
-    contato_id: str = models.CharField(
-        max_length=255,
-        default=get_new_uuid_hex,
+    contato_id: uuid.UUID = models.UUIDField(
+        default=get_new_uuid7,
         editable=False,
-        unique=True,
         primary_key=True,
     )
     nome: str = models.CharField(
@@ -61,20 +136,53 @@ class Contato(models.Model):
         on_delete=models.CASCADE,
         related_name="contatos",
     )
+    criado_em: datetime = models.DateTimeField(auto_now_add=True)
+    atualizado_em: datetime = models.DateTimeField(auto_now=True)
+    # Maintained by a database trigger, see migration 0017.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["criado_em", "contato_id"], name="contato_keyset_idx"),
+            models.Index(
+                fields=["criado_por", "criado_em", "contato_id"],
+                name="contato_criado_keyset_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="contato_criado_atualizado_idx",
+            ),
+            models.Index(fields=["criado_por", "nome"], name="contato_criado_nome_idx"),
+            models.Index(
+                fields=["criado_por", "cidade"], name="contato_criado_cidade_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "estado"], name="contato_criado_estado_idx"
+            ),
+            GinIndex(fields=["search_vector"], name="contato_search_idx"),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["criado_por", "email_responsavel"],
+                name="contato_criado_email_uniq",
+            ),
+        ]
 
     def __str__(self) -> str:
         return f"{self.nome} <-> {self.email_responsavel} <-> {self.email_cobranca}"
 
 
 class Company(models.Model):
-    company_id: str = models.CharField(
-        max_length=255,
-        default=get_new_uuid_hex,
+    company_id: uuid.UUID = models.UUIDField(
+        default=get_new_uuid7,
         editable=False,
-        unique=True,
         primary_key=True,
     )
     cnpj: str = models.CharField(max_length=255)
+    # Digits of cnpj, maintained by a database trigger, see migration 0018.
+    cnpj_digits: Optional[str] = models.CharField(
+        max_length=255, null=True, editable=False
+    )
     razao_social: str = models.CharField(max_length=255)
     nome_fantasia: str = models.CharField(max_length=255)
     inscricao_estadual: str = models.CharField(max_length=255)
@@ -85,20 +193,58 @@ class Company(models.Model):
     criado_em: datetime = models.DateTimeField(auto_now_add=True)
     atualizado_em: datetime = models.DateTimeField(auto_now=True)
     ativo: bool = models.BooleanField(default=True)
+    # Cascaded by the ON DELETE CASCADE constraint created in migration 0014.
     contato: Contato = models.ForeignKey(
-        Contato, on_delete=models.CASCADE, related_name="companies"
+        Contato, on_delete=models.DO_NOTHING, related_name="companies"
     )
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["criado_em", "company_id"], name="company_keyset_idx"),
+            models.Index(
+                fields=["criado_por", "criado_em", "company_id"],
+                name="company_criado_keyset_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="company_criado_atualizado_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "ativo"], name="company_criado_ativo_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "razao_social"], name="company_criado_razao_idx"
+            ),
+            GinIndex(
+                fields=["razao_social"],
+                name="company_razao_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["nome_fantasia"],
+                name="company_fantasia_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+            GinIndex(
+                fields=["cnpj_digits"],
+                name="company_cnpj_trgm_idx",
+                opclasses=["gin_trgm_ops"],
+            ),
+        ]
+        constraints = [
+            models.UniqueConstraint(
+                fields=["criado_por", "cnpj_digits"], name="company_criado_cnpj_uniq"
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.razao_social} <-> {self.cnpj} <-> {self.nome_fantasia}"
 
 
 class Processo(models.Model):
-    processo_id: str = models.CharField(
-        max_length=255,
-        default=get_new_uuid_hex,
+    processo_id: uuid.UUID = models.UUIDField(
+        default=get_new_uuid7,
         editable=False,
-        unique=True,
         primary_key=True,
     )
     advogado_responsavel: str = models.CharField(max_length=255)
@@ -121,6 +267,49 @@ class Processo(models.Model):
     criado_em: datetime = models.DateTimeField(auto_now_add=True)
     atualizado_em: datetime = models.DateTimeField(auto_now=True)
     ativo: bool = models.BooleanField(default=True)
+    # Maintained by a database trigger, see migration 0017.
+    search_vector = SearchVectorField(null=True, editable=False)
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["criado_em", "processo_id"], name="processo_keyset_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "criado_em", "processo_id"],
+                name="processo_criado_keyset_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="processo_criado_atualizado_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "status"], name="processo_criado_status_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "fase"], name="processo_criado_fase_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "comarca"], name="processo_criado_comarca_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "estado"], name="processo_criado_estado_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "ativo"], name="processo_criado_ativo_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "data_distribuicao"],
+                name="processo_criado_distrib_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "valor_causa"], name="processo_criado_causa_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "valor_total"], name="processo_criado_total_idx"
+            ),
+            GinIndex(fields=["search_vector"], name="processo_search_idx"),
+        ]
 
     def __str__(self) -> str:
         return (
@@ -128,12 +317,97 @@ class Processo(models.Model):
         )
 
 
+class ProcessoRollup(models.Model):
+    """
+    Totals of the processos of a user by status, fase, comarca and month of
+    data_distribuicao.
+
+    The rows are maintained by a database trigger on app_processo, see
+    migrations 0019 and 0022, and can be recomputed with
+    rebuild_processo_rollup.
+    """
+
+    criado_por: SystemUser = models.ForeignKey(
+        SystemUser, on_delete=models.CASCADE, related_name="processo_rollups"
+    )
+    status: str = models.CharField(max_length=255)
+    fase: str = models.CharField(max_length=255)
+    comarca: str = models.CharField(max_length=255)
+    mes: date = models.DateField()
+    quantidade: int = models.IntegerField()
+    valor_causa: float = models.FloatField()
+    valor_condenacao: float = models.FloatField()
+    valor_honorario: float = models.FloatField()
+    valor_preposto: float = models.FloatField()
+    valor_total: float = models.FloatField()
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["criado_por", "status", "fase", "comarca", "mes"],
+                name="processo_rollup_group_uniq",
+            ),
+        ]
+
+
+class Tombstone(models.Model):
+    """
+    A row deleted from Contato, Company, Processo or Produto, for the delta
+    sync.
+
+    The rows are written by database triggers, see migration 0020. criado_por
+    has no database constraint, so deleting a user can log the deletion of
+    its rows.
+    """
+
+    tipo: str = models.CharField(max_length=32)
+    row_id: uuid.UUID = models.UUIDField()
+    criado_por: SystemUser = models.ForeignKey(
+        SystemUser,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    deletado_em: datetime = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(
+                fields=["criado_por", "deletado_em"],
+                name="tombstone_criado_deletado_idx",
+            ),
+            models.Index(fields=["deletado_em"], name="tombstone_deletado_idx"),
+        ]
+
+
+class RevokedToken(models.Model):
+    """
+    A token version of a user, revoked when the user was deleted or its
+    password, superuser or active flag changed.
+
+    Rows are kept while tokens of the version may be unexpired. user has no
+    database constraint, so the tokens of deleted users stay revoked.
+    """
+
+    user: SystemUser = models.ForeignKey(
+        SystemUser,
+        on_delete=models.DO_NOTHING,
+        db_constraint=False,
+        related_name="+",
+    )
+    versao: str = models.CharField(max_length=16)
+    revogado_em: datetime = models.DateTimeField()
+
+    class Meta:
+        indexes = [
+            models.Index(fields=["revogado_em"], name="revoked_token_revogado_idx"),
+        ]
+
+
 class Produto(models.Model):
-    id_produto: str = models.CharField(
-        max_length=255,
-        default=get_new_uuid_hex,
+    id_produto: uuid.UUID = models.UUIDField(
+        default=get_new_uuid7,
         editable=False,
-        unique=True,
         primary_key=True,
     )
     nome: str = models.CharField(max_length=255, blank=False, null=True)
@@ -146,5 +420,24 @@ class Produto(models.Model):
     criado_em: datetime = models.DateTimeField(auto_now_add=True)
     atualizado_em: datetime = models.DateTimeField(auto_now=True)
 
+    class Meta:
+        indexes = [
+            models.Index(fields=["criado_em", "id_produto"], name="produto_keyset_idx"),
+            models.Index(
+                fields=["criado_por", "criado_em", "id_produto"],
+                name="produto_criado_keyset_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "atualizado_em"],
+                name="produto_criado_atualizado_idx",
+            ),
+            models.Index(
+                fields=["criado_por", "preco"], name="produto_criado_preco_idx"
+            ),
+            models.Index(
+                fields=["criado_por", "quantidade"], name="produto_criado_qtd_idx"
+            ),
+        ]
+
     def __str__(self) -> str:
         return f"{self.nome} <-> {self.descricao} <-> {self.preco}"
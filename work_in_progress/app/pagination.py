@@ -0,0 +1,116 @@
+import base64
+import json
+from typing import Any, Callable, List, Optional, Sequence, Tuple
+
+from django.core.exceptions import ValidationError
+from django.db.models import Q, QuerySet
+
+from work_in_progress.app.exceptions import HTTPException
+
+
+def encode_cursor(ordering: Sequence[str], values: Sequence[Any]) -> str:
+    """
+    Encode the ordering key of the last row of a page as an opaque cursor.
+    """
+    raw = json.dumps(
+        [list(ordering), [str(value) for value in values]], separators=(",", ":")
+    )
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+
+def decode_cursor(ordering: Sequence[str], cursor: str) -> List[str]:
+    """
+    Decode a cursor, which must have been issued for the same ordering.
+
+    Raises:
+        HTTPException: If the cursor is malformed or for another ordering.
+    """
+    try:
+        padding = "=" * (-len(cursor) % 4)
+        cursor_ordering, values = json.loads(base64.urlsafe_b64decode(cursor + padding))
+    except (ValueError, TypeError):
+        raise HTTPException(400, "Cursor inválido")
+    if cursor_ordering != list(ordering) or len(values) != len(ordering):
+        raise HTTPException(400, "Cursor inválido")
+    return values
+
+
+def _keyset_filter(ordering: Sequence[str], values: Sequence[Any]) -> Q:
+    """
+    Build the "row comes after (values)" condition for the given ordering.
+
+    The first ordering field is also bounded on its own so the database can
+    start the index range scan directly at the cursor position.
+    """
+    first = ordering[0]
+    bound = "lte" if first.startswith("-") else "gte"
+    after = Q()
+    equal = Q()
+    for field, value in zip(ordering, values):
+        name = field.lstrip("-")
+        lookup = "lt" if field.startswith("-") else "gt"
+        after |= equal & Q(**{f"{name}__{lookup}": value})
+        equal &= Q(**{name: value})
+    return Q(**{f"{first.lstrip('-')}__{bound}": values[0]}) & after
+
+
+def apply_cursor(
+    queryset: QuerySet, ordering: Sequence[str], after: Optional[str] = None
+) -> QuerySet:
+    """
+    Order the queryset and keep only the rows after the given cursor.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    model = queryset.model
+    if after:
+        raw_values = decode_cursor(ordering, after)
+        try:
+            values = [
+                model._meta.get_field(field.lstrip("-")).to_python(value)
+                if field.lstrip("-") != "pk"
+                else model._meta.pk.to_python(value)
+                for field, value in zip(ordering, raw_values)
+            ]
+        except ValidationError:
+            raise HTTPException(400, "Cursor inválido")
+        queryset = queryset.filter(_keyset_filter(ordering, values))
+    return queryset.order_by(*ordering)
+
+
+def paginate(
+    queryset: QuerySet,
+    ordering: Sequence[str],
+    limit: int,
+    after: Optional[str] = None,
+    key: Optional[Callable[[Any], Sequence[Any]]] = None,
+) -> Tuple[List[Any], Optional[str]]:
+    """
+    Return one page of the queryset and the cursor of the next page.
+
+    Args:
+        queryset: The queryset to paginate.
+        ordering: Ordering fields, the last one must be unique (usually "pk").
+        limit: Maximum number of rows in the page.
+        after: Cursor returned by the previous page.
+        key: Returns the ordering values of a row, for querysets that don't
+            yield model instances.
+
+    Returns:
+        The rows of the page and the cursor of the next page, or None if
+        this is the last page.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    rows = list(apply_cursor(queryset, ordering, after)[: limit + 1])
+    if len(rows) <= limit:
+        return rows, None
+    rows = rows[:limit]
+    last = rows[-1]
+    if key is not None:
+        return rows, encode_cursor(ordering, key(last))
+    return rows, encode_cursor(
+        ordering, [getattr(last, field.lstrip("-")) for field in ordering]
+    )
@@ -0,0 +1,140 @@
+import asyncio
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Counter, Dict, Iterator, List, Optional, Tuple
+
+from django.contrib.auth.hashers import (
+    UNUSABLE_PASSWORD_PREFIX,
+    check_password,
+    identify_hasher,
+    make_password,
+)
+from django.http import HttpRequest
+from django.utils.crypto import constant_time_compare
+
+from work_in_progress.app.concurrency import run_sync
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.app.models import SystemUser
+from work_in_progress.settings import (
+    PASSWORD_CHECK_PER_USER,
+    PASSWORD_CHECK_QUEUE_DEPTH,
+    PASSWORD_CHECK_THREADS,
+)
+
+
+def verify(encoded: Optional[str], password: str) -> Tuple[bool, Optional[str]]:
+    """
+    Check a password against the stored one, hashing it again with the
+    preferred hasher of PASSWORD_HASHERS if the stored one is outdated.
+
+    Passwords stored in plain text, from before the passwords were hashed,
+    are accepted once and replaced by their hash. Without a stored password
+    the password is hashed anyway, so unknown usernames take as long to
+    refuse as wrong passwords.
+
+    Returns:
+        Whether the password is correct, and its new hash if the stored one
+        must be replaced.
+    """
+    if not encoded or encoded.startswith(UNUSABLE_PASSWORD_PREFIX):
+        make_password(password)
+        return False, None
+    try:
+        identify_hasher(encoded)
+    except ValueError:
+        if constant_time_compare(encoded, password):
+            return True, make_password(password)
+        make_password(password)
+        return False, None
+    upgraded: List[str] = []
+    valid = check_password(
+        password, encoded, setter=lambda raw: upgraded.append(make_password(raw))
+    )
+    return valid, upgraded[0] if upgraded else None
+
+
+def _get_user(username: str) -> Optional[SystemUser]:
+    return SystemUser.objects.filter(username=username).first()
+
+
+def _set_password(user: SystemUser, encoded: str) -> None:
+    # Only replaces the password that was checked, never one changed meanwhile.
+    SystemUser.objects.filter(pk=user.pk, password=user.password).update(
+        password=encoded
+    )
+
+
+class PasswordChecker:
+    """
+    Verify login passwords in a dedicated, bounded pool of threads.
+
+    Hashers are slow on purpose, so the checks don't run in the threads
+    serving the other requests, and at most queue_depth of them wait for
+    the pool: a login burst is refused with a 503 instead of building a
+    backlog. A single username has at most per_user checks in flight,
+    which also slows down guessing its password.
+    """
+
+    def __init__(self, threads: int, queue_depth: int, per_user: int) -> None:
+        self.executor = ThreadPoolExecutor(
+            max_workers=threads, thread_name_prefix="password"
+        )
+        self.queue_depth = queue_depth
+        self.per_user = per_user
+        self.rejected = 0
+        self._pending = 0
+        self._users: Counter[str] = Counter()
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def _slot(self, username: str) -> Iterator[None]:
+        with self._lock:
+            if self._pending >= self.queue_depth:
+                self.rejected += 1
+                raise HTTPException(503, "Muitos logins simultâneos, tente novamente")
+            if self._users[username] >= self.per_user:
+                self.rejected += 1
+                raise HTTPException(429, "Muitas tentativas de login simultâneas")
+            self._pending += 1
+            self._users[username] += 1
+        try:
+            yield
+        finally:
+            with self._lock:
+                self._pending -= 1
+                self._users[username] -= 1
+                if not self._users[username]:
+                    del self._users[username]
+
+    async def check(
+        self, request: HttpRequest, username: str, password: str
+    ) -> Optional[SystemUser]:
+        """
+        Return the user with the given username and password, upgrading its
+        stored password when needed.
+
+        Raises:
+            HTTPException: If too many checks are waiting for the pool, or
+                for the username.
+        """
+        user = await run_sync(request, _get_user, username)
+        with self._slot(username):
+            valid, upgraded = await asyncio.get_event_loop().run_in_executor(
+                self.executor, verify, user.password if user else None, password
+            )
+        if user is None or not valid:
+            return None
+        if upgraded is not None:
+            await run_sync(request, _set_password, user, upgraded)
+        return user
+
+    def stats(self) -> Dict[str, int]:
+        return {"pending": self._pending, "rejected": self.rejected}
+
+
+password_checker = PasswordChecker(
+    threads=PASSWORD_CHECK_THREADS,
+    queue_depth=PASSWORD_CHECK_QUEUE_DEPTH,
+    per_user=PASSWORD_CHECK_PER_USER,
+)
@@ -0,0 +1,31 @@
+import time
+from typing import Any
+
+import orjson
+from django.http import HttpRequest
+from ninja.renderers import BaseRenderer
+from ninja.responses import NinjaJSONEncoder
+
+from work_in_progress.app.metrics import record_render
+
+# Only used for the types orjson doesn't handle natively (Decimal, pydantic
+# models) and for datetimes, so they keep Django's wire format.
+_fallback_encoder = NinjaJSONEncoder()
+
+
+def dumps(data: Any) -> bytes:
+    return orjson.dumps(
+        data,
+        default=_fallback_encoder.default,
+        option=orjson.OPT_PASSTHROUGH_DATETIME,
+    )
+
+
+class ORJSONRenderer(BaseRenderer):
+    media_type = "application/json"
+
+    def render(self, request: HttpRequest, data: Any, *, response_status: int) -> Any:
+        start = time.perf_counter()
+        content = dumps(data)
+        record_render(time.perf_counter() - start)
+        return content
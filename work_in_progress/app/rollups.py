@@ -0,0 +1,75 @@
+from typing import Any, Dict, List
+
+from django.db import connection, transaction
+from django.db.models import QuerySet, Sum
+
+from work_in_progress.app.models import SystemUser
+
+# The summed columns of ProcessoRollup.
+ROLLUP_TOTALS = (
+    "quantidade",
+    "valor_causa",
+    "valor_condenacao",
+    "valor_honorario",
+    "valor_preposto",
+    "valor_total",
+)
+
+ROLLUP_GROUP = ("status", "fase", "comarca", "mes")
+
+# Must match the app_processo_rollup triggers of migrations 0019 and 0022.
+REBUILD_ROLLUP = """
+INSERT INTO app_processorollup (
+    criado_por_id, status, fase, comarca, mes, quantidade, valor_causa,
+    valor_condenacao, valor_honorario, valor_preposto, valor_total
+)
+SELECT
+    criado_por_id, status, fase, comarca,
+    date_trunc('month', data_distribuicao AT TIME ZONE 'UTC')::date,
+    count(*), sum(valor_causa), sum(valor_condenacao), sum(valor_honorario),
+    sum(valor_preposto), sum(valor_total)
+FROM app_processo
+GROUP BY 1, 2, 3, 4, 5
+"""
+
+
+def rebuild_processo_rollup() -> int:
+    """
+    Recompute every row of ProcessoRollup from the processos, e.g. to drop
+    the rounding errors the incremental float sums accumulate.
+
+    Writes to app_processo wait for the rebuild, so no change is lost.
+
+    Returns:
+        The number of rollup rows.
+    """
+    with transaction.atomic(), connection.cursor() as cursor:
+        cursor.execute("LOCK TABLE app_processo IN SHARE MODE")
+        cursor.execute("DELETE FROM app_processorollup")
+        cursor.execute(REBUILD_ROLLUP)
+        return cursor.rowcount
+
+
+def processo_stats(user: SystemUser, rollups: QuerySet) -> List[Dict[str, Any]]:
+    """
+    Return the totals of the given rollup rows by status, fase, comarca and
+    month.
+
+    Only the rollup is read, so the cost depends on the number of groups and
+    not on the number of processos. Superusers get the totals of every user,
+    like the list endpoints.
+    """
+    if not user.is_superuser:
+        rollups = rollups.filter(criado_por=user)
+    rows = (
+        rollups.values(*ROLLUP_GROUP)
+        .annotate(**{f"{name}_sum": Sum(name) for name in ROLLUP_TOTALS})
+        .order_by("-mes", *ROLLUP_GROUP[:3])
+    )
+    return [
+        {
+            **{name: row[name] for name in ROLLUP_GROUP},
+            **{name: row[f"{name}_sum"] for name in ROLLUP_TOTALS},
+        }
+        for row in rows
+    ]
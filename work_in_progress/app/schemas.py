@@ -1,7 +1,50 @@
-from datetime import datetime
-from typing import Dict, List, Type
+from datetime import date, datetime
+from typing import Any, Callable, Dict, Iterator, List, Literal, Optional, Type
+from uuid import UUID
 
-from ninja import Schema
+from ninja import FilterSchema, Schema
+from pydantic import Field, validator
+
+from work_in_progress.app.models import parse_id
+from work_in_progress.settings import (
+    ANALYTICS_DEFAULT_BINS,
+    ANALYTICS_MAX_BINS,
+    LOOKUP_SIMILARITY_THRESHOLD,
+    PAGINATION_DEFAULT_LIMIT,
+    PAGINATION_MAX_LIMIT,
+)
+
+
+class HexUUID(str):
+    """
+    A foreign key, accepted in the hex or the canonical UUID format and
+    always written as 32 hex characters.
+
+    Values that are not UUIDs are kept as sent and treated as unknown keys.
+    """
+
+    @classmethod
+    def __get_validators__(cls) -> Iterator[Callable[[Any], str]]:
+        yield cls.validate
+
+    @classmethod
+    def validate(cls, value: Any) -> str:
+        key = parse_id(value)
+        return key.hex if key is not None else str(value)
+
+
+def not_null(*fields: str) -> Any:
+    """
+    Validator refusing an explicit null for the given fields of a partial
+    payload, whose columns can't be cleared; omitted fields stay unset.
+    """
+
+    def check(cls: Any, value: Any) -> Any:
+        if value is None:
+            raise ValueError("não pode ser nulo")
+        return value
+
+    return validator(*fields, pre=True, allow_reuse=True)(check)
 
 
 class LoginSchema(Schema):
@@ -38,14 +81,32 @@ class Default404(Schema):
     message: str = "Not Found"
 
 
+class Default409(Schema):
+    message: str = "Conflict"
+
+
+class Default410(Schema):
+    message: str = "Gone"
+
+
+class Default429(Schema):
+    message: str = "Too Many Requests"
+
+
 class Default500(Schema):
     message: str = "Internal Server Error"
 
 
+class Default503(Schema):
+    message: str = "Service Unavailable"
+
+
 login_responses_dict: Dict[int, Type[Schema]] = {
     200: LoginSuccess,
     401: Default401,
+    429: Default429,
     500: Default500,
+    503: Default503,
 }
 
 responses_dict: Dict[int, Type[Schema]] = {
@@ -59,6 +120,34 @@ responses_dict: Dict[int, Type[Schema]] = {
 }
 
 
+class ListParams(Schema):
+    limit: int = Field(PAGINATION_DEFAULT_LIMIT, ge=1, le=PAGINATION_MAX_LIMIT)
+    after: Optional[str] = None
+    stream: bool = False
+    fields: Optional[str] = Field(
+        None, description="Comma separated subset of the fields to return"
+    )
+
+
+class SearchParams(Schema):
+    q: str = Field(..., min_length=1, description="Web search style query")
+    limit: int = Field(PAGINATION_DEFAULT_LIMIT, ge=1, le=PAGINATION_MAX_LIMIT)
+    after: Optional[str] = None
+
+
+class SearchResult(Schema):
+    type: Literal["contato", "processo"]
+    id: str
+    rank: float
+    title: str
+    detail: str
+
+
+class SearchResultsSchema(Schema):
+    results: List[SearchResult]
+    next: Optional[str] = None
+
+
 class ContatoSchema(Schema):
     nome: str
     endereco: str
@@ -73,6 +162,22 @@ class ContatoSchema(Schema):
     email_cobranca: str
 
 
+class ContatoPatchSchema(Schema):
+    nome: Optional[str] = None
+    endereco: Optional[str] = None
+    numero: Optional[str] = None
+    complemento: Optional[str] = None
+    bairro: Optional[str] = None
+    cidade: Optional[str] = None
+    estado: Optional[str] = None
+    cep: Optional[str] = None
+    telefone: Optional[str] = None
+    email_responsavel: Optional[str] = None
+    email_cobranca: Optional[str] = None
+
+    _not_null = not_null("*")
+
+
 class ContatosSchema(Schema):
     contatos: List[ContatoSchema] = [
         ContatoSchema(
@@ -90,6 +195,7 @@ class ContatosSchema(Schema):
             email_cobranca="financeiro@teste.com",
         )
     ]
+    next: Optional[str] = None
 
 
 class CompanySchema(Schema):
@@ -99,7 +205,37 @@ class CompanySchema(Schema):
     inscricao_estadual: str
     inscricao_municipal: str
     ativo: bool
-    contato_id: str
+    contato_id: HexUUID
+
+
+class CompanyLookupParams(Schema):
+    q: str = Field(..., min_length=1, description="Razão social, nome fantasia or cnpj")
+    threshold: float = Field(LOOKUP_SIMILARITY_THRESHOLD, gt=0, le=1)
+    limit: int = Field(PAGINATION_DEFAULT_LIMIT, ge=1, le=PAGINATION_MAX_LIMIT)
+
+
+class CompanyMatch(Schema):
+    id: str
+    cnpj: str
+    razao_social: str
+    nome_fantasia: str
+    similarity: float
+
+
+class CompanyLookupSchema(Schema):
+    companies: List[CompanyMatch]
+
+
+class CompanyPatchSchema(Schema):
+    cnpj: Optional[str] = None
+    razao_social: Optional[str] = None
+    nome_fantasia: Optional[str] = None
+    inscricao_estadual: Optional[str] = None
+    inscricao_municipal: Optional[str] = None
+    ativo: Optional[bool] = None
+    contato_id: Optional[HexUUID] = None
+
+    _not_null = not_null("*")
 
 
 class CompaniesSchema(Schema):
@@ -115,6 +251,7 @@ class CompaniesSchema(Schema):
             contato_id="1",
         )
     ]
+    next: Optional[str] = None
 
 
 class ProcessoSchema(Schema):
@@ -135,6 +272,82 @@ class ProcessoSchema(Schema):
     ativo: bool
 
 
+class ProcessoStats(Schema):
+    status: str
+    fase: str
+    comarca: str
+    mes: date
+    quantidade: int
+    valor_causa: float
+    valor_condenacao: float
+    valor_honorario: float
+    valor_preposto: float
+    valor_total: float
+
+
+class ProcessoStatsSchema(Schema):
+    stats: List[ProcessoStats]
+
+
+class AnalyticsParams(Schema):
+    metric: Literal["valor_causa", "valor_total"] = "valor_causa"
+    by: Literal["comarca", "advogado_responsavel"] = "comarca"
+    bins: int = Field(ANALYTICS_DEFAULT_BINS, ge=1, le=ANALYTICS_MAX_BINS)
+
+
+class Histogram(Schema):
+    edges: List[float]
+    counts: List[int]
+
+
+class Distribution(Schema):
+    group: str
+    count: int
+    mean: float
+    std: float
+    min: float
+    max: float
+    percentiles: Dict[str, float]
+    histogram: Histogram
+    outliers: int
+    lower_fence: float
+    upper_fence: float
+
+
+class DistributionsSchema(Schema):
+    metric: str
+    by: str
+    groups: List[Distribution]
+
+
+class ProcessoUpsertSchema(ProcessoSchema):
+    processo_id: Optional[str] = None
+
+
+class ProcessoPatchSchema(Schema):
+    advogado_responsavel: Optional[str] = None
+    cliente: Optional[str] = None
+    numero_processo: Optional[str] = None
+    vara: Optional[str] = None
+    comarca: Optional[str] = None
+    estado: Optional[str] = None
+    status: Optional[str] = None
+    fase: Optional[str] = None
+    valor_causa: Optional[float] = None
+    valor_condenacao: Optional[float] = None
+    valor_honorario: Optional[float] = None
+    valor_preposto: Optional[float] = None
+    valor_total: Optional[float] = None
+    data_distribuicao: Optional[datetime] = None
+    ativo: Optional[bool] = None
+
+    _not_null = not_null("*")
+
+
+class ProcessoBulkPatchSchema(ProcessoPatchSchema):
+    processo_id: str
+
+
 class ProcessosSchema(Schema):
     processos: List[ProcessoSchema] = [
         ProcessoSchema(
@@ -155,6 +368,7 @@ class ProcessosSchema(Schema):
             ativo=True,
         )
     ]
+    next: Optional[str] = None
 
 
 class ProdutoSchema(Schema):
@@ -164,6 +378,40 @@ class ProdutoSchema(Schema):
     quantidade: int
 
 
+class ProdutoUpsertSchema(ProdutoSchema):
+    id_produto: Optional[str] = None
+
+
+class ProdutoPatchSchema(Schema):
+    nome: Optional[str] = None
+    descricao: Optional[str] = None
+    preco: Optional[float] = None
+    quantidade: Optional[int] = None
+
+    _not_null = not_null("*")
+
+
+class ProdutoBulkPatchSchema(ProdutoPatchSchema):
+    id_produto: str
+
+
+class StockDeltaSchema(Schema):
+    delta: int
+
+
+class StockItemSchema(StockDeltaSchema):
+    id_produto: str
+
+
+class StockSchema(Schema):
+    id_produto: str
+    quantidade: int
+
+
+class StocksSchema(Schema):
+    produtos: List[StockSchema]
+
+
 class ProdutosSchema(Schema):
     produtos: List[ProdutoSchema] = [
         ProdutoSchema(
@@ -173,6 +421,119 @@ class ProdutosSchema(Schema):
             quantidade=2,
         )
     ]
+    next: Optional[str] = None
+
+
+class ContatoFilterSchema(FilterSchema):
+    cidade: Optional[str] = None
+    estado: Optional[str] = None
+
+
+class CompanyFilterSchema(FilterSchema):
+    ativo: Optional[bool] = None
+    contato_id: Optional[UUID] = None
+
+
+class ProcessoFilterSchema(FilterSchema):
+    status: Optional[str] = None
+    fase: Optional[str] = None
+    comarca: Optional[str] = None
+    estado: Optional[str] = None
+    ativo: Optional[bool] = None
+    data_distribuicao_min: Optional[datetime] = Field(None, q="data_distribuicao__gte")
+    data_distribuicao_max: Optional[datetime] = Field(None, q="data_distribuicao__lte")
+
+
+class ProcessoStatsFilterSchema(FilterSchema):
+    status: Optional[str] = None
+    fase: Optional[str] = None
+    comarca: Optional[str] = None
+    mes_min: Optional[date] = Field(None, q="mes__gte")
+    mes_max: Optional[date] = Field(None, q="mes__lte")
+
+
+class ProdutoFilterSchema(FilterSchema):
+    preco_min: Optional[float] = Field(None, q="preco__gte")
+    preco_max: Optional[float] = Field(None, q="preco__lte")
+    quantidade_min: Optional[int] = Field(None, q="quantidade__gte")
+    quantidade_max: Optional[int] = Field(None, q="quantidade__lte")
+
+
+# Accepted ?order_by= values, each one backed by a (criado_por, field) index.
+ContatoOrdering = Literal["nome", "-nome", "cidade", "-cidade", "estado", "-estado"]
+CompanyOrdering = Literal["criado_em", "-criado_em", "razao_social", "-razao_social"]
+ProcessoOrdering = Literal[
+    "criado_em",
+    "-criado_em",
+    "data_distribuicao",
+    "-data_distribuicao",
+    "valor_causa",
+    "-valor_causa",
+    "valor_total",
+    "-valor_total",
+]
+ProdutoOrdering = Literal[
+    "criado_em", "-criado_em", "preco", "-preco", "quantidade", "-quantidade"
+]
+
+
+class ContatoSyncSchema(ContatoSchema):
+    contato_id: HexUUID
+    atualizado_em: datetime
+
+
+class CompanySyncSchema(CompanySchema):
+    company_id: HexUUID
+    atualizado_em: datetime
+
+
+class ProcessoSyncSchema(ProcessoSchema):
+    processo_id: HexUUID
+    atualizado_em: datetime
+
+
+class ProdutoSyncSchema(ProdutoSchema):
+    id_produto: HexUUID
+    atualizado_em: datetime
+
+
+class TombstoneSchema(Schema):
+    type: Literal["contato", "company", "processo", "produto"]
+    id: str
+    deletado_em: datetime
+
+
+class SyncParams(Schema):
+    since: Optional[datetime] = Field(
+        None, description="Watermark returned by the previous sync"
+    )
+    limit: int = Field(PAGINATION_DEFAULT_LIMIT, ge=1, le=PAGINATION_MAX_LIMIT)
+    after: Optional[str] = None
+
+
+class SyncSchema(Schema):
+    contatos: List[ContatoSyncSchema]
+    companies: List[CompanySyncSchema]
+    processos: List[ProcessoSyncSchema]
+    produtos: List[ProdutoSyncSchema]
+    deleted: List[TombstoneSchema]
+    next: Optional[str] = None
+    watermark: datetime
+
+
+class BulkItemResult(Schema):
+    index: int
+    status: int
+    id: Optional[str] = None
+    message: str
+
+
+class BulkDeleteSchema(Schema):
+    ids: List[str]
+
+
+class BulkResultSchema(Schema):
+    results: List[BulkItemResult]
 
 
 response_get_processos = responses_dict.copy()
@@ -183,3 +544,19 @@ response_get_contatos = responses_dict.copy()
 response_get_contatos.update({200: ContatosSchema})
 response_get_produtos = responses_dict.copy()
 response_get_produtos.update({200: ProdutosSchema})
+response_bulk = responses_dict.copy()
+response_bulk.update({200: BulkResultSchema})
+response_lookup = responses_dict.copy()
+response_lookup.update({200: CompanyLookupSchema})
+response_processo_stats = responses_dict.copy()
+response_processo_stats.update({200: ProcessoStatsSchema})
+response_analytics = responses_dict.copy()
+response_analytics.update({200: DistributionsSchema})
+response_stock = responses_dict.copy()
+response_stock.update({200: StockSchema, 409: Default409})
+response_stocks = responses_dict.copy()
+response_stocks.update({200: StocksSchema, 409: Default409})
+response_sync = responses_dict.copy()
+response_sync.update({200: SyncSchema, 410: Default410})
+response_search = responses_dict.copy()
+response_search.update({200: SearchResultsSchema})
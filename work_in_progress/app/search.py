@@ -0,0 +1,86 @@
+from typing import Any, Dict, List, Optional, Tuple
+
+from django.db import connection
+
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.app.models import SystemUser, parse_id
+from work_in_progress.app.pagination import decode_cursor, encode_cursor
+
+# Text search configuration of the search_vector triggers of migration 0017.
+SEARCH_CONFIG = "simple"
+
+SEARCH_ORDERING = ("-rank", "type", "id")
+
+# Every branch selects (type, id, rank, title, detail) for the rows whose
+# search_vector matches the query, optionally restricted to one user.
+_BRANCHES = {
+    "contato": (
+        "SELECT 'contato' AS type, contato_id AS id, "
+        "ts_rank(search_vector, query) AS rank, "
+        "nome AS title, email_responsavel AS detail "
+        "FROM app_contato, query WHERE search_vector @@ query {scope}"
+    ),
+    "processo": (
+        "SELECT 'processo' AS type, processo_id AS id, "
+        "ts_rank(search_vector, query) AS rank, "
+        "cliente AS title, numero_processo AS detail "
+        "FROM app_processo, query WHERE search_vector @@ query {scope}"
+    ),
+}
+
+
+def search(
+    user: SystemUser, text: str, limit: int, after: Optional[str] = None
+) -> Tuple[List[Dict[str, Any]], Optional[str]]:
+    """
+    Return one page of the contatos and processos matching a web search
+    style query, best ranked first, and the cursor of the next page.
+
+    The rows are matched through the GIN indexes of the search_vector
+    columns; superusers search the rows of every user, like the list
+    endpoints.
+
+    Raises:
+        HTTPException: If the cursor is malformed.
+    """
+    params: Dict[str, Any] = {
+        "config": SEARCH_CONFIG,
+        "text": text,
+        "user": user.pk,
+        "limit": limit + 1,
+    }
+    scope = "" if user.is_superuser else "AND criado_por_id = %(user)s"
+    branches = " UNION ALL ".join(
+        branch.format(scope=scope) for branch in _BRANCHES.values()
+    )
+    where = ""
+    if after:
+        rank, kind, key = decode_cursor(SEARCH_ORDERING, after)
+        try:
+            params.update(rank=float(rank), type=kind, id=parse_id(key))
+        except ValueError:
+            raise HTTPException(400, "Cursor inválido")
+        if params["id"] is None:
+            raise HTTPException(400, "Cursor inválido")
+        where = (
+            "WHERE rank < %(rank)s::real OR (rank = %(rank)s::real "
+            "AND (type, id) > (%(type)s, %(id)s))"
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "WITH query AS "
+            "(SELECT websearch_to_tsquery(%(config)s, %(text)s) AS query) "
+            f"SELECT type, id, rank, title, detail FROM ({branches}) AS results "
+            f"{where} ORDER BY rank DESC, type, id LIMIT %(limit)s",
+            params,
+        )
+        rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        kind, pk, rank = rows[-1][:3]
+        next_cursor = encode_cursor(SEARCH_ORDERING, [rank, kind, pk.hex])
+    return [
+        {"type": kind, "id": pk.hex, "rank": rank, "title": title, "detail": detail}
+        for kind, pk, rank, title, detail in rows
+    ], next_cursor
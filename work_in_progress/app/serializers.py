@@ -0,0 +1,93 @@
+from typing import Any, Callable, Dict, Iterable, List, Optional, Sequence, Tuple, Type
+
+from django.db.models import QuerySet
+from ninja import Schema
+
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.app.schemas import HexUUID
+
+# Conversions pydantic applies to the values the database driver returns,
+# e.g. Produto.preco comes back as a Decimal but ProdutoSchema.preco is a float.
+_COERCERS: Dict[Any, Callable[[Any], Any]] = {
+    float: float,
+    int: int,
+    bool: bool,
+    HexUUID: lambda key: key.hex,
+}
+
+
+class RowSerializer:
+    """
+    Serialize rows of a queryset the same way as schema.from_orm(obj).dict(),
+    without instantiating models or schemas.
+
+    Only the schema fields, or the given subset of them, are selected with
+    values_list(), and the values are coerced to the schema types.
+    """
+
+    def __init__(
+        self, schema: Type[Schema], fields: Optional[Sequence[str]] = None
+    ) -> None:
+        self.schema = schema
+        self.fields: Tuple[str, ...] = tuple(fields or schema.__fields__)
+        self._coercers: List[Tuple[int, Callable[[Any], Any]]] = [
+            (index, _COERCERS[schema.__fields__[name].outer_type_])
+            for index, name in enumerate(self.fields)
+            if schema.__fields__[name].outer_type_ in _COERCERS
+        ]
+
+    def values(self, queryset: QuerySet, extra: Sequence[str] = ()) -> QuerySet:
+        """
+        Select the schema fields, plus any extra ones, as tuples.
+        """
+        return queryset.values_list(*self.fields, *extra)
+
+    def row(self, values: Sequence[Any]) -> Dict[str, Any]:
+        converted = list(values[: len(self.fields)])
+        for index, coerce in self._coercers:
+            if converted[index] is not None:
+                converted[index] = coerce(converted[index])
+        return dict(zip(self.fields, converted))
+
+    def extra(self, values: Sequence[Any]) -> Sequence[Any]:
+        """
+        Return the values selected on top of the schema fields.
+        """
+        return values[len(self.fields) :]
+
+    def rows(self, rows: Iterable[Sequence[Any]]) -> List[Dict[str, Any]]:
+        return [self.row(values) for values in rows]
+
+    def first(self, queryset: QuerySet) -> Optional[Dict[str, Any]]:
+        values = self.values(queryset).first()
+        return self.row(values) if values is not None else None
+
+
+serializers: Dict[Tuple[Type[Schema], Optional[Tuple[str, ...]]], RowSerializer] = {}
+
+
+def parse_fields(
+    schema: Type[Schema], fields: Optional[str]
+) -> Optional[Tuple[str, ...]]:
+    """
+    Parse a comma separated ?fields= value into schema fields, in schema order.
+
+    Raises:
+        HTTPException: If a field is not part of the schema.
+    """
+    if not fields:
+        return None
+    requested = {name.strip() for name in fields.split(",") if name.strip()}
+    unknown = requested - set(schema.__fields__)
+    if unknown:
+        raise HTTPException(400, f"Campos inválidos: {', '.join(sorted(unknown))}")
+    return tuple(name for name in schema.__fields__ if name in requested) or None
+
+
+def get_serializer(
+    schema: Type[Schema], fields: Optional[Tuple[str, ...]] = None
+) -> RowSerializer:
+    serializer = serializers.get((schema, fields))
+    if serializer is None:
+        serializer = serializers[(schema, fields)] = RowSerializer(schema, fields)
+    return serializer
@@ -0,0 +1,86 @@
+from typing import Any, Sequence, Type
+
+from django.db.models import Model
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import Signal, receiver
+
+from work_in_progress.app.cache import list_flights, response_cache, user_cache
+from work_in_progress.app.models import Company, Contato, Processo, Produto, SystemUser
+from work_in_progress.app.tokens import revoke_tokens
+
+# Sent by the writes made in SQL or with bulk_create(), which send no
+# post_save or post_delete, with the model as sender, the owners of the
+# written rows as owners and deleted=True for deletions.
+rows_changed = Signal()
+
+CACHED_MODELS = (Contato, Company, Processo, Produto)
+
+# Models whose rows the database deletes with ON DELETE CASCADE when a row of
+# the key model is deleted, without sending any signal.
+CASCADES = {Contato: (Company,)}
+
+# Fields of SystemUser whose change revokes the tokens of the user.
+TOKEN_FIELDS = ("password", "is_superuser", "is_active")
+
+
+# The revocation receivers are connected before invalidate_user_cache, so the
+# cached user is dropped after its secret is rotated.
+@receiver(pre_save, sender=SystemUser)
+def check_token_fields(
+    sender: Any, instance: SystemUser, raw: bool = False, **kwargs: Any
+) -> None:
+    if raw or instance._state.adding:
+        return
+    stored = sender.objects.filter(pk=instance.pk).values(*TOKEN_FIELDS, "secret")
+    for row in stored:
+        if any(row[field] != getattr(instance, field) for field in TOKEN_FIELDS):
+            instance._revoked_secret = row["secret"]  # type: ignore[attr-defined]
+
+
+@receiver(post_save, sender=SystemUser)
+def revoke_changed_user_tokens(
+    sender: Any, instance: SystemUser, **kwargs: Any
+) -> None:
+    secret = instance.__dict__.pop("_revoked_secret", None)
+    if secret is not None:
+        revoke_tokens(instance, secret)
+
+
+@receiver(post_delete, sender=SystemUser)
+def revoke_deleted_user_tokens(
+    sender: Any, instance: SystemUser, **kwargs: Any
+) -> None:
+    revoke_tokens(instance)
+
+
+@receiver(post_save, sender=SystemUser)
+@receiver(post_delete, sender=SystemUser)
+def invalidate_user_cache(sender: Any, instance: SystemUser, **kwargs: Any) -> None:
+    user_cache.invalidate(instance.pk)
+
+
+@receiver(rows_changed)
+def invalidate_responses(
+    sender: Type[Model], owners: Sequence[Any], deleted: bool = False, **kwargs: Any
+) -> None:
+    models = [sender, *CASCADES.get(sender, ())] if deleted else [sender]
+    for model in models:
+        response_cache.invalidate(model, owners)
+        list_flights.invalidate(model, owners)
+
+
+def invalidate_saved_responses(
+    sender: Type[Model], instance: Any, **kwargs: Any
+) -> None:
+    invalidate_responses(sender, [instance.criado_por_id])
+
+
+def invalidate_deleted_responses(
+    sender: Type[Model], instance: Any, **kwargs: Any
+) -> None:
+    invalidate_responses(sender, [instance.criado_por_id], deleted=True)
+
+
+for model in CACHED_MODELS:
+    post_save.connect(invalidate_saved_responses, sender=model)
+    post_delete.connect(invalidate_deleted_responses, sender=model)
@@ -0,0 +1,96 @@
+from typing import Counter, Dict, List, Tuple
+from uuid import UUID
+
+from django.db import connection, transaction
+from django.utils import timezone
+
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.app.models import Produto, SystemUser, parse_id
+from work_in_progress.app.schemas import StockItemSchema
+from work_in_progress.app.signals import rows_changed
+
+
+def adjust_stock(user: SystemUser, produto_id: str, delta: int) -> int:
+    """
+    Add delta to the quantidade of one of the user's produtos with a single
+    conditional UPDATE, so concurrent adjustments of the same produto are
+    serialized by its row lock and none of them is lost.
+
+    The update is the quantidade = quantidade + delta of an F() expression,
+    written in SQL for its RETURNING clause, which QuerySet.update() lacks.
+
+    Returns:
+        The new quantidade.
+
+    Raises:
+        HTTPException: If the produto does not exist or the quantidade would
+            become negative.
+    """
+    key = parse_id(produto_id)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'UPDATE "app_produto" SET "quantidade" = "quantidade" + %s, '
+            '"atualizado_em" = %s WHERE "id_produto" = %s AND "criado_por_id" = %s '
+            'AND "quantidade" + %s >= 0 RETURNING "quantidade"',
+            [delta, timezone.now(), key, user.pk, delta],
+        )
+        row = cursor.fetchone()
+    if row is not None:
+        rows_changed.send(sender=Produto, owners=[user.pk])
+        return row[0]
+    if key is None or not Produto.objects.filter(pk=key, criado_por=user).exists():
+        raise HTTPException(404, "Produto não encontrado")
+    raise HTTPException(409, "Estoque insuficiente")
+
+
+@transaction.atomic
+def reserve_stock(user: SystemUser, items: List[StockItemSchema]) -> Dict[UUID, int]:
+    """
+    Apply the deltas of several produtos all or nothing, in one transaction.
+
+    The produtos are locked with SELECT ... FOR UPDATE in primary key order
+    before they are updated, so concurrent reservations touching the same
+    produtos wait for each other instead of deadlocking. Deltas of a produto
+    sent more than once are summed. An empty reservation changes nothing.
+
+    Returns:
+        The new quantidade of every produto, by primary key.
+
+    Raises:
+        HTTPException: If a produto does not exist or its quantidade would
+            become negative; nothing is updated then.
+    """
+    deltas: Counter[UUID] = Counter()
+    for item in items:
+        key = parse_id(item.id_produto)
+        if key is None:
+            raise HTTPException(404, f"Produto não encontrado: {item.id_produto}")
+        deltas[key] += item.delta
+    if not deltas:
+        return {}
+    keys = sorted(deltas)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT "id_produto", "quantidade" FROM "app_produto" '
+            'WHERE "id_produto" = ANY(%s) AND "criado_por_id" = %s '
+            'ORDER BY "id_produto" FOR UPDATE',
+            [keys, user.pk],
+        )
+        stock: Dict[UUID, int] = dict(cursor.fetchall())
+        missing = [key.hex for key in keys if key not in stock]
+        if missing:
+            raise HTTPException(404, f"Produto não encontrado: {', '.join(missing)}")
+        short = [key.hex for key in keys if stock[key] + deltas[key] < 0]
+        if short:
+            raise HTTPException(409, f"Estoque insuficiente: {', '.join(short)}")
+        values: List[Tuple[UUID, int]] = [(key, deltas[key]) for key in keys]
+        placeholders = ", ".join(["(%s::uuid, %s::integer)"] * len(values))
+        cursor.execute(
+            'UPDATE "app_produto" SET "quantidade" = "quantidade" + delta.value, '
+            f'"atualizado_em" = %s FROM (VALUES {placeholders}) AS delta (key, value) '
+            'WHERE "id_produto" = delta.key RETURNING "id_produto", "quantidade"',
+            [timezone.now(), *(value for pair in values for value in pair)],
+        )
+        quantidades: Dict[UUID, int] = dict(cursor.fetchall())
+    rows_changed.send(sender=Produto, owners=[user.pk])
+    return quantidades
@@ -0,0 +1,62 @@
+from typing import Iterator
+
+from django.db.models import QuerySet
+from django.http import StreamingHttpResponse
+from requests import Request
+
+from work_in_progress.app.renderers import dumps
+from work_in_progress.app.serializers import RowSerializer
+from work_in_progress.settings import STREAM_CHUNK_SIZE
+
+NDJSON_MEDIA_TYPE = "application/x-ndjson"
+JSON_MEDIA_TYPE = "application/json; charset=utf-8"
+
+
+def wants_stream(request: Request, stream: bool) -> bool:
+    return stream or NDJSON_MEDIA_TYPE in request.headers.get("Accept", "")
+
+
+def stream_media_type(request: Request) -> str:
+    if NDJSON_MEDIA_TYPE in request.headers.get("Accept", ""):
+        return NDJSON_MEDIA_TYPE
+    return JSON_MEDIA_TYPE
+
+
+def _ndjson_rows(queryset: QuerySet, serializer: RowSerializer) -> Iterator[bytes]:
+    rows = serializer.values(queryset).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    for values in rows:
+        yield dumps(serializer.row(values)) + b"\n"
+
+
+def _json_rows(
+    queryset: QuerySet, serializer: RowSerializer, key: str
+) -> Iterator[bytes]:
+    yield b'{"' + key.encode() + b'":['
+    separator = b""
+    rows = serializer.values(queryset).iterator(chunk_size=STREAM_CHUNK_SIZE)
+    for values in rows:
+        yield separator + dumps(serializer.row(values))
+        separator = b","
+    yield b"]}"
+
+
+def stream_rows(
+    request: Request, queryset: QuerySet, serializer: RowSerializer, key: str
+) -> StreamingHttpResponse:
+    """
+    Stream every row of the queryset without materializing the result.
+
+    Rows are read through a server-side cursor in chunks of STREAM_CHUNK_SIZE
+    and written as NDJSON when the client accepts it, otherwise as a single
+    JSON document shaped like the paginated response, under the given key.
+
+    Through asgi.py the response is iterated in a db_executor thread by
+    concurrency.ASGIHandler, since Django 3.1 would iterate it on the event
+    loop.
+    """
+    media_type = stream_media_type(request)
+    if media_type == NDJSON_MEDIA_TYPE:
+        rows = _ndjson_rows(queryset, serializer)
+    else:
+        rows = _json_rows(queryset, serializer, key)
+    return StreamingHttpResponse(rows, content_type=media_type)
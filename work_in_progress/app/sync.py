@@ -0,0 +1,168 @@
+from datetime import datetime, timedelta
+from typing import Any, Dict, List, Optional, Tuple, Type
+
+from django.db import connection
+from django.db.models import Model
+from django.utils import timezone
+from django.utils.dateparse import parse_datetime
+from ninja import Schema
+
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.app.models import (
+    Company,
+    Contato,
+    Processo,
+    Produto,
+    SystemUser,
+    parse_id,
+)
+from work_in_progress.app.pagination import decode_cursor, encode_cursor
+from work_in_progress.app.schemas import (
+    CompanySyncSchema,
+    ContatoSyncSchema,
+    ProcessoSyncSchema,
+    ProdutoSyncSchema,
+)
+from work_in_progress.app.serializers import get_serializer
+from work_in_progress.settings import (
+    SYNC_TOMBSTONE_RETENTION_DAYS,
+    SYNC_WATERMARK_LAG_SECONDS,
+)
+
+# Type of every synced model, with its response key and schema. The types
+# must match the tombstone triggers of migration 0020.
+SYNC_MODELS: Dict[str, Tuple[Type[Model], str, Type[Schema]]] = {
+    "contato": (Contato, "contatos", ContatoSyncSchema),
+    "company": (Company, "companies", CompanySyncSchema),
+    "processo": (Processo, "processos", ProcessoSyncSchema),
+    "produto": (Produto, "produtos", ProdutoSyncSchema),
+}
+
+# The changes are paged by (atualizado_em, type, id); the cursor also carries
+# the watermark of the first page.
+SYNC_CURSOR = ("atualizado_em", "type", "id", "watermark")
+
+_CHANGES = (
+    "SELECT atualizado_em, '{type}' AS type, {pk} AS id, false AS deleted "
+    "FROM {table} WHERE atualizado_em > %(since)s {scope}"
+)
+
+_DELETIONS = (
+    "SELECT deletado_em, tipo, row_id, true FROM app_tombstone "
+    "WHERE deletado_em > %(since)s {scope}"
+)
+
+
+def _parse_cursor(after: str) -> Dict[str, Any]:
+    atualizado_em, kind, key, watermark = decode_cursor(SYNC_CURSOR, after)
+    params = {
+        "atualizado_em": parse_datetime(atualizado_em),
+        "type": kind,
+        "id": parse_id(key),
+        "watermark": parse_datetime(watermark),
+    }
+    if None in params.values():
+        raise HTTPException(400, "Cursor inválido")
+    return params
+
+
+def _rows(model: Type[Model], schema: Type[Schema], keys: List[Any]) -> List[Any]:
+    """
+    Serialize the rows with the given primary keys that still exist, in
+    atualizado_em order.
+    """
+    if not keys:
+        return []
+    serializer = get_serializer(schema)
+    queryset = model._default_manager.filter(pk__in=keys).order_by(
+        "atualizado_em", "pk"
+    )
+    return serializer.rows(serializer.values(queryset))
+
+
+def sync(
+    user: SystemUser, since: Optional[datetime], limit: int, after: Optional[str]
+) -> Dict[str, Any]:
+    """
+    Return one page of the rows created, updated or deleted after the since
+    watermark, oldest change first.
+
+    Every table is read through its (criado_por, atualizado_em) index and
+    deletions through the tombstones, so the cost follows the number of
+    changes and not the size of the tables. A row changed again while the
+    pages are read moves to a later page and may be sent twice.
+
+    The watermark to send as since on the next sync trails the start of the
+    sync by SYNC_WATERMARK_LAG_SECONDS: changes of transactions committed
+    after a page was read are then sent again next time instead of missed.
+
+    Raises:
+        HTTPException: If the cursor is malformed, or if the watermark is older
+            than the kept tombstones and the client must sync from scratch.
+    """
+    now = timezone.now()
+    if since is not None and since < now - timedelta(
+        days=SYNC_TOMBSTONE_RETENTION_DAYS
+    ):
+        raise HTTPException(410, "Watermark expirado, sincronize sem since")
+    params: Dict[str, Any] = {
+        "since": since or datetime.min.replace(tzinfo=timezone.utc),
+        "user": user.pk,
+        "limit": limit + 1,
+    }
+    scope = "" if user.is_superuser else "AND criado_por_id = %(user)s"
+    branches = [
+        _CHANGES.format(
+            type=kind,
+            pk=connection.ops.quote_name(model._meta.pk.column),
+            table=connection.ops.quote_name(model._meta.db_table),
+            scope=scope,
+        )
+        for kind, (model, _, _) in SYNC_MODELS.items()
+    ]
+    branches.append(_DELETIONS.format(scope=scope))
+    where = ""
+    if after:
+        params.update(_parse_cursor(after))
+        watermark = params["watermark"]
+        where = (
+            "WHERE atualizado_em >= %(atualizado_em)s AND "
+            "(atualizado_em, type, id) > (%(atualizado_em)s, %(type)s, %(id)s)"
+        )
+    else:
+        watermark = max(
+            now - timedelta(seconds=SYNC_WATERMARK_LAG_SECONDS), params["since"]
+        )
+    with connection.cursor() as cursor:
+        cursor.execute(
+            "SELECT atualizado_em, type, id, deleted FROM "
+            f"({' UNION ALL '.join(branches)}) AS changes {where} "
+            "ORDER BY atualizado_em, type, id LIMIT %(limit)s",
+            params,
+        )
+        rows = cursor.fetchall()
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        atualizado_em, kind, key, _ = rows[-1]
+        next_cursor = encode_cursor(
+            SYNC_CURSOR,
+            [atualizado_em.isoformat(), kind, key.hex, watermark.isoformat()],
+        )
+    page: Dict[str, Any] = {
+        "deleted": [
+            {"type": kind, "id": key.hex, "deletado_em": atualizado_em}
+            for atualizado_em, kind, key, deleted in rows
+            if deleted
+        ],
+        "next": next_cursor,
+        "watermark": watermark,
+    }
+    for kind, (model, response_key, schema) in SYNC_MODELS.items():
+        keys = [
+            key
+            for _, row_kind, key, deleted in rows
+            if row_kind == kind and not deleted
+        ]
+        page[response_key] = _rows(model, schema, keys)
+    return page
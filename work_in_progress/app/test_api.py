@@ -0,0 +1,1834 @@
+import asyncio
+import io
+import json
+import os
+import tempfile
+import threading
+from datetime import datetime
+from datetime import timezone as dt_timezone
+from typing import Any, Callable, Dict, List
+from unittest import mock
+
+import jwt
+from asgiref.sync import async_to_sync
+from django.contrib.auth.hashers import check_password, make_password
+from django.core.management import call_command
+from django.db import connection, connections
+from django.test import AsyncClient, TestCase, TransactionTestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+
+from work_in_progress.app import api, concurrency, metrics, passwords, stock
+from work_in_progress.app.cache import ResponseCache, response_cache, user_cache
+from work_in_progress.app.models import (
+    Company,
+    Contato,
+    Processo,
+    ProcessoRollup,
+    Produto,
+    RevokedToken,
+    SystemUser,
+)
+from work_in_progress.app.schemas import StockItemSchema
+from work_in_progress.app.tokens import create_token, revocations
+from work_in_progress.settings import ALGORITHM, SECRET_KEY, STREAM_READ_AHEAD
+
+
+def auth_headers(user: SystemUser) -> Dict[str, str]:
+    token = jwt.encode({"sub": user.id}, SECRET_KEY, algorithm=ALGORITHM)
+    return {"HTTP_AUTHORIZATION": f"Bearer Bearer {token}"}
+
+
+def processo_data(**kwargs: Any) -> Dict[str, Any]:
+    data = {
+        "advogado_responsavel": "Test Lawyer",
+        "cliente": "Test Client",
+        "numero_processo": "123456789",
+        "vara": "Test Court",
+        "comarca": "Test District",
+        "estado": "Test State",
+        "status": "Test Status",
+        "fase": "Test Phase",
+        "valor_causa": 1000.0,
+        "valor_condenacao": 500.0,
+        "valor_honorario": 200.0,
+        "valor_preposto": 100.0,
+        "valor_total": 800.0,
+        "data_distribuicao": timezone.now(),
+        "ativo": True,
+    }
+    data.update(kwargs)
+    return data
+
+
+def contato_data(**kwargs: Any) -> Dict[str, Any]:
+    data = {
+        "nome": "Test Contato",
+        "endereco": "Rua teste",
+        "numero": "1",
+        "complemento": "",
+        "bairro": "Bairro teste",
+        "cidade": "Cidade teste",
+        "estado": "SP",
+        "cep": "12345678",
+        "telefone": "12345678",
+        "email_responsavel": "responsavel@teste.com",
+        "email_cobranca": "financeiro@teste.com",
+    }
+    data.update(kwargs)
+    return data
+
+
+class ApiTestCase(TestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        self.headers = auth_headers(self.user)
+
+
+class PaginationTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for i in range(5):
+            Processo.objects.create(
+                **processo_data(numero_processo=str(i)), criado_por=self.user
+            )
+
+    def test_pages_cover_every_row_once(self) -> None:
+        """
+        Test that following the next cursors returns every row exactly once.
+        """
+        seen = []
+        after = ""
+        while True:
+            response = self.client.get(
+                "/api/processos", {"limit": 2, "after": after}, **self.headers
+            )
+            self.assertEqual(response.status_code, 200)
+            body = response.json()
+            self.assertLessEqual(len(body["processos"]), 2)
+            seen += [p["numero_processo"] for p in body["processos"]]
+            if body["next"] is None:
+                break
+            after = body["next"]
+        self.assertEqual(sorted(seen), ["0", "1", "2", "3", "4"])
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_page_size_does_not_depend_on_depth(self) -> None:
+        """
+        Test that a deep page runs the same queries as the first one.
+        """
+        first = self.client.get("/api/processos", {"limit": 4}, **self.headers)
+        with self.assertNumQueries(1):
+            self.client.get("/api/processos", {"limit": 4}, **self.headers)
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/processos",
+                {"limit": 4, "after": first.json()["next"]},
+                **self.headers,
+            )
+        self.assertEqual(len(response.json()["processos"]), 1)
+        self.assertIsNone(response.json()["next"])
+
+    def test_other_users_rows_are_not_listed(self) -> None:
+        other = SystemUser.objects.create_user(username="other", password="x")
+        response = self.client.get("/api/processos", **auth_headers(other))
+        self.assertEqual(response.status_code, 204)
+
+    def test_invalid_cursor(self) -> None:
+        response = self.client.get(
+            "/api/processos", {"after": "not-a-cursor"}, **self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"message": "Cursor inválido"})
+
+    def test_limit_is_bounded(self) -> None:
+        response = self.client.get("/api/produtos", {"limit": 0}, **self.headers)
+        self.assertEqual(response.status_code, 422)
+        Produto.objects.create(
+            nome="Barril",
+            descricao="Barril 20 Litros",
+            preco=5.4,
+            quantidade=2,
+            criado_por=self.user,
+        )
+        response = self.client.get("/api/produtos", **self.headers)
+        self.assertEqual(len(response.json()["produtos"]), 1)
+
+
+class StreamingTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for i in range(3):
+            Processo.objects.create(
+                **processo_data(numero_processo=str(i)), criado_por=self.user
+            )
+
+    def test_ndjson_stream(self) -> None:
+        """
+        Test that NDJSON is streamed when the client accepts it.
+        """
+        response = self.client.get(
+            "/api/processos", HTTP_ACCEPT="application/x-ndjson", **self.headers
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Content-Type"], "application/x-ndjson")
+        lines = b"".join(response.streaming_content).decode().splitlines()
+        rows = [json.loads(line) for line in lines]
+        self.assertEqual([row["numero_processo"] for row in rows], ["0", "1", "2"])
+
+    def test_json_stream_matches_list_response(self) -> None:
+        """
+        Test that ?stream=1 returns the same rows as the paginated response.
+        """
+        listed = self.client.get("/api/processos", **self.headers).json()
+        response = self.client.get("/api/processos", {"stream": 1}, **self.headers)
+        self.assertTrue(response.streaming)
+        streamed = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(streamed["processos"], listed["processos"])
+
+    def test_stream_starts_after_cursor(self) -> None:
+        first = self.client.get("/api/processos", {"limit": 1}, **self.headers)
+        response = self.client.get(
+            "/api/processos",
+            {"stream": 1, "after": first.json()["next"]},
+            **self.headers,
+        )
+        streamed = json.loads(b"".join(response.streaming_content))
+        self.assertEqual(len(streamed["processos"]), 2)
+
+
+class SparseFieldsetTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        Processo.objects.create(**processo_data(), criado_por=self.user)
+        self.produto = Produto.objects.create(
+            nome="Barril",
+            descricao="Barril 20 Litros",
+            preco=5.4,
+            quantidade=2,
+            criado_por=self.user,
+        )
+
+    def test_list_selects_only_requested_fields(self) -> None:
+        """
+        Test that ?fields= narrows both the SQL and the rendered rows.
+        """
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(
+                "/api/processos",
+                {"fields": "numero_processo,status,valor_total"},
+                **self.headers,
+            )
+        self.assertEqual(
+            response.json()["processos"],
+            [
+                {
+                    "numero_processo": "123456789",
+                    "status": "Test Status",
+                    "valor_total": 800.0,
+                }
+            ],
+        )
+        sql = queries.captured_queries[-1]["sql"]
+        self.assertNotIn("advogado_responsavel", sql)
+        self.assertIn("valor_total", sql)
+
+    def test_detail_selects_only_requested_fields(self) -> None:
+        response = self.client.get(
+            f"/api/produtos/{self.produto.id_produto}",
+            {"fields": "preco,nome"},
+            **self.headers,
+        )
+        self.assertEqual(response.json(), {"nome": "Barril", "preco": 5.4})
+
+    def test_unknown_field(self) -> None:
+        response = self.client.get(
+            "/api/processos", {"fields": "status,criado_por"}, **self.headers
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {"message": "Campos inválidos: criado_por"})
+
+    def test_missing_detail(self) -> None:
+        response = self.client.get("/api/produtos/missing", **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+
+class FilterOrderTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        for i, status in enumerate(["ativo", "arquivado", "ativo", "ativo"]):
+            Processo.objects.create(
+                **processo_data(numero_processo=str(i), status=status, valor_total=i),
+                criado_por=self.user,
+            )
+
+    def test_filter(self) -> None:
+        response = self.client.get(
+            "/api/processos", {"status": "arquivado"}, **self.headers
+        )
+        numeros = [p["numero_processo"] for p in response.json()["processos"]]
+        self.assertEqual(numeros, ["1"])
+
+    def test_range_filter(self) -> None:
+        response = self.client.get(
+            "/api/processos", {"status": "ativo", "ativo": True}, **self.headers
+        )
+        self.assertEqual(len(response.json()["processos"]), 3)
+        response = self.client.get(
+            "/api/processos",
+            {"data_distribuicao_min": "2000-01-01T00:00:00Z", "status": "nenhum"},
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 204)
+
+    def test_order_by_with_cursor(self) -> None:
+        """
+        Test that pages follow the requested ordering.
+        """
+        params = {"order_by": "-valor_total", "limit": 3}
+        first = self.client.get("/api/processos", params, **self.headers).json()
+        second = self.client.get(
+            "/api/processos", {**params, "after": first["next"]}, **self.headers
+        ).json()
+        numeros = [p["numero_processo"] for p in first["processos"]]
+        numeros += [p["numero_processo"] for p in second["processos"]]
+        self.assertEqual(numeros, ["3", "2", "1", "0"])
+
+    def test_cursor_of_another_ordering(self) -> None:
+        first = self.client.get("/api/processos", {"limit": 1}, **self.headers).json()
+        response = self.client.get(
+            "/api/processos",
+            {"order_by": "valor_total", "after": first["next"]},
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_order_by_is_whitelisted(self) -> None:
+        response = self.client.get(
+            "/api/processos", {"order_by": "cliente"}, **self.headers
+        )
+        self.assertEqual(response.status_code, 422)
+
+
+class ConditionalGetTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.produto = Produto.objects.create(
+            nome="Barril",
+            descricao="Barril 20 Litros",
+            preco=5.4,
+            quantidade=2,
+            criado_por=self.user,
+        )
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_list_not_modified(self) -> None:
+        """
+        Test that an unchanged list is answered with a 304 running only the
+        page query.
+        """
+        response = self.client.get("/api/produtos", **self.headers)
+        etag = response["ETag"]
+        self.assertFalse(response.has_header("Last-Modified"))
+        self.assertEqual(response["Vary"], "Accept")
+        with self.assertNumQueries(1):
+            response = self.client.get(
+                "/api/produtos", HTTP_IF_NONE_MATCH=etag, **self.headers
+            )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response.content, b"")
+
+    def test_list_etag_changes_with_rows(self) -> None:
+        etag = self.client.get("/api/produtos", **self.headers)["ETag"]
+        self.produto.quantidade = 3
+        self.produto.save()
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=etag, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        etag = response["ETag"]
+        Produto.objects.create(
+            nome="Caneca",
+            descricao="Caneca",
+            preco=1,
+            quantidade=1,
+            criado_por=self.user,
+            criado_em=self.produto.criado_em,
+        )
+        Produto.objects.filter(nome="Caneca").update(
+            atualizado_em=self.produto.atualizado_em
+        )
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=etag, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_ignores_if_modified_since(self) -> None:
+        """
+        Test that a list that lost rows is not answered with a 304 to a
+        request with If-Modified-Since, as max(atualizado_em) is unchanged.
+        """
+        Produto.objects.create(
+            nome="Caneca",
+            descricao="Caneca",
+            preco=1,
+            quantidade=1,
+            criado_por=self.user,
+        )
+        since = http_date(self.produto.atualizado_em.timestamp() + 60)
+        Produto.objects.filter(nome="Caneca").delete()
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_MODIFIED_SINCE=since, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["produtos"]), 1)
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_list_etag_depends_on_representation(self) -> None:
+        """
+        Test that the page and the NDJSON stream of the same URL have their
+        own ETags and vary on Accept.
+        """
+        ndjson = {"HTTP_ACCEPT": "application/x-ndjson", **self.headers}
+        page_etag = self.client.get("/api/produtos", **self.headers)["ETag"]
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=page_etag, **ndjson
+        )
+        self.assertTrue(response.streaming)
+        self.assertEqual(response["Vary"], "Accept")
+        stream_etag = response["ETag"]
+        self.assertNotEqual(stream_etag, page_etag)
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=stream_etag, **ndjson
+        )
+        self.assertEqual(response.status_code, 304)
+        self.assertEqual(response["Vary"], "Accept")
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=stream_etag, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_list_etag_depends_on_params_and_user(self) -> None:
+        etag = self.client.get("/api/produtos", **self.headers)["ETag"]
+        response = self.client.get(
+            "/api/produtos", {"limit": 1}, HTTP_IF_NONE_MATCH=etag, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        other = SystemUser.objects.create_user(username="other", password="x")
+        other.is_superuser = True
+        other.save()
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=etag, **auth_headers(other)
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_detail_not_modified(self) -> None:
+        url = f"/api/produtos/{self.produto.id_produto}"
+        response = self.client.get(url, **self.headers)
+        response = self.client.get(
+            url, HTTP_IF_MODIFIED_SINCE=response["Last-Modified"], **self.headers
+        )
+        self.assertEqual(response.status_code, 304)
+        response = self.client.get(url, HTTP_IF_NONE_MATCH='"stale"', **self.headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()["nome"], "Barril")
+
+
+class BulkCreateTest(ApiTestCase):
+    def post(self, path: str, data: Any) -> Any:
+        return self.client.post(
+            path,
+            json.dumps(data, default=str),
+            content_type="application/json",
+            **self.headers,
+        )
+
+    def test_bulk_create_reports_every_item(self) -> None:
+        """
+        Test that duplicates against the database and inside the batch are
+        rejected while the remaining items are created.
+        """
+        Contato.objects.create(
+            **contato_data(email_responsavel="taken@teste.com"), criado_por=self.user
+        )
+        response = self.post(
+            "/api/contatos/bulk",
+            [
+                contato_data(email_responsavel="a@teste.com"),
+                contato_data(email_responsavel="taken@teste.com"),
+                contato_data(email_responsavel="a@teste.com"),
+                contato_data(email_responsavel="b@teste.com"),
+            ],
+        )
+        self.assertEqual(response.status_code, 200)
+        results = response.json()["results"]
+        self.assertEqual([r["index"] for r in results], [0, 1, 2, 3])
+        self.assertEqual([r["status"] for r in results], [200, 400, 400, 200])
+        self.assertEqual(Contato.objects.count(), 3)
+        self.assertTrue(Contato.objects.filter(contato_id=results[3]["id"]).exists())
+
+    def test_bulk_create_companies_checks_contato(self) -> None:
+        contato = Contato.objects.create(**contato_data(), criado_por=self.user)
+        other = SystemUser.objects.create_user(username="other", password="other")
+        foreign = Contato.objects.create(
+            **contato_data(email_responsavel="other@teste.com"), criado_por=other
+        )
+        company = {
+            "cnpj": "00000000000001",
+            "razao_social": "Razão social",
+            "nome_fantasia": "Nome fantasia",
+            "inscricao_estadual": "123456789",
+            "inscricao_municipal": "123456789",
+            "ativo": True,
+        }
+        response = self.post(
+            "/api/companies/bulk",
+            [
+                {**company, "contato_id": contato.contato_id.hex},
+                {**company, "cnpj": "00000000000002", "contato_id": foreign.pk.hex},
+            ],
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], [200, 404])
+        self.assertEqual(Company.objects.count(), 1)
+
+    def test_bulk_create_is_a_single_insert(self) -> None:
+        """
+        Test that the rows of a batch are written with a single INSERT.
+        """
+        data = [processo_data(numero_processo=str(i)) for i in range(50)]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.post("/api/processos/bulk", data)
+        self.assertEqual(response.status_code, 200)
+        inserts = [q for q in queries if q["sql"].startswith("INSERT")]
+        self.assertEqual(len(inserts), 1)
+        self.assertEqual(Processo.objects.count(), 50)
+
+    def test_bulk_size_limit(self) -> None:
+        produto = {
+            "nome": "Produto",
+            "descricao": "Barril",
+            "preco": 5.4,
+            "quantidade": 1,
+        }
+        with mock.patch("work_in_progress.app.api.BULK_MAX_ITEMS", 1):
+            response = self.post("/api/produtos/bulk", [produto, produto])
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Produto.objects.exists())
+
+
+class BulkUpsertTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.produto = Produto.objects.create(
+            nome="Produto",
+            descricao="Barril",
+            preco=5.4,
+            quantidade=1,
+            criado_por=self.user,
+        )
+        other = SystemUser.objects.create_user(username="other", password="other")
+        self.foreign = Produto.objects.create(
+            nome="Alheio",
+            descricao="Barril",
+            preco=5.4,
+            quantidade=1,
+            criado_por=other,
+        )
+
+    def test_upsert(self) -> None:
+        """
+        Test that a single statement inserts new produtos, updates the user's
+        produtos and leaves the produtos of other users untouched.
+        """
+        produto = {"nome": "Novo", "descricao": "Barril", "preco": 7.5, "quantidade": 3}
+        with CaptureQueriesContext(connection) as queries:
+            response = self.put(
+                [
+                    {**produto, "id_produto": self.produto.pk.hex},
+                    produto,
+                    {**produto, "id_produto": self.foreign.pk.hex},
+                ]
+            )
+        self.assertEqual(len([q for q in queries if "ON CONFLICT" in q["sql"]]), 1)
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], [200, 200, 404])
+        self.assertIn("atualizado", results[0]["message"])
+        self.assertIn("criado", results[1]["message"])
+        self.produto.refresh_from_db()
+        self.foreign.refresh_from_db()
+        self.assertEqual((self.produto.nome, self.produto.quantidade), ("Novo", 3))
+        self.assertEqual(self.foreign.nome, "Alheio")
+        self.assertEqual(Produto.objects.count(), 3)
+
+    def test_patch_changes_only_sent_fields(self) -> None:
+        before = self.produto.atualizado_em
+        response = self.client.patch(
+            "/api/produtos/bulk",
+            json.dumps(
+                [
+                    {"id_produto": self.produto.pk.hex, "quantidade": 10},
+                    {"id_produto": self.foreign.pk.hex, "quantidade": 10},
+                    {"id_produto": "missing"},
+                ]
+            ),
+            content_type="application/json",
+            **self.headers,
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], [200, 404, 400])
+        self.produto.refresh_from_db()
+        self.foreign.refresh_from_db()
+        self.assertEqual((self.produto.nome, self.produto.quantidade), ("Produto", 10))
+        self.assertGreater(self.produto.atualizado_em, before)
+        self.assertEqual(self.foreign.quantidade, 1)
+
+    def test_patch_processos(self) -> None:
+        processos = [
+            Processo.objects.create(
+                **processo_data(numero_processo=str(i)), criado_por=self.user
+            )
+            for i in range(3)
+        ]
+        data = [{"processo_id": p.pk.hex, "status": "arquivado"} for p in processos]
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.patch(
+                "/api/processos/bulk",
+                json.dumps(data),
+                content_type="application/json",
+                **self.headers,
+            )
+        self.assertEqual(len([q for q in queries if q["sql"].startswith("UPDATE")]), 1)
+        self.assertEqual([r["status"] for r in response.json()["results"]], [200] * 3)
+        self.assertEqual(
+            set(Processo.objects.values_list("status", "fase")),
+            {("arquivado", "Test Phase")},
+        )
+
+    def put(self, data: Any) -> Any:
+        return self.client.put(
+            "/api/produtos/bulk",
+            json.dumps(data),
+            content_type="application/json",
+            **self.headers,
+        )
+
+
+class PatchTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.produto = Produto.objects.create(
+            nome="Produto",
+            descricao="Barril",
+            preco=5.4,
+            quantidade=1,
+            criado_por=self.user,
+        )
+
+    def patch(self, path: str, data: Any) -> Any:
+        return self.client.patch(
+            path, json.dumps(data), content_type="application/json", **self.headers
+        )
+
+    def test_patch_is_a_single_update(self) -> None:
+        """
+        Test that a PATCH runs a single UPDATE touching only the sent columns.
+        """
+        path = f"/api/produtos/{self.produto.pk.hex}"
+        self.patch(path, {"quantidade": 2})
+        with CaptureQueriesContext(connection) as queries:
+            response = self.patch(path, {"quantidade": 3})
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("Produto de nome Produto", response.json()["message"])
+        self.assertEqual(len(queries), 1)
+        self.assertNotIn('"nome"', queries[0]["sql"].split("WHERE")[0])
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.nome, self.produto.quantidade), ("Produto", 3))
+
+    def test_patch_other_user(self) -> None:
+        other = SystemUser.objects.create_user(username="other", password="other")
+        response = self.client.patch(
+            f"/api/produtos/{self.produto.pk}",
+            json.dumps({"quantidade": 3}),
+            content_type="application/json",
+            **auth_headers(other),
+        )
+        self.assertEqual(response.status_code, 404)
+        self.produto.refresh_from_db()
+        self.assertEqual(self.produto.quantidade, 1)
+
+    def test_invalid_id(self) -> None:
+        response = self.patch("/api/produtos/not-a-uuid", {"quantidade": 3})
+        self.assertEqual(response.status_code, 404)
+        response = self.client.get("/api/produtos/not-a-uuid", **self.headers)
+        self.assertEqual(response.status_code, 404)
+
+    def test_empty_patch(self) -> None:
+        response = self.patch(f"/api/produtos/{self.produto.pk}", {})
+        self.assertEqual(response.status_code, 400)
+
+    def test_patch_null(self) -> None:
+        """
+        Test that an explicit null is refused instead of being ignored.
+        """
+        path = f"/api/produtos/{self.produto.pk}"
+        response = self.patch(path, {"nome": None, "quantidade": 3})
+        self.assertEqual(response.status_code, 422)
+        response = self.patch(
+            "/api/produtos/bulk",
+            [{"id_produto": self.produto.pk.hex, "quantidade": None}],
+        )
+        self.assertEqual(response.status_code, 422)
+        self.produto.refresh_from_db()
+        self.assertEqual((self.produto.nome, self.produto.quantidade), ("Produto", 1))
+
+    def test_patch_contato_email_conflict(self) -> None:
+        Contato.objects.create(
+            **contato_data(email_responsavel="taken@teste.com"), criado_por=self.user
+        )
+        contato = Contato.objects.create(**contato_data(), criado_por=self.user)
+        path = f"/api/contatos/{contato.pk}"
+        response = self.patch(path, {"email_responsavel": "taken@teste.com"})
+        self.assertEqual(response.status_code, 400)
+        response = self.patch(path, {"cidade": "Outra"})
+        self.assertEqual(response.status_code, 200)
+        contato.refresh_from_db()
+        self.assertEqual(
+            (contato.cidade, contato.email_responsavel),
+            ("Outra", "responsavel@teste.com"),
+        )
+
+    def test_put_missing_processo(self) -> None:
+        response = self.client.put(
+            "/api/processos/missing",
+            json.dumps(processo_data(), default=str),
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 404)
+
+
+class DeleteTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.contato = Contato.objects.create(**contato_data(), criado_por=self.user)
+        Company.objects.bulk_create(
+            Company(
+                cnpj=f"{i:014d}",
+                razao_social="Razão social",
+                nome_fantasia="Nome fantasia",
+                inscricao_estadual="123456789",
+                inscricao_municipal="123456789",
+                criado_por=self.user,
+                contato=self.contato,
+            )
+            for i in range(20)
+        )
+
+    def test_delete_cascades_in_the_database(self) -> None:
+        """
+        Test that deleting a contato is a single statement and that its
+        companies are removed by the database.
+        """
+        self.client.get("/api/contatos", **self.headers)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.delete(
+                f"/api/contatos/{self.contato.pk}", **self.headers
+            )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(queries), 1)
+        self.assertFalse(Contato.objects.exists())
+        self.assertFalse(Company.objects.exists())
+
+    def test_delete_other_user(self) -> None:
+        other = SystemUser.objects.create_user(username="other", password="other")
+        response = self.client.delete(
+            f"/api/contatos/{self.contato.pk}", **auth_headers(other)
+        )
+        self.assertEqual(response.status_code, 404)
+        self.assertTrue(Contato.objects.exists())
+
+    def test_bulk_delete(self) -> None:
+        ids = [pk.hex for pk in Company.objects.values_list("pk", flat=True)[:3]]
+        response = self.client.post(
+            "/api/companies/bulk/delete",
+            json.dumps({"ids": [*ids, ids[0], "missing"]}),
+            content_type="application/json",
+            **self.headers,
+        )
+        results = response.json()["results"]
+        self.assertEqual([r["status"] for r in results], [200, 200, 200, 400, 404])
+        self.assertEqual(Company.objects.count(), 17)
+
+
+class ConcurrentCreateTest(TransactionTestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        self.headers = auth_headers(self.user)
+
+    def post_in_parallel(self, path: str, data: Dict[str, Any]) -> List[int]:
+        workers = 8
+        barrier = threading.Barrier(workers)
+        statuses: List[int] = []
+
+        def post() -> None:
+            try:
+                barrier.wait()
+                response = self.client_class().post(
+                    path,
+                    json.dumps(data),
+                    content_type="application/json",
+                    **self.headers,
+                )
+                statuses.append(response.status_code)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=post) for _ in range(workers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        return statuses
+
+    def test_parallel_creates_do_not_duplicate(self) -> None:
+        """
+        Test that parallel creates with the same email_responsavel or cnpj
+        insert a single row and answer 400 to every other request.
+        """
+        statuses = self.post_in_parallel("/api/contatos", contato_data())
+        self.assertEqual(sorted(statuses), [200] + [400] * 7)
+        self.assertEqual(Contato.objects.count(), 1)
+
+        company = {
+            "cnpj": "00000000000001",
+            "razao_social": "Razão social",
+            "nome_fantasia": "Nome fantasia",
+            "inscricao_estadual": "123456789",
+            "inscricao_municipal": "123456789",
+            "ativo": True,
+            "contato_id": Contato.objects.get().pk.hex,
+        }
+        statuses = self.post_in_parallel("/api/companies", company)
+        self.assertEqual(sorted(statuses), [200] + [400] * 7)
+        self.assertEqual(Company.objects.count(), 1)
+
+    def test_same_email_for_another_user(self) -> None:
+        Contato.objects.create(**contato_data(), criado_por=self.user)
+        other = SystemUser.objects.create_user(username="other", password="other")
+        response = self.client.post(
+            "/api/contatos",
+            json.dumps(contato_data()),
+            content_type="application/json",
+            **auth_headers(other),
+        )
+        self.assertEqual(response.status_code, 200)
+
+
+class SearchTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        Processo.objects.create(
+            **processo_data(cliente="Maria Souza", comarca="Campinas"),
+            criado_por=self.user,
+        )
+        Processo.objects.create(
+            **processo_data(
+                cliente="João Lima", comarca="Campinas", numero_processo="2"
+            ),
+            criado_por=self.user,
+        )
+        Contato.objects.create(
+            **contato_data(nome="Maria Lima", cidade="Santos"), criado_por=self.user
+        )
+        other = SystemUser.objects.create_user(username="other", password="other")
+        Processo.objects.create(
+            **processo_data(cliente="Maria Alheia"), criado_por=other
+        )
+
+    def search(self, **params: Any) -> Any:
+        response = self.client.get("/api/search", params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_search_is_ranked_and_scoped(self) -> None:
+        """
+        Test that only the user's rows are returned and that a match in a
+        title field ranks above a match in a less important field.
+        """
+        results = self.search(q="maria")["results"]
+        self.assertEqual(
+            [(r["type"], r["title"]) for r in results],
+            [("contato", "Maria Lima"), ("processo", "Maria Souza")],
+        )
+        results = self.search(q="lima OR campinas")["results"]
+        self.assertEqual(results[0]["title"], "João Lima")
+        self.assertEqual(len(results), 3)
+
+    def test_vectors_follow_updates(self) -> None:
+        processo = Processo.objects.get(cliente="João Lima")
+        self.client.patch(
+            f"/api/processos/{processo.pk.hex}",
+            json.dumps({"cliente": "Pedro Alves"}),
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(self.search(q="joão")["results"], [])
+        self.assertEqual(len(self.search(q="pedro")["results"]), 1)
+
+    def test_pages_cover_every_result_once(self) -> None:
+        expected = [r["id"] for r in self.search(q="lima OR campinas")["results"]]
+        seen, after = [], ""
+        while True:
+            body = self.search(q="lima OR campinas", limit=1, after=after)
+            seen += [r["id"] for r in body["results"]]
+            if body["next"] is None:
+                break
+            after = body["next"]
+        self.assertEqual(seen, expected)
+
+
+class CompanyLookupTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        contato = Contato.objects.create(**contato_data(), criado_por=self.user)
+        for cnpj, razao_social, nome_fantasia in [
+            ("12.345.678/0001-90", "Padaria Pão Quente Ltda", "Pão Quente"),
+            ("98765432000110", "Mercado Boa Vista Ltda", "Boa Vista"),
+        ]:
+            Company.objects.create(
+                cnpj=cnpj,
+                razao_social=razao_social,
+                nome_fantasia=nome_fantasia,
+                inscricao_estadual="123456789",
+                inscricao_municipal="123456789",
+                contato=contato,
+                criado_por=self.user,
+            )
+
+    def lookup(self, **params: Any) -> List[Dict[str, Any]]:
+        response = self.client.get("/api/companies/lookup", params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["companies"]
+
+    def test_cnpj_with_or_without_punctuation(self) -> None:
+        for q in ["12345678000190", "12.345.678/0001-90", "12345678/0001-90"]:
+            with self.subTest(q=q):
+                [company] = self.lookup(q=q)
+                self.assertEqual(company["nome_fantasia"], "Pão Quente")
+                self.assertEqual(company["similarity"], 1.0)
+        [company] = self.lookup(q="98.765")
+        self.assertEqual(company["nome_fantasia"], "Boa Vista")
+
+    def test_misspelled_name(self) -> None:
+        companies = self.lookup(q="mercado boavista")
+        self.assertEqual([c["nome_fantasia"] for c in companies], ["Boa Vista"])
+        self.assertEqual(self.lookup(q="mercado boavista", threshold=0.9), [])
+        self.assertEqual(self.lookup(q="pao qente")[0]["nome_fantasia"], "Pão Quente")
+
+    def test_other_users_companies_are_not_found(self) -> None:
+        other = SystemUser.objects.create_user(username="other", password="x")
+        response = self.client.get(
+            "/api/companies/lookup", {"q": "12345678000190"}, **auth_headers(other)
+        )
+        self.assertEqual(response.json(), {"companies": []})
+
+    def test_cnpj_is_unique_by_digits(self) -> None:
+        data = {
+            "cnpj": "12345678000190",
+            "razao_social": "Outra",
+            "nome_fantasia": "Outra",
+            "inscricao_estadual": "1",
+            "inscricao_municipal": "1",
+            "ativo": True,
+            "contato_id": Contato.objects.get().pk.hex,
+        }
+        response = self.client.post(
+            "/api/companies",
+            json.dumps(data),
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.status_code, 400)
+        response = self.client.post(
+            "/api/companies/bulk",
+            json.dumps([data]),
+            content_type="application/json",
+            **self.headers,
+        )
+        self.assertEqual(response.json()["results"][0]["status"], 400)
+
+
+class ProcessoStatsTest(ApiTestCase):
+    def stats(self, **params: Any) -> List[Dict[str, Any]]:
+        response = self.client.get("/api/processos/stats", params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()["stats"]
+
+    def send(self, method: str, path: str, data: Any) -> Any:
+        return self.client.generic(
+            method,
+            f"/api/processos/{path}",
+            json.dumps(data, default=str),
+            content_type="application/json",
+            **self.headers,
+        )
+
+    def test_rollup_follows_every_write(self) -> None:
+        january = datetime(2024, 1, 10, tzinfo=dt_timezone.utc)
+        self.send(
+            "POST",
+            "bulk",
+            [
+                processo_data(numero_processo=str(i), data_distribuicao=january)
+                for i in range(3)
+            ],
+        )
+        [row] = self.stats()
+        self.assertEqual(row["mes"], "2024-01-01")
+        self.assertEqual((row["quantidade"], row["valor_total"]), (3, 2400.0))
+
+        processo = Processo.objects.get(numero_processo="0")
+        self.send(
+            "PATCH", processo.pk.hex, {"status": "Arquivado", "valor_total": 100.5}
+        )
+        stats = {row["status"]: row for row in self.stats()}
+        self.assertEqual(stats["Test Status"]["quantidade"], 2)
+        self.assertEqual(stats["Test Status"]["valor_total"], 1600.0)
+        self.assertEqual(stats["Arquivado"]["valor_total"], 100.5)
+
+        self.client.delete(f"/api/processos/{processo.pk.hex}", **self.headers)
+        self.assertEqual([row["status"] for row in self.stats()], ["Test Status"])
+        self.assertEqual(self.stats(status="Arquivado"), [])
+
+        before = self.stats()
+        call_command("rebuild_processo_rollup", stdout=io.StringIO())
+        self.assertEqual(self.stats(), before)
+
+    def test_rollup_is_not_written_by_other_columns(self) -> None:
+        """
+        Test that updates leaving the rolled-up columns unchanged don't write
+        the rollup rows, and that the changed processos of a statement still
+        update it.
+        """
+        for i in range(2):
+            Processo.objects.create(
+                **processo_data(numero_processo=str(i)), criado_por=self.user
+            )
+
+        def versions() -> List[Any]:
+            with connection.cursor() as cursor:
+                cursor.execute("SELECT ctid::text FROM app_processorollup")
+                return cursor.fetchall()
+
+        before = versions()
+        processo = Processo.objects.get(numero_processo="0")
+        self.send("PATCH", processo.pk.hex, {"advogado_responsavel": "Outro"})
+        Processo.objects.update(valor_total=800.0, cliente="Outro")
+        self.assertEqual(versions(), before)
+
+        Processo.objects.filter(numero_processo="1").update(valor_total=1.5)
+        self.assertNotEqual(versions(), before)
+        [row] = self.stats()
+        self.assertEqual((row["quantidade"], row["valor_total"]), (2, 801.5))
+
+    def test_stats_read_only_the_rollup(self) -> None:
+        Processo.objects.create(**processo_data(), criado_por=self.user)
+        other = SystemUser.objects.create_user(username="other", password="x")
+        Processo.objects.create(**processo_data(), criado_por=other)
+        with self.assertNumQueries(2):
+            [row] = self.stats()
+        self.assertEqual(row["quantidade"], 1)
+        other.delete()
+        self.assertEqual(ProcessoRollup.objects.count(), 1)
+
+
+class ProcessoAnalyticsTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        values = {"Campinas": [*range(1, 10), 1000], "Santos": [5, 7]}
+        Processo.objects.bulk_create(
+            Processo(
+                **processo_data(comarca=comarca, valor_causa=value),
+                criado_por=self.user,
+            )
+            for comarca, comarca_values in values.items()
+            for value in comarca_values
+        )
+
+    @mock.patch("work_in_progress.app.analytics.ANALYTICS_CHUNK_SIZE", 3)
+    def test_distributions_span_chunks(self) -> None:
+        response = self.client.get(
+            "/api/processos/analytics", {"bins": 4}, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+        campinas, santos = response.json()["groups"]
+        self.assertEqual((campinas["group"], campinas["count"]), ("Campinas", 10))
+        self.assertEqual(campinas["percentiles"]["p50"], 5.5)
+        self.assertEqual((campinas["min"], campinas["max"]), (1.0, 1000.0))
+        self.assertEqual(campinas["outliers"], 1)
+        self.assertEqual(campinas["histogram"]["counts"], [9, 0, 0, 1])
+        self.assertEqual(len(campinas["histogram"]["edges"]), 5)
+        self.assertEqual((santos["group"], santos["mean"]), ("Santos", 6.0))
+
+    @mock.patch("work_in_progress.app.analytics.ANALYTICS_MAX_ROWS", 11)
+    @mock.patch("work_in_progress.app.analytics.ANALYTICS_CHUNK_SIZE", 3)
+    def test_row_cap(self) -> None:
+        """
+        Test that an analysis over more than ANALYTICS_MAX_ROWS rows is refused
+        and that a filtered one under it is served.
+        """
+        response = self.client.get("/api/processos/analytics", **self.headers)
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("11", response.json()["message"])
+        response = self.client.get(
+            "/api/processos/analytics", {"comarca": "Campinas"}, **self.headers
+        )
+        self.assertEqual(response.status_code, 200)
+
+    def test_filters_and_validation(self) -> None:
+        response = self.client.get(
+            "/api/processos/analytics",
+            {"by": "advogado_responsavel", "comarca": "Santos"},
+            **self.headers,
+        )
+        [group] = response.json()["groups"]
+        self.assertEqual((group["group"], group["count"]), ("Test Lawyer", 2))
+        response = self.client.get(
+            "/api/processos/analytics", {"metric": "cliente"}, **self.headers
+        )
+        self.assertEqual(response.status_code, 422)
+
+
+def produto(user: SystemUser, quantidade: int, nome: str = "Barril") -> Produto:
+    return Produto.objects.create(
+        nome=nome,
+        descricao="Barril 20 Litros",
+        preco=5.4,
+        quantidade=quantidade,
+        criado_por=user,
+    )
+
+
+class StockTest(ApiTestCase):
+    def post(self, path: str, data: Any) -> Any:
+        return self.client.post(
+            f"/api/produtos/{path}",
+            json.dumps(data),
+            content_type="application/json",
+            **self.headers,
+        )
+
+    def test_adjust_stock(self) -> None:
+        barril = produto(self.user, 5)
+        with self.assertNumQueries(2):
+            response = self.post(f"{barril.pk.hex}/stock", {"delta": -3})
+        self.assertEqual(response.json()["quantidade"], 2)
+        response = self.post(f"{barril.pk.hex}/stock", {"delta": -3})
+        self.assertEqual(response.status_code, 409)
+        barril.refresh_from_db()
+        self.assertEqual(barril.quantidade, 2)
+        response = self.post("00000000000000000000000000000000/stock", {"delta": 1})
+        self.assertEqual(response.status_code, 404)
+
+    def test_reservation_is_all_or_nothing(self) -> None:
+        barril, copo = produto(self.user, 5), produto(self.user, 1, "Copo")
+        items = [
+            {"id_produto": barril.pk.hex, "delta": -2},
+            {"id_produto": copo.pk.hex, "delta": -1},
+            {"id_produto": barril.pk.hex, "delta": -2},
+        ]
+        response = self.post("stock", items)
+        self.assertEqual(
+            {p["id_produto"]: p["quantidade"] for p in response.json()["produtos"]},
+            {barril.pk.hex: 1, copo.pk.hex: 0},
+        )
+        response = self.post("stock", items)
+        self.assertEqual(response.status_code, 409)
+        self.assertIn(barril.pk.hex, response.json()["message"])
+        self.assertEqual(
+            sorted(Produto.objects.values_list("quantidade", flat=True)), [0, 1]
+        )
+
+    def test_empty_reservation(self) -> None:
+        response = self.post("stock", [])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {"produtos": []})
+
+
+class ConcurrentStockTest(TransactionTestCase):
+    def run_in_parallel(self, *funcs: Any) -> None:
+        barrier = threading.Barrier(len(funcs))
+        errors: List[Exception] = []
+
+        def run(func: Any) -> None:
+            try:
+                barrier.wait()
+                func()
+            except Exception as exc:
+                errors.append(exc)
+            finally:
+                connections.close_all()
+
+        threads = [threading.Thread(target=run, args=(func,)) for func in funcs]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(errors, [])
+
+    def test_no_lost_updates_on_a_hot_row(self) -> None:
+        user = SystemUser.objects.create_user(username="testuser", password="x")
+        barril = produto(user, 0)
+
+        def add() -> None:
+            for _ in range(25):
+                stock.adjust_stock(user, barril.pk.hex, 1)
+
+        self.run_in_parallel(*[add] * 8)
+        barril.refresh_from_db()
+        self.assertEqual(barril.quantidade, 200)
+
+    def test_crossed_reservations_do_not_deadlock(self) -> None:
+        user = SystemUser.objects.create_user(username="testuser", password="x")
+        barril, copo = produto(user, 200), produto(user, 200, "Copo")
+
+        def reserve(*produtos: Produto) -> Any:
+            items = [StockItemSchema(id_produto=p.pk.hex, delta=-1) for p in produtos]
+            return lambda: [stock.reserve_stock(user, items) for _ in range(25)]
+
+        self.run_in_parallel(*[reserve(barril, copo), reserve(copo, barril)] * 4)
+        self.assertEqual(
+            list(Produto.objects.values_list("quantidade", flat=True)), [0, 0]
+        )
+
+
+@mock.patch("work_in_progress.app.sync.SYNC_WATERMARK_LAG_SECONDS", 0)
+class SyncTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.contato = Contato.objects.create(**contato_data(), criado_por=self.user)
+        self.barril = produto(self.user, 5)
+        other = SystemUser.objects.create_user(username="other", password="x")
+        produto(other, 1)
+
+    def sync(self, **params: Any) -> Any:
+        response = self.client.get("/api/sync", params, **self.headers)
+        self.assertEqual(response.status_code, 200)
+        return response.json()
+
+    def test_only_changes_since_the_watermark_are_sent(self) -> None:
+        """
+        Test that a sync since a watermark returns only the rows changed or
+        deleted after it, and never the rows of other users.
+        """
+        body = self.sync()
+        self.assertEqual(
+            [c["contato_id"] for c in body["contatos"]], [self.contato.pk.hex]
+        )
+        self.assertEqual(
+            [p["id_produto"] for p in body["produtos"]], [self.barril.pk.hex]
+        )
+        watermark = body["watermark"]
+        body = self.sync(since=watermark)
+        self.assertEqual((body["contatos"], body["produtos"]), ([], []))
+
+        processo = Processo.objects.create(**processo_data(), criado_por=self.user)
+        self.client.delete(f"/api/contatos/{self.contato.pk.hex}", **self.headers)
+        body = self.sync(since=watermark)
+        self.assertEqual(
+            [p["processo_id"] for p in body["processos"]], [processo.pk.hex]
+        )
+        self.assertEqual(
+            [(d["type"], d["id"]) for d in body["deleted"]],
+            [("contato", self.contato.pk.hex)],
+        )
+
+    def test_pages_cover_every_change_once(self) -> None:
+        """
+        Test that following the next cursors returns every change exactly once,
+        with the watermark of the first page.
+        """
+        for i in range(3):
+            Processo.objects.create(
+                **processo_data(numero_processo=str(i)), criado_por=self.user
+            )
+        Produto.objects.filter(pk=self.barril.pk).delete()
+        keys = {
+            "contatos": "contato_id",
+            "companies": "company_id",
+            "processos": "processo_id",
+            "produtos": "id_produto",
+            "deleted": "id",
+        }
+        seen: List[str] = []
+        body = self.sync(limit=2)
+        watermark = body["watermark"]
+        while True:
+            for name, key in keys.items():
+                seen += [row[key] for row in body[name]]
+            if body["next"] is None:
+                break
+            body = self.sync(limit=2, after=body["next"])
+            self.assertEqual(body["watermark"], watermark)
+        self.assertEqual(len(seen), 5)
+        self.assertEqual(len(set(seen)), 5)
+
+    def test_expired_watermark(self) -> None:
+        """
+        Test that a watermark older than the kept tombstones is refused.
+        """
+        since = timezone.now() - timezone.timedelta(days=365)
+        response = self.client.get(
+            "/api/sync", {"since": since.isoformat()}, **self.headers
+        )
+        self.assertEqual(response.status_code, 410)
+
+
+class ResponseCacheTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        # The cache is disabled by default, the tests use the local one
+        patcher = mock.patch.object(response_cache, "alias", "default")
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        response_cache.clear()
+        self.barril = produto(self.user, 5)
+        self.other = SystemUser.objects.create_user(username="other", password="x")
+
+    def get(self, path: str, user: SystemUser) -> Any:
+        response = self.client.get(path, **auth_headers(user))
+        self.assertEqual(response.status_code, 200)
+        return response
+
+    def assertCached(self, path: str, user: SystemUser) -> Any:
+        with self.assertNumQueries(0):
+            response = self.get(path, user)
+        self.assertEqual(response["X-Cache"], "HIT")
+        return response.json()
+
+    def test_responses_are_served_from_the_cache(self) -> None:
+        """
+        Test that repeated reads run no query, and that conditional requests
+        are answered from the cached ETag.
+        """
+        first = self.get("/api/produtos", self.user)
+        self.assertEqual(first["X-Cache"], "MISS")
+        self.assertEqual(self.assertCached("/api/produtos", self.user), first.json())
+        response = self.client.get(
+            "/api/produtos", HTTP_IF_NONE_MATCH=first["ETag"], **self.headers
+        )
+        self.assertEqual(response.status_code, 304)
+        self.get(f"/api/produtos/{self.barril.pk.hex}", self.user)
+        self.assertCached(f"/api/produtos/{self.barril.pk.hex}", self.user)
+        self.assertEqual(response_cache.stats()["hit_rate"], 0.6)
+
+    def test_writes_invalidate_the_owner_responses(self) -> None:
+        """
+        Test that ORM, SQL and bulk writes all drop the cached responses of
+        the rows they change.
+        """
+        writes: List[Callable[[], Any]] = [
+            lambda: produto(self.user, 1, "Caneca"),
+            lambda: self.client.patch(
+                f"/api/produtos/{self.barril.pk.hex}",
+                {"preco": 7.5},
+                content_type="application/json",
+                **self.headers,
+            ),
+            lambda: stock.adjust_stock(self.user, self.barril.pk.hex, -1),
+            lambda: self.client.patch(
+                "/api/produtos/bulk",
+                [{"id_produto": self.barril.pk.hex, "quantidade": 9}],
+                content_type="application/json",
+                **self.headers,
+            ),
+            lambda: Produto.objects.filter(nome="Caneca").delete(),
+        ]
+        for write in writes:
+            before = self.get("/api/produtos", self.user).json()
+            write()
+            response = self.get("/api/produtos", self.user)
+            self.assertEqual(response["X-Cache"], "MISS")
+            self.assertNotEqual(response.json(), before)
+            self.assertCached("/api/produtos", self.user)
+
+    def test_writes_of_other_users(self) -> None:
+        """
+        Test that a write keeps the cached responses of other users, but not
+        the ones of superusers, which list the rows of every user.
+        """
+        admin = SystemUser.objects.create_superuser(username="admin", password="x")
+        self.get("/api/produtos", self.user)
+        self.get("/api/produtos", admin)
+        produto(self.other, 1)
+        self.assertCached("/api/produtos", self.user)
+        self.assertEqual(self.get("/api/produtos", admin)["X-Cache"], "MISS")
+
+    def test_contato_delete_invalidates_companies(self) -> None:
+        contato = Contato.objects.create(**contato_data(), criado_por=self.user)
+        Company.objects.create(
+            cnpj="12345678000190",
+            razao_social="Empresa",
+            nome_fantasia="Empresa",
+            inscricao_estadual="123456789",
+            inscricao_municipal="123456789",
+            contato=contato,
+            criado_por=self.user,
+        )
+        self.get("/api/companies", self.user)
+        self.client.delete(f"/api/contatos/{contato.pk.hex}", **self.headers)
+        response = self.client.get("/api/companies", **self.headers)
+        self.assertEqual(response.status_code, 204)
+
+    def test_invalidation_reaches_other_workers(self) -> None:
+        """
+        Test that a write made by another worker sharing the cache backend
+        invalidates the responses cached by this one.
+        """
+        other_worker = ResponseCache(alias="default", ttl=60)
+        self.get("/api/produtos", self.user)
+        self.assertEqual(self.get("/api/produtos", self.user)["X-Cache"], "HIT")
+        other_worker.invalidate(Produto, [self.user.pk])
+        self.assertEqual(self.get("/api/produtos", self.user)["X-Cache"], "MISS")
+
+    def test_excluded_endpoints_are_not_cached(self) -> None:
+        with mock.patch.object(response_cache, "exclude", {"produtos"}):
+            self.get("/api/produtos", self.user)
+            response = self.get("/api/produtos", self.user)
+        self.assertFalse(response.has_header("X-Cache"))
+
+
+class AsgiTest(TransactionTestCase):
+    def setUp(self) -> None:
+        response_cache.clear()
+        self.user = SystemUser.objects.create_user(username="asgi", password="x")
+        self.barril = produto(self.user, 5)
+        # AsyncClient of Django 3.1 takes the raw headers of the ASGI scope
+        authorization = auth_headers(self.user)["HTTP_AUTHORIZATION"]
+        self.headers = {
+            "headers": [
+                (b"host", b"testserver"),
+                (b"authorization", authorization.encode()),
+            ]
+        }
+
+    def test_views_run_in_the_db_pool(self) -> None:
+        """
+        Test that concurrent requests served through asgi.py run their ORM code
+        in the bounded db_executor and not on the event loop.
+        """
+        threads = set()
+        close = concurrency.close_old_connections
+
+        def close_old_connections() -> None:
+            threads.add(threading.current_thread().name)
+            close()
+
+        async def get_all() -> List[Any]:
+            client = AsyncClient()
+            return await asyncio.gather(
+                *[client.get("/api/produtos", **self.headers) for _ in range(10)]
+            )
+
+        with mock.patch.object(
+            concurrency, "close_old_connections", close_old_connections
+        ), mock.patch.object(response_cache, "alias", ""):
+            responses = async_to_sync(get_all)()
+        for response in responses:
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(response.json()["produtos"][0]["nome"], "Barril")
+        self.assertTrue(threads)
+        self.assertTrue(all(name.startswith("db") for name in threads))
+        self.assertLessEqual(len(threads), concurrency.db_executor._max_workers)
+
+    def test_requests_overlap(self) -> None:
+        """
+        Test that concurrent requests are served at the same time through the
+        whole middleware chain, and not one after the other.
+        """
+        running = []
+        overlap = []
+        run_sync = concurrency.run_sync
+
+        async def slow_run_sync(*args: Any, **kwargs: Any) -> Any:
+            running.append(1)
+            overlap.append(len(running))
+            await asyncio.sleep(0.2)
+            running.pop()
+            return await run_sync(*args, **kwargs)
+
+        async def get_all() -> List[Any]:
+            client = AsyncClient()
+            return await asyncio.gather(
+                *[client.get("/api/produtos", **self.headers) for _ in range(5)]
+            )
+
+        with mock.patch.object(concurrency, "run_sync", slow_run_sync):
+            responses = async_to_sync(get_all)()
+        self.assertEqual([r.status_code for r in responses], [200] * 5)
+        self.assertEqual(max(overlap), 5)
+
+    def serve(self, query: bytes, headers: List[Any], send: Any) -> None:
+        # Through asgi.py, as AsyncClient of Django 3.1 reads streams itself
+        scope = {
+            "type": "http",
+            "method": "GET",
+            "path": "/api/produtos",
+            "query_string": query,
+            "headers": headers,
+        }
+
+        async def receive() -> Dict[str, Any]:
+            return {"type": "http.request", "body": b""}
+
+        async def serve() -> None:
+            await asyncio.wait_for(
+                concurrency.ASGIHandler()(scope, receive, send), timeout=10
+            )
+
+        async_to_sync(serve)()
+
+    def test_streams(self) -> None:
+        """
+        Test that streams are sent through asgi.py a row at a time, read in
+        the db_executor and not on the event loop.
+        """
+        produto(self.user, 1, "Copo")
+        ndjson = [(b"accept", b"application/x-ndjson"), *self.headers["headers"]]
+        for query, headers, expected in [
+            (b"stream=1", self.headers["headers"], b'{"produtos":['),
+            (b"", ndjson, b'{"nome":"Barril"'),
+        ]:
+            messages: List[Dict[str, Any]] = []
+
+            async def send(message: Dict[str, Any]) -> None:
+                messages.append(message)
+
+            self.serve(query, headers, send)
+            self.assertEqual(messages[0]["status"], 200)
+            body = [message.get("body", b"") for message in messages[1:]]
+            self.assertTrue(body[0].startswith(expected))
+            self.assertGreater(len(body), 2)
+            self.assertIn(b"Barril", b"".join(body))
+            self.assertIn(b"Copo", b"".join(body))
+            self.assertFalse(messages[-1].get("more_body", False))
+
+    def test_stream_stops_when_the_client_goes_away(self) -> None:
+        """
+        Test that the rows of a stream stop being read, and its thread is
+        released, when sending to the client fails.
+        """
+        for i in range(STREAM_READ_AHEAD * 3):
+            produto(self.user, 1, f"Produto {i}")
+        sent: List[Dict[str, Any]] = []
+
+        async def send(message: Dict[str, Any]) -> None:
+            if len(sent) == 2:
+                raise OSError("client went away")
+            sent.append(message)
+
+        with self.assertRaises(OSError):
+            self.serve(b"stream=1", self.headers["headers"], send)
+        self.assertEqual(concurrency.db_executor.submit(lambda: 1).result(), 1)
+
+    def test_unauthorized(self) -> None:
+        response = async_to_sync(AsyncClient().get)("/api/produtos")
+        self.assertEqual(response.status_code, 401)
+
+
+class LoginTest(TestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(username="login", password="senha")
+
+    def login(self, password: str = "senha", username: str = "login") -> Any:
+        return self.client.post(
+            "/api/login",
+            {"username": username, "password": password},
+            content_type="application/json",
+        )
+
+    def stored_password(self) -> str:
+        return SystemUser.objects.values_list("password", flat=True).get(
+            pk=self.user.pk
+        )
+
+    def test_login(self) -> None:
+        """
+        Test that the token of a hashed password authenticates the API, and
+        that the password is checked in the password pool.
+        """
+        threads = set()
+        verify = passwords.verify
+
+        def record(*args: Any) -> Any:
+            threads.add(threading.current_thread().name)
+            return verify(*args)
+
+        with mock.patch.object(passwords, "verify", record):
+            response = self.login()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([name[:8] for name in threads], ["password"])
+        headers = {"HTTP_AUTHORIZATION": f"Bearer Bearer {response.json()['token']}"}
+        self.assertEqual(self.client.get("/api/produtos", **headers).status_code, 204)
+
+    def test_wrong_credentials(self) -> None:
+        self.assertEqual(self.login("errada").status_code, 401)
+        self.assertEqual(self.login(username="ninguem").status_code, 401)
+
+    def test_legacy_passwords_are_upgraded(self) -> None:
+        """
+        Test that plain text and outdated hashes are replaced by a hash of the
+        preferred hasher on the first successful login.
+        """
+        for legacy in ["senha", make_password("senha", hasher="pbkdf2_sha1")]:
+            SystemUser.objects.filter(pk=self.user.pk).update(password=legacy)
+            self.assertEqual(self.login("errada").status_code, 401)
+            self.assertEqual(self.stored_password(), legacy)
+            self.assertEqual(self.login().status_code, 200)
+            stored = self.stored_password()
+            self.assertTrue(stored.startswith("pbkdf2_sha256$"))
+            self.assertTrue(check_password("senha", stored))
+
+    def test_limits(self) -> None:
+        with mock.patch.object(passwords.password_checker, "queue_depth", 0):
+            self.assertEqual(self.login().status_code, 503)
+        with mock.patch.object(passwords.password_checker, "per_user", 0):
+            self.assertEqual(self.login().status_code, 429)
+        self.assertEqual(self.login().status_code, 200)
+
+
+class TokenTest(TestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(username="token", password="senha")
+        revocations.clear()
+
+    def headers(self) -> Dict[str, str]:
+        return {"HTTP_AUTHORIZATION": f"Bearer Bearer {create_token(self.user)}"}
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_claims_skip_user_lookup(self) -> None:
+        """
+        Test that the token minted by login authenticates without reading the
+        user, once the revocation set is synced.
+        """
+        response = self.client.post(
+            "/api/login",
+            {"username": "token", "password": "senha"},
+            content_type="application/json",
+        )
+        headers = {"HTTP_AUTHORIZATION": f"Bearer Bearer {response.json()['token']}"}
+        Produto.objects.create(
+            nome="Produto",
+            descricao="Produto",
+            preco=1,
+            quantidade=1,
+            criado_por=self.user,
+        )
+        revocations.sync()
+        user_cache.clear()
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/produtos", **headers)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()["produtos"]), 1)
+
+    def test_superuser_claim(self) -> None:
+        other = SystemUser.objects.create_user(username="outro")
+        produto = Produto.objects.create(
+            nome="Produto", descricao="Produto", preco=1, quantidade=1, criado_por=other
+        )
+        response = self.client.get("/api/produtos", **self.headers())
+        self.assertEqual(response.status_code, 204)
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get("/api/produtos", **self.headers())
+        self.assertEqual(response.json()["produtos"][0]["nome"], produto.nome)
+
+    def test_changes_revoke_tokens(self) -> None:
+        """
+        Test that changing the password, deactivating or deleting the user
+        refuses its tokens right away in this process, and that other
+        changes don't.
+        """
+        for change in ["first_name", "password", "is_active"]:
+            headers = self.headers()
+            if change == "first_name":
+                self.user.first_name = "Nome"
+            elif change == "password":
+                self.user.set_password("nova")
+            else:
+                self.user.is_active = False
+            self.user.save()
+            status = 204 if change == "first_name" else 401
+            response = self.client.get("/api/produtos", **headers)
+            self.assertEqual(response.status_code, status, change)
+        headers = self.headers()
+        self.user.delete()
+        self.assertEqual(self.client.get("/api/produtos", **headers).status_code, 401)
+        self.assertEqual(RevokedToken.objects.count(), 3)
+
+    def test_revocations_of_other_processes(self) -> None:
+        """
+        Test that revocations made by other processes are seen once the
+        revocation set is synced, and by the lookup without AUTH_STATELESS.
+        """
+        headers = self.headers()
+        RevokedToken.objects.create(
+            user=self.user, versao=self.user.token_version, revogado_em=timezone.now()
+        )
+        revocations.sync()
+        self.assertEqual(self.client.get("/api/produtos", **headers).status_code, 401)
+        revocations.clear()
+        SystemUser.objects.filter(pk=self.user.pk).update(secret="outro")
+        user_cache.clear()
+        with mock.patch.object(api, "AUTH_STATELESS", False):
+            response = self.client.get("/api/produtos", **headers)
+        self.assertEqual(response.status_code, 401)
+
+
+class MetricsTest(ApiTestCase):
+    def setUp(self) -> None:
+        super().setUp()
+        self.store = metrics.MetricsStore(
+            directory="", flush_interval=1, buckets=[0.1, 1], components={}
+        )
+        patcher = mock.patch.object(metrics, "metrics", self.store)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        mock.patch.object(api, "metrics", self.store).start()
+        self.addCleanup(mock.patch.stopall)
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_requests_are_recorded(self) -> None:
+        """
+        Test that requests are recorded by route, method and status, with the
+        queries made in the threads running the views.
+        """
+        Produto.objects.create(
+            nome="Produto",
+            descricao="Produto",
+            preco=1,
+            quantidade=1,
+            criado_por=self.user,
+        )
+        self.client.get("/api/produtos", **self.headers)
+        self.client.get("/api/produtos", **self.headers)
+        self.client.get("/api/produtos/missing", **self.headers)
+        self.assertEqual(
+            self.client.get("/api/metrics", **self.headers).status_code, 403
+        )
+        self.user.is_superuser = True
+        self.user.save()
+        response = self.client.get("/api/metrics", **auth_headers(self.user))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        lines = set(response.content.decode().splitlines())
+        series = 'route="api/produtos",method="GET",status="200"'
+        self.assertIn(f"http_request_duration_seconds_count{{{series}}} 2", lines)
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{series},le="+Inf"}} 2', lines
+        )
+        # The page queries, and the user lookup once
+        self.assertIn(f"http_request_db_queries_total{{{series}}} 3", lines)
+        missing = 'route="api/produtos/<produto_id>",method="GET",status="404"'
+        self.assertIn(f"http_request_duration_seconds_count{{{missing}}} 1", lines)
+        self.assertIn(
+            'http_requests_in_flight{route="api/metrics",method="GET"} 1', lines
+        )
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_streams_are_recorded_when_read(self) -> None:
+        """
+        Test that a stream is recorded once its body is read, with its size
+        and the queries made while reading it.
+        """
+        Produto.objects.create(
+            nome="Produto",
+            descricao="Produto",
+            preco=1,
+            quantidade=1,
+            criado_por=self.user,
+        )
+        response = self.client.get(
+            "/api/produtos", HTTP_ACCEPT="application/x-ndjson", **self.headers
+        )
+        self.assertNotIn("http_response_bytes_total{", self.store.render())
+        body = b"".join(response.streaming_content)
+        lines = set(self.store.render().splitlines())
+        series = 'route="api/produtos",method="GET",status="200"'
+        self.assertIn(f"http_request_duration_seconds_count{{{series}}} 1", lines)
+        self.assertIn(f"http_response_bytes_total{{{series}}} {len(body)}", lines)
+        # The user lookup, the list validators and the stream query
+        self.assertIn(f"http_request_db_queries_total{{{series}}} 3", lines)
+
+    def test_totals_of_every_process(self) -> None:
+        """
+        Test that the counters written by other processes are added, and that
+        the requests in flight of exited ones are not.
+        """
+        request = metrics.RequestMetrics()
+        request.queries = 2
+        self.store.finish("api/produtos", "GET", "200", 0.05, request, 10)
+        request.route = "api/produtos"
+        with tempfile.TemporaryDirectory() as directory:
+            self.store.directory = directory
+            for pid in [os.getppid(), 2**22 + 1]:
+                other = metrics.MetricsStore(
+                    directory="", flush_interval=1, buckets=[0.1, 1], components={}
+                )
+                other.start("api/produtos", "GET")
+                other.finish("api/produtos", "GET", "200", 0.5, request, 5)
+                other.start("api/produtos", "GET")
+                snapshot = {**other.snapshot(), "pid": pid}
+                with open(os.path.join(directory, f"{pid}.json"), "w") as file:
+                    json.dump(snapshot, file)
+            lines = set(self.store.render().splitlines())
+        series = 'route="api/produtos",method="GET",status="200"'
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{series},le="0.1"}} 1', lines
+        )
+        self.assertIn(
+            f'http_request_duration_seconds_bucket{{{series},le="1"}} 3', lines
+        )
+        self.assertIn(f"http_request_db_queries_total{{{series}}} 6", lines)
+        self.assertIn(f"http_response_bytes_total{{{series}}} 20", lines)
+        self.assertIn(
+            'http_requests_in_flight{route="api/produtos",method="GET"} 1', lines
+        )
+
+    def test_flush_merges_exited_processes(self) -> None:
+        """
+        Test that a flush adds the counters of exited processes to its own and
+        removes their files, keeping the totals.
+        """
+        request = metrics.RequestMetrics()
+        with tempfile.TemporaryDirectory() as directory:
+            for pid in [os.getppid(), 2**22 + 1]:
+                other = metrics.MetricsStore(
+                    directory="", flush_interval=1, buckets=[0.1, 1], components={}
+                )
+                other.finish("api/produtos", "GET", "200", 0.5, request, 5)
+                snapshot = {**other.snapshot(), "pid": pid}
+                with open(os.path.join(directory, f"{pid}.json"), "w") as file:
+                    json.dump(snapshot, file)
+            self.store.directory = directory
+            self.store._path = os.path.join(directory, f"{os.getpid()}.json")
+            before = self.store.render()
+            self.store.flush()
+            self.assertEqual(
+                sorted(name for name in os.listdir(directory) if name != ".lock"),
+                sorted([f"{os.getppid()}.json", f"{os.getpid()}.json"]),
+            )
+            self.assertEqual(self.store.render(), before)
+            self.store.flush()
+            self.assertEqual(self.store.render(), before)
+        series = 'route="api/produtos",method="GET",status="200"'
+        self.assertIn(f"http_response_bytes_total{{{series}}} 10", before)
@@ -0,0 +1,208 @@
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from typing import Any, List
+from unittest import mock
+
+import jwt
+from django.core.cache import caches
+from django.test import TestCase
+
+from work_in_progress import settings
+from work_in_progress.app.models import Produto, SystemUser
+from work_in_progress.settings import ALGORITHM, SECRET_KEY
+
+from .cache import FlightKey, SingleFlight, UserCache, response_cache, user_cache
+
+
+class UserCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        self.cache = UserCache(maxsize=2, ttl=60)
+
+    def test_hit_and_miss_counters(self) -> None:
+        """
+        Test that the first lookup goes to the database and the next one doesn't.
+        """
+        with self.assertNumQueries(1):
+            self.assertEqual(self.cache.get(self.user.id), self.user)
+        with self.assertNumQueries(0):
+            self.assertEqual(self.cache.get(self.user.id), self.user)
+        self.assertEqual(self.cache.stats()["hits"], 1)
+        self.assertEqual(self.cache.stats()["misses"], 1)
+
+    def test_entries_expire(self) -> None:
+        """
+        Test that entries older than the ttl are fetched again.
+        """
+        with mock.patch("work_in_progress.app.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 0
+            self.cache.get(self.user.id)
+            monotonic.return_value = 61
+            with self.assertNumQueries(1):
+                self.cache.get(self.user.id)
+        self.assertEqual(self.cache.stats()["misses"], 2)
+
+    def test_lru_is_bounded(self) -> None:
+        """
+        Test that the least recently used entry is evicted past maxsize.
+        """
+        other = SystemUser.objects.create_user(username="other", password="x")
+        third = SystemUser.objects.create_user(username="third", password="x")
+        self.cache.get(self.user.id)
+        self.cache.get(other.id)
+        self.cache.get(self.user.id)
+        self.cache.get(third.id)
+        self.assertEqual(self.cache.stats()["size"], 2)
+        with self.assertNumQueries(1):
+            self.cache.get(other.id)
+
+    def test_other_workers_drop_deleted_users_after_ttl(self) -> None:
+        """
+        Test that a user deleted by another worker stops being served once
+        the default ttl has passed.
+        """
+        other_worker = UserCache(maxsize=2, ttl=settings.AUTH_USER_CACHE_TTL)
+        with mock.patch("work_in_progress.app.cache.time.monotonic") as monotonic:
+            monotonic.return_value = 0
+            user_id = self.user.id
+            other_worker.get(user_id)
+            self.user.delete()
+            self.assertEqual(other_worker.get(user_id).username, "testuser")
+            monotonic.return_value = settings.AUTH_USER_CACHE_TTL + 1
+            self.assertRaises(SystemUser.DoesNotExist, other_worker.get, user_id)
+
+    def test_missing_user_is_not_cached(self) -> None:
+        self.assertRaises(SystemUser.DoesNotExist, self.cache.get, 0)
+        self.assertEqual(self.cache.stats()["size"], 0)
+
+
+class JWTAuthCacheTest(TestCase):
+    def setUp(self) -> None:
+        user_cache.clear()
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        token = jwt.encode({"sub": self.user.id}, SECRET_KEY, algorithm=ALGORITHM)
+        self.headers = {"HTTP_AUTHORIZATION": f"Bearer Bearer {token}"}
+
+    @mock.patch.object(response_cache, "alias", "")
+    def test_user_is_resolved_once(self) -> None:
+        """
+        Test that repeated requests don't query the SystemUser again.
+        """
+        self.client.get("/api/produtos", **self.headers)
+        # Only the page query
+        with self.assertNumQueries(1):
+            response = self.client.get("/api/produtos", **self.headers)
+        self.assertEqual(response.status_code, 204)
+
+    def test_user_save_invalidates_cache(self) -> None:
+        """
+        Test that saving a SystemUser drops its cached instance.
+        """
+        self.client.get("/api/produtos", **self.headers)
+        self.user.is_superuser = True
+        self.user.save()
+        self.assertTrue(user_cache.get(self.user.id).is_superuser)
+
+    def test_user_delete_invalidates_cache(self) -> None:
+        self.client.get("/api/produtos", **self.headers)
+        self.user.delete()
+        response = self.client.get("/api/produtos", **self.headers)
+        self.assertEqual(response.status_code, 401)
+
+
+class SingleFlightTest(TestCase):
+    key: FlightKey = (Produto, 1, "produtos:1:/api/produtos?")
+
+    def setUp(self) -> None:
+        caches["default"].clear()
+        self.flights = SingleFlight(alias="", timeout=5, poll=0.01)
+        self.started = threading.Event()
+        self.release = threading.Event()
+        self.computed: List[int] = []
+
+    def compute(self) -> int:
+        result = len(self.computed) + 1
+        self.computed.append(result)
+        self.started.set()
+        self.release.wait(5)
+        return result
+
+    def flight(self, flights: SingleFlight) -> int:
+        return flights.run(self.key, self.compute)
+
+    def test_concurrent_calls_share_one_computation(self) -> None:
+        """
+        Test that the calls arriving while a computation is in flight get its
+        result, and that a call arriving after it ends computes again.
+        """
+        with ThreadPoolExecutor(4) as pool:
+            leader = pool.submit(self.flight, self.flights)
+            self.started.wait(5)
+            followers = [pool.submit(self.flight, self.flights) for _ in range(3)]
+            while self.flights.stats()["followers"] < 3:
+                pass
+            self.release.set()
+            results = [leader.result()] + [f.result() for f in followers]
+        self.assertEqual(results, [1, 1, 1, 1])
+        self.assertEqual(self.flight(self.flights), 2)
+        self.assertEqual(self.flights.stats()["in_flight"], 0)
+
+    def test_writes_detach_computations(self) -> None:
+        """
+        Test that a write to the rows of the key makes the next call compute
+        again, and that writes to other owners don't.
+        """
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(self.flight, self.flights)
+            self.started.wait(5)
+            self.flights.invalidate(Produto, [2])
+            self.assertEqual(self.flights.stats()["in_flight"], 1)
+            self.flights.invalidate(Produto, [1])
+            self.assertEqual(self.flights.stats()["in_flight"], 0)
+            self.release.set()
+            self.assertEqual(self.flight(self.flights), 2)
+            self.assertEqual(leader.result(), 1)
+
+    def test_errors_are_shared(self) -> None:
+        def fail() -> Any:
+            self.started.set()
+            self.release.wait(5)
+            raise ValueError("falhou")
+
+        with ThreadPoolExecutor(2) as pool:
+            leader = pool.submit(lambda: self.flights.run(self.key, fail))
+            self.started.wait(5)
+            follower = pool.submit(self.flight, self.flights)
+            while not self.flights.stats()["followers"]:
+                pass
+            self.release.set()
+            self.assertRaises(ValueError, leader.result)
+            self.assertRaises(ValueError, follower.result)
+        self.assertEqual(self.computed, [])
+
+    def test_shared_between_workers(self) -> None:
+        """
+        Test that a worker waits for the computation of the worker holding
+        the lock in the shared cache, and reads its result.
+        """
+        worker = SingleFlight(alias="default", timeout=5, poll=0.01)
+        other = SingleFlight(alias="default", timeout=5, poll=0.01)
+        # The leader ends once the other worker polls for its result.
+        sleep = mock.patch(
+            "work_in_progress.app.cache.time.sleep",
+            side_effect=lambda seconds: self.release.set(),
+        )
+        with ThreadPoolExecutor(2) as pool, sleep:
+            leader = pool.submit(self.flight, worker)
+            self.started.wait(5)
+            follower = pool.submit(self.flight, other)
+            self.assertEqual(leader.result(), 1)
+            self.assertEqual(follower.result(), 1)
+        self.assertEqual(other.stats()["shared_followers"], 1)
+        self.assertEqual(self.flight(other), 2)
@@ -0,0 +1,156 @@
+from datetime import timedelta
+from typing import Any, Dict, List, Tuple, Type
+
+from django.contrib.postgres.search import SearchQuery
+from django.db import connection
+from django.db.models import Model, QuerySet
+from django.test import TestCase
+from django.utils.timezone import now
+from ninja import FilterSchema
+
+from work_in_progress.app.schemas import (
+    CompanyFilterSchema,
+    ContatoFilterSchema,
+    ProcessoFilterSchema,
+    ProdutoFilterSchema,
+)
+from work_in_progress.app.search import SEARCH_CONFIG
+
+from .management.commands.benchmark_serializers import create_rows
+from .models import Company, Contato, Processo, Produto, SystemUser
+
+
+class FilterIndexTest(TestCase):
+    """
+    EXPLAIN the tenant scoped filters and orderings of the list endpoints and
+    check that they are answered by their (criado_por, <column>) index.
+    """
+
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        create_rows(self.user, 300)
+        # Spread the filtered columns so that each filter below is selective
+        for i, pk in enumerate(Processo.objects.values_list("pk", flat=True)):
+            Processo.objects.filter(pk=pk).update(
+                status=f"status {i % 30}",
+                fase=f"fase {i % 30}",
+                estado=f"estado {i % 30}",
+                ativo=i % 30 != 0,
+                data_distribuicao=now() - timedelta(days=i),
+            )
+        for i, pk in enumerate(Contato.objects.values_list("pk", flat=True)):
+            Contato.objects.filter(pk=pk).update(cidade=f"cidade {i % 30}")
+        Company.objects.filter(cnpj__endswith="7").update(ativo=False)
+        with connection.cursor() as cursor:
+            cursor.execute("ANALYZE")
+            # The test tables are tiny, make the planner prefer any index
+            cursor.execute("SET LOCAL enable_seqscan = off")
+
+    def assert_uses_index(self, queryset: QuerySet, index: str) -> None:
+        plan = queryset.explain()
+        self.assertIn(index, plan)
+
+    def assert_filter_uses_index(
+        self,
+        model: Type[Model],
+        filter_schema: Type[FilterSchema],
+        params: Dict[str, Any],
+        index: str,
+    ) -> None:
+        filters = filter_schema(**params)
+        queryset = filters.filter(model.objects.filter(criado_por=self.user))
+        self.assert_uses_index(queryset, index)
+
+    def test_processo_filters(self) -> None:
+        cases: List[Tuple[Dict[str, Any], str]] = [
+            ({"status": "status 1"}, "processo_criado_status_idx"),
+            ({"fase": "fase 1"}, "processo_criado_fase_idx"),
+            ({"comarca": "Comarca 1"}, "processo_criado_comarca_idx"),
+            ({"estado": "estado 1"}, "processo_criado_estado_idx"),
+            ({"ativo": False}, "processo_criado_ativo_idx"),
+            (
+                {"data_distribuicao_min": now() - timedelta(days=5)},
+                "processo_criado_distrib_idx",
+            ),
+        ]
+        for params, index in cases:
+            with self.subTest(params=params):
+                self.assert_filter_uses_index(
+                    Processo, ProcessoFilterSchema, params, index
+                )
+
+    def test_produto_filters(self) -> None:
+        self.assert_filter_uses_index(
+            Produto, ProdutoFilterSchema, {"preco_min": 290}, "produto_criado_preco_idx"
+        )
+        self.assert_filter_uses_index(
+            Produto,
+            ProdutoFilterSchema,
+            {"quantidade_max": 3},
+            "produto_criado_qtd_idx",
+        )
+
+    def test_contato_and_company_filters(self) -> None:
+        self.assert_filter_uses_index(
+            Contato,
+            ContatoFilterSchema,
+            {"cidade": "cidade 1"},
+            "contato_criado_cidade_idx",
+        )
+        self.assert_filter_uses_index(
+            Company, CompanyFilterSchema, {"ativo": False}, "company_criado_ativo_idx"
+        )
+
+    def test_orderings(self) -> None:
+        cases: List[Tuple[Type[Model], str, str]] = [
+            (Processo, "-valor_total", "processo_criado_total_idx"),
+            (Processo, "data_distribuicao", "processo_criado_distrib_idx"),
+            (Produto, "preco", "produto_criado_preco_idx"),
+            (Contato, "nome", "contato_criado_nome_idx"),
+            (Company, "razao_social", "company_criado_razao_idx"),
+        ]
+        for model, order_by, index in cases:
+            with self.subTest(order_by=order_by):
+                queryset = model._default_manager.filter(criado_por=self.user)
+                self.assert_uses_index(queryset.order_by(order_by, "pk")[:10], index)
+
+    def test_search(self) -> None:
+        # The test rows all belong to one user, so the tenant filter is left out
+        cases: List[Tuple[Type[Model], str, str]] = [
+            (Processo, "Cliente 7", "processo_search_idx"),
+            (Contato, "responsavel7@teste.com", "contato_search_idx"),
+        ]
+        for model, text, index in cases:
+            with self.subTest(model=model.__name__):
+                query = SearchQuery(text, config=SEARCH_CONFIG, search_type="websearch")
+                queryset = model._default_manager.filter(search_vector=query)
+                self.assert_uses_index(queryset, index)
+
+    def test_company_lookup(self) -> None:
+        companies = Company.objects.all()
+        cases: List[Tuple[QuerySet, str]] = [
+            (
+                companies.filter(razao_social__trigram_similar="razao socal 7"),
+                "company_razao_trgm_idx",
+            ),
+            (
+                companies.filter(nome_fantasia__trigram_similar="fantasia 7"),
+                "company_fantasia_trgm_idx",
+            ),
+            (
+                companies.filter(criado_por=self.user, cnpj_digits="00000000000007"),
+                "company_criado_cnpj_uniq",
+            ),
+        ]
+        for queryset, index in cases:
+            with self.subTest(index=index):
+                self.assert_uses_index(queryset, index)
+
+    def test_company_cnpj_prefix_lookup(self) -> None:
+        # Depending on the collation the prefix is answered by the btree of the
+        # unique constraint or by the trigram index, but never by a full scan
+        queryset = Company.objects.filter(cnpj_digits__startswith="0000001")
+        self.assertNotIn("Seq Scan", queryset.explain())
@@ -1,9 +1,13 @@
 import uuid
+from typing import Any
 
+from django.db import connection
+from django.db.migrations.executor import MigrationExecutor
 from django.db.utils import IntegrityError
-from django.test import TestCase
+from django.test import TestCase, TransactionTestCase
 from django.utils import timezone
 
+from work_in_progress.app.exceptions import HTTPException, unique_violation
 from work_in_progress.app.models import models
 
 from .models import Company, Contato, Processo, SystemUser
@@ -72,14 +76,34 @@ class ContatoModelTest(TestCase):
         Test that the contato_id field is generated with a UUID and is unique.
         """
         self.assertIsNotNone(self.contato.contato_id)
-        self.assertEqual(len(self.contato.contato_id), 32)
-        self.assertIsInstance(uuid.UUID(self.contato.contato_id), uuid.UUID)
+        self.assertIsInstance(self.contato.contato_id, uuid.UUID)
+        self.assertEqual(self.contato.contato_id.version, 7)
         self.assertRaises(
             IntegrityError,
             Contato.objects.create,
             contato_id=self.contato.contato_id,
         )
 
+    def test_contato_ids_are_time_ordered(self) -> None:
+        """
+        Test that contatos created later get greater ids.
+        """
+        contato = Contato.objects.create(
+            nome="Test Contato 2",
+            endereco="Test Address",
+            numero="123",
+            complemento="Test Complement",
+            bairro="Test Neighborhood",
+            cidade="Test City",
+            estado="Test State",
+            cep="12345678",
+            telefone="1234567890",
+            email_responsavel="test2@test.com",
+            email_cobranca="test2@test.com",
+            criado_por=self.user,
+        )
+        self.assertGreater(contato.contato_id, self.contato.contato_id)
+
     def test_contato_nome_field(self) -> None:
         """
         Test that the nome field is required and cannot be blank or null.
@@ -134,8 +158,8 @@ class CompanyModelTest(TestCase):
         Test that the company_id field is generated with a UUID and is unique.
         """
         self.assertIsNotNone(self.company.company_id)
-        self.assertEqual(len(self.company.company_id), 32)
-        self.assertIsInstance(uuid.UUID(self.company.company_id), uuid.UUID)
+        self.assertIsInstance(self.company.company_id, uuid.UUID)
+        self.assertEqual(self.company.company_id.version, 7)
         self.assertRaises(
             IntegrityError,
             Company.objects.create,
@@ -206,8 +230,8 @@ class ProcessoModelTest(TestCase):
         Test that the processo_id field is generated with a UUID and is unique.
         """
         self.assertIsNotNone(self.processo.processo_id)
-        self.assertEqual(len(self.processo.processo_id), 32)
-        self.assertIsInstance(uuid.UUID(self.processo.processo_id), uuid.UUID)
+        self.assertIsInstance(self.processo.processo_id, uuid.UUID)
+        self.assertEqual(self.processo.processo_id.version, 7)
         self.assertRaises(
             IntegrityError,
             Processo.objects.create,
@@ -239,3 +263,92 @@ class ProcessoModelTest(TestCase):
             field = Processo._meta.get_field(field_name)
             self.assertFalse(field.blank)
             self.assertFalse(field.null)
+
+
+class UniqueViolationTest(TestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        Contato.objects.create(criado_por=self.user, email_responsavel="a@a.com")
+
+    def test_unique_violation_is_a_400(self) -> None:
+        """
+        Test that a row breaking a unique constraint becomes a 400 response.
+        """
+        with self.assertRaises(HTTPException) as raised:
+            with unique_violation("Contato já existe"):
+                Contato.objects.create(
+                    criado_por=self.user, email_responsavel="a@a.com"
+                )
+        self.assertEqual(raised.exception.status_code, 400)
+        self.assertEqual(raised.exception.message, "Contato já existe")
+
+    def test_other_integrity_errors_are_raised(self) -> None:
+        """
+        Test that an IntegrityError of another constraint, here not null, is
+        not reported as a duplicate.
+        """
+        with self.assertRaises(IntegrityError):
+            with unique_violation("Contato já existe"):
+                Contato.objects.create(criado_por=self.user, nome=None)
+
+
+class UniqueMigrationTest(TransactionTestCase):
+    """
+    Run the migrations adding the unique constraints over duplicated rows.
+    """
+
+    def migrate(self, target: str) -> Any:
+        executor = MigrationExecutor(connection)
+        executor.migrate([("app", target)])
+        return executor.loader.project_state(("app", target)).apps
+
+    def tearDown(self) -> None:
+        executor = MigrationExecutor(connection)
+        executor.migrate(executor.loader.graph.leaf_nodes())
+
+    def test_duplicates_stop_the_unique_constraints(self) -> None:
+        """
+        Test that migration 0015 fails listing the duplicated cnpjs and emails
+        instead of adding the constraints.
+        """
+        apps = self.migrate("0014_company_contato_db_cascade")
+        user = apps.get_model("app", "SystemUser").objects.create(username="u")
+        Contato = apps.get_model("app", "Contato")
+        contatos = [
+            Contato.objects.create(criado_por=user, email_responsavel="a@a.com")
+            for _ in range(2)
+        ]
+        Company = apps.get_model("app", "Company")
+        for contato in contatos:
+            Company.objects.create(criado_por=user, contato=contato, cnpj="1")
+
+        with self.assertRaisesRegex(RuntimeError, "Company.cnpj='1'.*2 rows"):
+            self.migrate("0015_unique_email_cnpj")
+        Company.objects.filter(contato=contatos[1]).delete()
+        with self.assertRaisesRegex(RuntimeError, "email_responsavel='a@a.com'"):
+            self.migrate("0015_unique_email_cnpj")
+        contatos[1].delete()
+        self.migrate("0015_unique_email_cnpj")
+
+    def test_formatted_duplicates_stop_the_cnpj_digits_constraint(self) -> None:
+        """
+        Test that migration 0018 fails listing the cnpjs of a user that only
+        differ in formatting instead of adding the constraint.
+        """
+        apps = self.migrate("0017_search_vectors")
+        user = apps.get_model("app", "SystemUser").objects.create(username="u")
+        contato = apps.get_model("app", "Contato").objects.create(criado_por=user)
+        Company = apps.get_model("app", "Company")
+        for cnpj in ["12.345.678/0001-90", "12345678000190", "", "-"]:
+            Company.objects.create(criado_por=user, contato=contato, cnpj=cnpj)
+
+        with self.assertRaisesRegex(
+            RuntimeError,
+            r"'12345678000190'.*\['12.345.678/0001-90', '12345678000190'\]",
+        ):
+            self.migrate("0018_company_lookup")
+        Company.objects.filter(cnpj="12345678000190").delete()
+        self.migrate("0018_company_lookup")
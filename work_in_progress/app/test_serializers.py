@@ -0,0 +1,53 @@
+from typing import Any, Type
+
+from django.db.models import QuerySet
+from django.test import TestCase
+from ninja import Schema
+
+from work_in_progress.app.api import api
+from work_in_progress.app.models import Company, Contato, Processo, Produto
+from work_in_progress.app.schemas import (
+    CompanySchema,
+    ContatoSchema,
+    ProcessoSchema,
+    ProdutoSchema,
+)
+
+from .management.commands.benchmark_serializers import create_rows
+from .models import SystemUser
+from .serializers import get_serializer
+
+
+class RowSerializerTest(TestCase):
+    def setUp(self) -> None:
+        self.user = SystemUser.objects.create_user(
+            username="testuser",
+            password="testpass",
+        )
+        create_rows(self.user, 3)
+
+    def render(self, data: Any) -> bytes:
+        return api.renderer.render(None, data, response_status=200)
+
+    def assert_same_output(self, queryset: QuerySet, schema: Type[Schema]) -> None:
+        expected = [schema.from_orm(obj).dict() for obj in queryset.order_by("pk")]
+        serializer = get_serializer(schema)
+        rows = serializer.rows(serializer.values(queryset.order_by("pk")))
+        self.assertEqual(self.render(rows), self.render(expected))
+
+    def test_contato_output_matches_schema(self) -> None:
+        self.assert_same_output(Contato.objects.all(), ContatoSchema)
+
+    def test_company_output_matches_schema(self) -> None:
+        self.assert_same_output(Company.objects.all(), CompanySchema)
+
+    def test_processo_output_matches_schema(self) -> None:
+        self.assert_same_output(Processo.objects.all(), ProcessoSchema)
+
+    def test_produto_output_matches_schema(self) -> None:
+        """
+        Test that the Decimal preco is rendered as the float of the schema.
+        """
+        self.assert_same_output(Produto.objects.all(), ProdutoSchema)
+        row = get_serializer(ProdutoSchema).first(Produto.objects.all())
+        self.assertIsInstance(row and row["preco"], float)
@@ -0,0 +1,115 @@
+import threading
+import time
+from datetime import timedelta
+from typing import Any, Dict, FrozenSet, Optional, Tuple
+
+import jwt
+from django.utils import timezone
+
+from work_in_progress.app.models import (
+    RevokedToken,
+    SystemUser,
+    get_new_uuid_hex,
+    token_version,
+)
+from work_in_progress.settings import (
+    ACCESS_TOKEN_EXPIRE_MINUTES,
+    ALGORITHM,
+    AUTH_REVOCATION_SYNC_SECONDS,
+    SECRET_KEY,
+)
+
+# Claims of the tokens minted by login; tokens minted before only carry sub.
+CLAIMS = ("sub", "su", "ver", "exp")
+
+TOKEN_LIFETIME = timedelta(minutes=ACCESS_TOKEN_EXPIRE_MINUTES)
+
+
+def create_token(user: SystemUser) -> str:
+    """
+    Mint a token carrying the user id, its superuser flag and the version of
+    its secret, valid for ACCESS_TOKEN_EXPIRE_MINUTES.
+    """
+    claims = {
+        "sub": user.id,
+        "su": user.is_superuser,
+        "ver": user.token_version,
+        "exp": timezone.now() + TOKEN_LIFETIME,
+    }
+    return jwt.encode(claims, SECRET_KEY, algorithm=ALGORITHM)
+
+
+def has_claims(payload: Dict[str, Any]) -> bool:
+    return all(claim in payload for claim in CLAIMS)
+
+
+def principal(payload: Dict[str, Any]) -> SystemUser:
+    """
+    Build the user of a request from the claims of its token, without reading
+    it from the database.
+
+    Only pk and is_superuser are set, which is all the views and the
+    queryset filters on criado_por use. The instance must never be saved.
+    """
+    return SystemUser(id=payload["sub"], is_superuser=payload["su"])
+
+
+class RevocationSet:
+    """
+    In-memory set of the revoked (user id, token version) pairs, reloaded
+    from RevokedToken at most every interval seconds.
+
+    Only the versions revoked within a token lifetime are kept, since older
+    tokens have expired anyway, so the set stays small. Revocations made by
+    other processes are seen after at most interval seconds.
+    """
+
+    def __init__(self, interval: float) -> None:
+        self.interval = interval
+        self._revoked: FrozenSet[Tuple[int, str]] = frozenset()
+        self._synced_at: Optional[float] = None
+        self._lock = threading.Lock()
+
+    def is_stale(self) -> bool:
+        synced_at = self._synced_at
+        return synced_at is None or time.monotonic() - synced_at > self.interval
+
+    def sync(self) -> None:
+        # Requests arriving while the set is loaded keep using the old one.
+        self._synced_at = time.monotonic()
+        revoked = frozenset(
+            RevokedToken.objects.filter(
+                revogado_em__gt=timezone.now() - TOKEN_LIFETIME
+            ).values_list("user_id", "versao")
+        )
+        with self._lock:
+            self._revoked = revoked
+
+    def add(self, user_id: int, version: str) -> None:
+        with self._lock:
+            self._revoked = self._revoked | {(user_id, version)}
+
+    def is_revoked(self, payload: Dict[str, Any]) -> bool:
+        return (payload["sub"], payload["ver"]) in self._revoked
+
+    def clear(self) -> None:
+        with self._lock:
+            self._revoked = frozenset()
+        self._synced_at = None
+
+
+revocations = RevocationSet(interval=AUTH_REVOCATION_SYNC_SECONDS)
+
+
+def revoke_tokens(user: SystemUser, secret: Optional[str] = None) -> None:
+    """
+    Revoke the tokens minted with the given secret of the user, its current
+    one by default, and give the user a new secret for the next tokens.
+    """
+    now = timezone.now()
+    version = token_version(secret or user.secret)
+    RevokedToken.objects.filter(revogado_em__lte=now - TOKEN_LIFETIME).delete()
+    RevokedToken.objects.create(user_id=user.pk, versao=version, revogado_em=now)
+    user.secret = get_new_uuid_hex()
+    SystemUser.objects.filter(pk=user.pk).update(secret=user.secret)
+    revocations.add(user.pk, version)
@@ -0,0 +1,96 @@
+from typing import Any, Dict, List, Optional, Sequence, Tuple, Type
+from uuid import UUID
+
+from django.db import connection
+from django.db.models import Model
+from django.utils import timezone
+from ninja import Schema
+
+from work_in_progress.app.exceptions import HTTPException
+from work_in_progress.app.models import SystemUser, parse_id
+from work_in_progress.app.signals import rows_changed
+
+
+def get_changes(data: Schema) -> Dict[str, Any]:
+    """
+    Return the fields sent in a partial payload, nulls included; the schemas
+    refuse them for the fields that can't be cleared.
+
+    Raises:
+        HTTPException: If no field was sent.
+    """
+    changes = data.dict(exclude_unset=True)
+    if not changes:
+        raise HTTPException(400, "Nenhum campo para atualizar")
+    return changes
+
+
+def update_row(
+    model: Type[Model],
+    user: SystemUser,
+    pk: str,
+    changes: Dict[str, Any],
+    returning: Sequence[str] = (),
+) -> Optional[Tuple[Any, ...]]:
+    """
+    Update the given columns of one of the user's rows with a single
+    UPDATE ... RETURNING statement, bumping atualizado_em.
+
+    Returns:
+        The values of the returning fields, or None if the user has no row
+        with the given primary key.
+    """
+    key = parse_id(pk)
+    if key is None:
+        return None
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    columns = [quote(model._meta.get_field(name).column) for name in changes]
+    selected = [quote(model._meta.get_field(name).column) for name in returning]
+    pk_column = quote(model._meta.pk.column)
+    assignments = ", ".join(f"{column} = %s" for column in columns)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'UPDATE {table} SET {assignments}, "atualizado_em" = %s '
+            f'WHERE {pk_column} = %s AND "criado_por_id" = %s '
+            f"RETURNING {', '.join([pk_column, *selected])}",
+            [*changes.values(), timezone.now(), key, user.pk],
+        )
+        row = cursor.fetchone()
+    if row is None:
+        return None
+    rows_changed.send(sender=model, owners=[user.pk])
+    return tuple(row[1:])
+
+
+def delete_rows(
+    model: Type[Model],
+    user: SystemUser,
+    pks: List[Any],
+    returning: Sequence[str] = (),
+) -> Dict[UUID, Tuple[Any, ...]]:
+    """
+    Delete the user's rows with the given primary keys with a single
+    DELETE ... RETURNING statement.
+
+    Related rows are removed by the ON DELETE CASCADE constraints of the
+    database, without loading them.
+
+    Returns:
+        The values of the returning fields of every deleted row, by primary key.
+    """
+    keys = [key for key in map(parse_id, pks) if key is not None]
+    quote = connection.ops.quote_name
+    table = quote(model._meta.db_table)
+    selected = [quote(model._meta.get_field(name).column) for name in returning]
+    pk_column = quote(model._meta.pk.column)
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'DELETE FROM {table} WHERE {pk_column} = ANY(%s) AND "criado_por_id" = %s '
+            f"RETURNING {', '.join([pk_column, *selected])}",
+            [keys, user.pk],
+        )
+        deleted = {row[0]: tuple(row[1:]) for row in cursor.fetchall()}
+    if deleted:
+        rows_changed.send(sender=model, owners=[user.pk], deleted=True)
+    return deleted
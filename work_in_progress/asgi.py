@@ -9,8 +9,13 @@ https://docs.djangoproject.com/en/4.2/howto/deployment/asgi/
 
 import os
 
-from django.core.asgi import get_asgi_application
+import django
 
 os.environ.setdefault("DJANGO_SETTINGS_MODULE", "work_in_progress.settings")
 
-application = get_asgi_application()
+# As get_asgi_application(), with the handler able to send streams.
+django.setup(set_prefix=False)
+
+from work_in_progress.app.concurrency import ASGIHandler  # noqa: E402
+
+application = ASGIHandler()
@@ -38,10 +38,12 @@ INSTALLED_APPS = [
     "django.contrib.sessions",
     "django.contrib.messages",
     "django.contrib.staticfiles",
+    "django.contrib.postgres",
     "work_in_progress.app",
 ]
 
 MIDDLEWARE = [
+    "work_in_progress.app.metrics.MetricsMiddleware",
     "django.middleware.security.SecurityMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
@@ -132,3 +134,94 @@ DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
 ALGORITHM = "HS256"
 SECRET_KEY = os.environ["SECRET_KEY"]
 ACCESS_TOKEN_EXPIRE_MINUTES = 30
+
+# Cache of the SystemUser resolved from the JWT 'sub' claim. Set
+# AUTH_USER_CACHE_ALIAS to one of CACHES to share it between workers.
+# Saving or deleting a user only drops the entries of the process doing it
+# and of the shared backend, so the other workers keep authenticating a
+# deactivated or deleted user for up to AUTH_USER_CACHE_TTL seconds, with
+# or without the alias.
+AUTH_USER_CACHE_MAXSIZE = 1024
+AUTH_USER_CACHE_TTL = 5
+AUTH_USER_CACHE_ALIAS = os.environ.get("AUTH_USER_CACHE_ALIAS")
+
+# Cache of the rendered list and detail responses, invalidated per model and
+# user on every write. Invalidations only reach the processes sharing the
+# backend, so it is disabled unless RESPONSE_CACHE_ALIAS names a backend of
+# CACHES shared by every worker, e.g. memcached or redis; with the local
+# memory backend the other workers would serve stale lists after a write.
+# The endpoints listed in RESPONSE_CACHE_EXCLUDE, e.g. "processos,produto",
+# are never cached.
+RESPONSE_CACHE_ALIAS = os.environ.get("RESPONSE_CACHE_ALIAS", "")
+RESPONSE_CACHE_TTL = 60
+RESPONSE_CACHE_EXCLUDE = [
+    name for name in os.environ.get("RESPONSE_CACHE_EXCLUDE", "").split(",") if name
+]
+
+# Threads running the ORM code of the async views when served through
+# asgi.py, which is also the number of database connections of a process.
+ASYNC_DB_THREADS = int(os.environ.get("ASYNC_DB_THREADS", 8))
+
+# Login passwords are checked in their own pool of threads, so hashing can't
+# starve the other requests. Logins are refused with a 503 past
+# PASSWORD_CHECK_QUEUE_DEPTH pending checks, and with a 429 past
+# PASSWORD_CHECK_PER_USER pending checks of the same username.
+PASSWORD_CHECK_THREADS = int(os.environ.get("PASSWORD_CHECK_THREADS", 2))
+PASSWORD_CHECK_QUEUE_DEPTH = 32
+PASSWORD_CHECK_PER_USER = 2
+
+# Keyset pagination of the list endpoints.
+PAGINATION_DEFAULT_LIMIT = 100
+PAGINATION_MAX_LIMIT = 1000
+
+# Rows fetched per round trip of the server-side cursor of streamed lists.
+STREAM_CHUNK_SIZE = 2000
+# Parts of a stream, one row each, read ahead of the client through asgi.py.
+STREAM_READ_AHEAD = 64
+
+# Bulk endpoints: items accepted per request and rows per INSERT statement.
+BULK_MAX_ITEMS = 10000
+BULK_BATCH_SIZE = 1000
+
+# Default minimum pg_trgm similarity of the company lookup matches.
+LOOKUP_SIMILARITY_THRESHOLD = 0.3
+
+# Processo analytics: rows per chunk pulled into NumPy and histogram bins.
+ANALYTICS_CHUNK_SIZE = 50000
+# Rows one analytics request may read. The exact percentiles keep 8 bytes per
+# row in memory, so this bounds a request to about 16 MB per million rows.
+ANALYTICS_MAX_ROWS = int(os.environ.get("ANALYTICS_MAX_ROWS", 2_000_000))
+ANALYTICS_DEFAULT_BINS = 10
+ANALYTICS_MAX_BINS = 100
+
+# Delta sync: watermarks trail the clock by SYNC_WATERMARK_LAG_SECONDS so rows
+# of transactions still in flight are not skipped, and tombstones of deleted
+# rows are kept SYNC_TOMBSTONE_RETENTION_DAYS.
+SYNC_WATERMARK_LAG_SECONDS = 30
+SYNC_TOMBSTONE_RETENTION_DAYS = 30
+
+# Tokens minted by login carry the superuser flag and a version of the secret
+# of the user, so requests are authenticated without reading the user. Tokens
+# revoked by a password change, a deactivation or a deletion in another
+# process are refused after at most AUTH_REVOCATION_SYNC_SECONDS. With
+# AUTH_STATELESS=0 every request reads its user again.
+AUTH_STATELESS = os.environ.get("AUTH_STATELESS", "1") == "1"
+AUTH_REVOCATION_SYNC_SECONDS = 30
+
+# Identical list requests in flight at the same time, same user, path and
+# query, share one query and rendering. Set SINGLE_FLIGHT_ALIAS to a shared
+# backend of CACHES to also share them between workers, which wait for the
+# worker computing the response by polling the cache every
+# SINGLE_FLIGHT_POLL_SECONDS. Requests waiting longer than
+# SINGLE_FLIGHT_TIMEOUT compute the response themselves.
+SINGLE_FLIGHT_ALIAS = os.environ.get("SINGLE_FLIGHT_ALIAS", "")
+SINGLE_FLIGHT_TIMEOUT = 10
+SINGLE_FLIGHT_POLL_SECONDS = 0.05
+
+# Request metrics served at /api/metrics. Each process keeps its own and
+# writes them to a file of METRICS_DIR every METRICS_FLUSH_SECONDS, so any
+# worker can serve the totals of every worker of the host; without
+# METRICS_DIR only the metrics of the serving process are shown.
+METRICS_DIR = os.environ.get("METRICS_DIR", "")
+METRICS_FLUSH_SECONDS = 1
+METRICS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)